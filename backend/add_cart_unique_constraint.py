@@ -0,0 +1,43 @@
+"""
+Script to add the unique (user_id, product_id) index to the cart_items table.
+Duplicate cart lines left over from before the index are merged first.
+"""
+from app import app, db
+from sqlalchemy import text
+
+def add_cart_unique_constraint():
+    with app.app_context():
+        try:
+            with db.engine.connect() as conn:
+                # Fold duplicate lines into the oldest one
+                merged = conn.execute(text("""
+                    UPDATE cart_items
+                    SET quantity = (
+                        SELECT SUM(d.quantity) FROM cart_items d
+                        WHERE d.user_id = cart_items.user_id AND d.product_id = cart_items.product_id
+                    )
+                    WHERE id IN (
+                        SELECT MIN(id) FROM cart_items
+                        GROUP BY user_id, product_id
+                        HAVING COUNT(*) > 1
+                    )
+                """)).rowcount
+                removed = conn.execute(text("""
+                    DELETE FROM cart_items
+                    WHERE id NOT IN (
+                        SELECT MIN(id) FROM cart_items GROUP BY user_id, product_id
+                    )
+                """)).rowcount
+                conn.execute(text(
+                    "CREATE UNIQUE INDEX uq_cart_items_user_product ON cart_items (user_id, product_id)"
+                ))
+                conn.commit()
+            
+            print(f"✅ Merged {merged} duplicated cart lines ({removed} rows removed)")
+            print("✅ Unique index uq_cart_items_user_product created successfully!")
+            
+        except Exception as e:
+            print(f"❌ Error: {e}")
+
+if __name__ == '__main__':
+    add_cart_unique_constraint()
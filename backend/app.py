@@ -21,8 +21,10 @@ DB_USER = os.getenv('DB_USER', '')
 DB_PASSWORD = os.getenv('DB_PASSWORD', '')
 DB_DRIVER = os.getenv('DB_DRIVER', 'ODBC Driver 17 for SQL Server')
 
-# SQLAlchemy connection string for SQL Server
-if DB_USER and DB_PASSWORD:
+# SQLAlchemy connection string for SQL Server (DATABASE_URL overrides it, e.g. sqlite:///toystore.db)
+if os.getenv('DATABASE_URL'):
+    app.config['SQLALCHEMY_DATABASE_URI'] = os.getenv('DATABASE_URL')
+elif DB_USER and DB_PASSWORD:
     app.config['SQLALCHEMY_DATABASE_URI'] = f'mssql+pyodbc://{DB_USER}:{DB_PASSWORD}@{DB_SERVER}/{DB_NAME}?driver={DB_DRIVER}'
 else:
     # Windows Authentication
@@ -39,12 +41,16 @@ CORS(app)
 # Import routes
 from routes import product_routes, user_routes, cart_routes, order_routes
 from routes import admin_products, admin_orders, admin_users, admin_analytics
+from routes import media_routes
+from middleware.admin_auth import token_in_scope
+from services import catalog_version, product_events
 
 # Register blueprints
 app.register_blueprint(product_routes.bp)
 app.register_blueprint(user_routes.bp)
 app.register_blueprint(cart_routes.bp)
 app.register_blueprint(order_routes.bp)
+app.register_blueprint(media_routes.bp)
 
 # Register admin blueprints
 app.register_blueprint(admin_products.admin_products_bp)
@@ -52,6 +58,18 @@ app.register_blueprint(admin_orders.admin_orders_bp)
 app.register_blueprint(admin_users.admin_users_bp)
 app.register_blueprint(admin_analytics.admin_analytics_bp)
 
+# Scoped tokens (the analytics stream token) only work on their own endpoint
+jwt.token_verification_loader(token_in_scope)
+
+@jwt.token_verification_failed_loader
+def token_out_of_scope(jwt_header, jwt_data):
+    return {'error': 'Token not valid for this endpoint'}, 401
+
+@app.before_request
+def sync_catalog():
+    # Pick up product writes made by other processes (imports, other workers)
+    catalog_version.sync()
+
 @app.route('/')
 def index():
     return {'message': 'Welcome to Toy Store API', 'status': 'running'}
@@ -63,6 +81,7 @@ def health():
 if __name__ == '__main__':
     with app.app_context():
         db.create_all()
+        product_events.rebuild_indexes()
     
     port = int(os.getenv('PORT', 5000))
     host = os.getenv('HOST', '0.0.0.0')
@@ -0,0 +1,40 @@
+"""
+Move closed orders into the archive tables.
+
+Usage: python archive_orders.py [--older-than-days 180] [--batch-size 500] [--max-batches N] [--pause 0.1]
+       python archive_orders.py --dry-run
+Safe to interrupt and re-run; see services/order_archive.py.
+"""
+import argparse
+from app import app
+from services import order_archive
+
+def main():
+    parser = argparse.ArgumentParser(description='Archive closed orders')
+    parser.add_argument('--older-than-days', type=int, default=order_archive.ORDER_ARCHIVE_AFTER_DAYS,
+                        help='Archive delivered/cancelled orders not updated for this many days')
+    parser.add_argument('--batch-size', type=int, default=order_archive.DEFAULT_BATCH_SIZE)
+    parser.add_argument('--max-batches', type=int, help='Stop after this many batches')
+    parser.add_argument('--pause', type=float, default=0, help='Seconds to sleep between batches')
+    parser.add_argument('--dry-run', action='store_true', help='Only count the orders that would move')
+    args = parser.parse_args()
+    
+    with app.app_context():
+        if args.dry_run:
+            count = order_archive.pending_count(args.older_than_days)
+            print(f'{count} orders would be archived')
+            return
+        
+        report = order_archive.archive_closed_orders(
+            older_than_days=args.older_than_days,
+            batch_size=args.batch_size,
+            max_batches=args.max_batches,
+            pause=args.pause
+        )
+    
+    print(f"✓ Archived {report['orders']} orders ({report['items']} items) in "
+          f"{report['batches']} batches, {report['elapsed_seconds']}s")
+    print(f"  Cutoff: last updated before {report['cutoff']}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,159 @@
+"""
+Benchmark for the NumPy analytics engine.
+
+1. Bucketing and category aggregation on synthetic in-memory columns
+   (millions of order lines), against the equivalent pure-Python loop.
+2. End to end: seeds a throwaway SQLite database with synthetic orders,
+   then times analytics_engine.timeseries() streaming them back.
+
+Usage: python benchmarks/analytics_engine.py [--rows 2000000] [--orders 200000] [--days 730]
+Exits with status 1 if the vectorized results disagree with the loop.
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+from collections import defaultdict
+from datetime import date, datetime, timedelta
+
+import numpy as np
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+CATEGORIES = 12
+
+
+def synthetic_columns(rows, days, rng):
+    """Day, category code and line revenue for `rows` order lines over the last `days` days"""
+    end = np.datetime64(date.today(), 'D')
+    day = end - rng.integers(0, days, rows).astype('timedelta64[D]')
+    category = rng.integers(0, CATEGORIES, rows)
+    revenue = np.round(rng.uniform(5, 120, rows), 2)
+    return day, category, revenue
+
+
+def python_buckets(day, category, revenue, granularity):
+    """The same aggregation as a plain loop over Python objects"""
+    totals = defaultdict(float)
+    for d, c, r in zip(day.astype(date).tolist(), category.tolist(), revenue.tolist()):
+        if granularity == 'day':
+            key = d
+        elif granularity == 'week':
+            key = d - timedelta(days=d.weekday())
+        elif granularity == 'month':
+            key = d.replace(day=1)
+        else:
+            key = date(d.year, (d.month - 1) // 3 * 3 + 1, 1)
+        totals[(c, key)] += r
+    return totals
+
+
+def bench_in_memory(args, analytics_engine):
+    rng = np.random.default_rng(args.seed)
+    day, category, revenue = synthetic_columns(args.rows, args.days, rng)
+    start, end = day.min().astype(date), day.max().astype(date)
+    print(f'In memory: {args.rows:,} order lines over {args.days} days, {CATEGORIES} categories')
+
+    failures = []
+    for granularity in analytics_engine.GRANULARITIES:
+        started = time.perf_counter()
+        starts = analytics_engine.bucket_starts(start, end, granularity)
+        size = len(starts)
+        cells = category * size + analytics_engine.bucket_index(day, starts, granularity)
+        grid = np.bincount(cells, weights=revenue, minlength=CATEGORIES * size).reshape(CATEGORIES, size)
+        vectorized = time.perf_counter() - started
+
+        started = time.perf_counter()
+        expected = python_buckets(day, category, revenue, granularity)
+        looped = time.perf_counter() - started
+
+        got = {
+            (c, starts[i].astype(date)): grid[c, i]
+            for c, i in zip(*np.nonzero(grid))
+        }
+        if got.keys() != expected.keys() or any(abs(got[k] - v) > 1e-6 * max(1, abs(v)) for k, v in expected.items()):
+            failures.append(granularity)
+        print(f'  {granularity:>8}: {size:5d} buckets  numpy {vectorized * 1000:8.1f} ms  '
+              f'python {looped * 1000:8.1f} ms  ({looped / vectorized:5.1f}x)')
+    return failures
+
+
+def bench_database(args):
+    workdir = tempfile.mkdtemp(prefix='analytics-bench-')
+    os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(workdir, 'bench.db')}"
+
+    from sqlalchemy import insert
+    from app import app
+    from database import db
+    from models import Order, OrderItem, Product, User
+    from services import analytics_engine, sales_rollup
+
+    rng = np.random.default_rng(args.seed)
+    print(f'Database: {args.orders:,} orders over {args.days} days (SQLite)')
+
+    with app.app_context():
+        db.create_all()
+        db.session.add_all(
+            Product(name=f'Bench toy {i}', price=10 + i % 50, category=f'Category {i % CATEGORIES}', stock_quantity=100)
+            for i in range(200)
+        )
+        db.session.add(User(username='bench', email='bench@example.com', password_hash='-'))
+        db.session.commit()
+
+        started = time.perf_counter()
+        now = datetime.utcnow()
+        offsets = rng.integers(0, args.days * 86400, args.orders)
+        lines = rng.integers(1, 4, args.orders)
+        order_rows, item_rows = [], []
+        item_id = 0
+        for order_id in range(1, args.orders + 1):
+            created = now - timedelta(seconds=int(offsets[order_id - 1]))
+            total = 0.0
+            for _ in range(lines[order_id - 1]):
+                item_id += 1
+                product_id = int(rng.integers(1, 201))
+                price = float(10 + (product_id - 1) % 50)
+                item_rows.append({'id': item_id, 'order_id': order_id, 'product_id': product_id, 'quantity': 1, 'price': price})
+                total += price
+            order_rows.append({'id': order_id, 'user_id': 1, 'total_amount': total, 'status': 'delivered',
+                               'shipping_address': 'Bench street 1', 'created_at': created, 'updated_at': created})
+        db.session.execute(insert(Order), order_rows)
+        db.session.execute(insert(OrderItem), item_rows)
+        db.session.commit()
+        sales_rollup.rebuild()
+        print(f'  Seeded {len(order_rows):,} orders / {len(item_rows):,} lines in {time.perf_counter() - started:.1f}s')
+
+        start, end = analytics_engine.parse_range(default_days=args.days)
+        for granularity in ('week', 'month'):
+            for categories in (False, True):
+                started = time.perf_counter()
+                result = analytics_engine.timeseries(start, end, granularity, categories=categories)
+                elapsed = time.perf_counter() - started
+                label = 'with categories' if categories else 'rollup only'
+                print(f'  timeseries {granularity:>5} {label:<15}: {elapsed * 1000:8.1f} ms  '
+                      f'({len(result["buckets"])} buckets, {result["totals"]["order_count"]:,} orders)')
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Analytics engine benchmark')
+    parser.add_argument('--rows', type=int, default=2000000, help='Synthetic order lines for the in-memory run')
+    parser.add_argument('--orders', type=int, default=200000, help='Orders to seed for the database run (0 to skip)')
+    parser.add_argument('--days', type=int, default=730)
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    from services import analytics_engine
+
+    failures = bench_in_memory(args, analytics_engine)
+    if args.orders:
+        bench_database(args)
+
+    if failures:
+        print(f'✗ Vectorized totals differ from the loop for: {", ".join(failures)}')
+        sys.exit(1)
+    print('✓ Vectorized totals match the loop')
+
+if __name__ == '__main__':
+    main()
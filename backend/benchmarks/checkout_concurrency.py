@@ -0,0 +1,104 @@
+"""
+Concurrency benchmark for checkout.
+
+Runs many parallel checkouts against a throwaway SQLite database, with
+more demand than stock, and checks that nothing oversold: stock never goes
+negative and every unit sold is matched by an order line.
+
+Usage: python benchmarks/checkout_concurrency.py [--users 200] [--products 5] [--stock 50] [--workers 16]
+Exits with status 1 if an invariant is violated.
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Parallel checkout benchmark')
+    parser.add_argument('--users', type=int, default=200)
+    parser.add_argument('--products', type=int, default=5)
+    parser.add_argument('--stock', type=int, default=50, help='Initial stock per product')
+    parser.add_argument('--max-quantity', type=int, default=3, help='Max quantity per cart line')
+    parser.add_argument('--workers', type=int, default=16)
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+    
+    workdir = tempfile.mkdtemp(prefix='checkout-bench-')
+    os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(workdir, 'bench.db')}?timeout=30"
+    
+    from flask_jwt_extended import create_access_token
+    from sqlalchemy import func
+    from app import app
+    from database import db
+    from models import CartItem, OrderItem, Product, User
+    
+    rng = random.Random(args.seed)
+    
+    with app.app_context():
+        db.create_all()
+        products = [
+            Product(name=f'Bench toy {i}', price=10 + i, category='Bench', stock_quantity=args.stock)
+            for i in range(args.products)
+        ]
+        db.session.add_all(products)
+        users = [User(username=f'bench{i}', email=f'bench{i}@example.com', password_hash='-') for i in range(args.users)]
+        db.session.add_all(users)
+        db.session.flush()
+        
+        for user in users:
+            for product in rng.sample(products, rng.randint(1, len(products))):
+                db.session.add(CartItem(user_id=user.id, product_id=product.id,
+                                        quantity=rng.randint(1, args.max_quantity)))
+        db.session.commit()
+        
+        tokens = [create_access_token(identity=user.id) for user in users]
+        demand = db.session.query(func.sum(CartItem.quantity)).scalar()
+    
+    def checkout(token):
+        client = app.test_client()
+        response = client.post('/api/orders/create', json={'shipping_address': 'Bench street 1'},
+                               headers={'Authorization': f'Bearer {token}'})
+        return response.status_code
+    
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.workers) as pool:
+        statuses = list(pool.map(checkout, tokens))
+    elapsed = time.perf_counter() - started
+    
+    with app.app_context():
+        db.session.expire_all()
+        stock = dict(db.session.query(Product.id, Product.stock_quantity))
+        sold = dict(db.session.query(OrderItem.product_id, func.sum(OrderItem.quantity)).group_by(OrderItem.product_id))
+    
+    placed = statuses.count(201)
+    rejected = statuses.count(409)
+    errors = len(statuses) - placed - rejected
+    print(f'{len(statuses)} checkouts in {elapsed:.2f}s ({len(statuses) / elapsed:.1f}/s) '
+          f'with {args.workers} workers')
+    print(f'  Placed: {placed}  Out of stock (409): {rejected}  Errors: {errors}')
+    print(f'  Demand: {demand} units  Supply: {args.stock * args.products} units')
+    
+    failures = []
+    for product_id, remaining in stock.items():
+        units_sold = sold.get(product_id, 0)
+        if remaining < 0:
+            failures.append(f'product {product_id} has negative stock ({remaining})')
+        if units_sold + remaining != args.stock:
+            failures.append(f'product {product_id}: sold {units_sold} + left {remaining} != {args.stock}')
+    
+    if failures:
+        print('✗ Oversold:')
+        for failure in failures:
+            print(f'  {failure}')
+        sys.exit(1)
+    print('✓ No product oversold')
+
+if __name__ == '__main__':
+    main()
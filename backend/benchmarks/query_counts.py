@@ -0,0 +1,114 @@
+"""
+Query-count check for the admin read paths.
+
+Seeds a throwaway SQLite database, then counts the SQL statements each
+endpoint issues for a small and a large page. The counts must not grow
+with the number of rows and must stay within the budgets below; caches are
+cleared before every request so the cold path is measured.
+
+Usage: python benchmarks/query_counts.py [--orders 200] [--items 4]
+Exits with status 1 if an endpoint exceeds its budget or scales with rows.
+tests/test_query_counts.py enforces the same budgets under pytest; this
+script is for measuring larger data sets.
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+# (label, small url, large url, max statements including the admin_required user lookup)
+ENDPOINTS = [
+    ('admin orders page', '/api/admin/orders?per_page=5', '/api/admin/orders?per_page=100', 5),
+    ('admin orders filtered', '/api/admin/orders?status=pending&per_page=5',
+     '/api/admin/orders?status=pending&per_page=100', 5),
+    ('order stats', '/api/admin/orders/stats', '/api/admin/orders/stats', 2),
+    ('dashboard', '/api/admin/analytics/dashboard', '/api/admin/analytics/dashboard', 7),
+]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Admin endpoint query counts')
+    parser.add_argument('--orders', type=int, default=200)
+    parser.add_argument('--users', type=int, default=40)
+    parser.add_argument('--products', type=int, default=50)
+    parser.add_argument('--items', type=int, default=4, help='Max items per order')
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+    
+    workdir = tempfile.mkdtemp(prefix='query-counts-')
+    os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(workdir, 'bench.db')}"
+    # Keep the catalog version re-read out of the counts
+    os.environ.setdefault('CATALOG_VERSION_POLL', '3600')
+    
+    from flask_jwt_extended import create_access_token
+    from sqlalchemy import event
+    from app import app
+    from database import db
+    from models import Order, OrderItem, Product, User
+    from services import analytics_cache, catalog_version, product_cache, sales_rollup
+    
+    rng = random.Random(args.seed)
+    
+    with app.app_context():
+        db.create_all()
+        catalog_version.sync()
+        products = [
+            Product(name=f'Bench toy {i}', price=10 + i, category=f'Category {i % 5}', stock_quantity=rng.randint(0, 40))
+            for i in range(args.products)
+        ]
+        db.session.add_all(products)
+        users = [User(username=f'bench{i}', email=f'bench{i}@example.com', password_hash='-') for i in range(args.users)]
+        admin = User(username='bench-admin', email='admin@example.com', password_hash='-', is_admin=True)
+        db.session.add_all(users + [admin])
+        db.session.flush()
+    
+        for _ in range(args.orders):
+            lines = rng.sample(products, rng.randint(1, args.items))
+            order = Order(user_id=rng.choice(users).id, status=rng.choice(['pending', 'shipped', 'delivered']),
+                          shipping_address='Bench street 1',
+                          total_amount=sum(p.price for p in lines))
+            db.session.add(order)
+            db.session.flush()
+            db.session.add_all(OrderItem(order_id=order.id, product_id=p.id, quantity=1, price=p.price) for p in lines)
+        db.session.commit()
+        sales_rollup.rebuild()
+        db.session.commit()
+        token = create_access_token(identity=admin.id)
+    
+    statements = []
+    with app.app_context():
+        engine = db.engine
+    event.listen(engine, 'before_cursor_execute', lambda *a, **kw: statements.append(a[2]))
+    
+    client = app.test_client()
+    headers = {'Authorization': f'Bearer {token}'}
+    
+    def count(url):
+        analytics_cache.clear()
+        product_cache.clear()
+        statements.clear()
+        response = client.get(url, headers=headers)
+        if response.status_code != 200:
+            raise SystemExit(f'{url} returned {response.status_code}')
+        return len(statements)
+    
+    failures = []
+    print(f'{args.orders} orders, {args.users} users, {args.products} products')
+    for label, small_url, large_url, budget in ENDPOINTS:
+        small, large = count(small_url), count(large_url)
+        ok = small == large and large <= budget
+        print(f'  {"✓" if ok else "✗"} {label}: {small} / {large} queries (budget {budget})')
+        if not ok:
+            failures.append(label)
+    
+    if failures:
+        print(f'✗ Query count regressions: {", ".join(failures)}')
+        sys.exit(1)
+    print('✓ Query counts are constant and within budget')
+
+if __name__ == '__main__':
+    main()
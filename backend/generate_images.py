@@ -0,0 +1,30 @@
+"""
+Pre-generate resized variants (thumbnail, card, detail) for every locally
+stored product image. Safe to re-run: unchanged images are skipped.
+
+Usage: python generate_images.py [--workers N] [--force]
+"""
+import argparse
+from app import app
+from models import Product
+from services import catalog_version, image_variants
+
+def main():
+    parser = argparse.ArgumentParser(description='Generate product image variants')
+    parser.add_argument('--workers', type=int, default=image_variants.MAX_WORKERS)
+    parser.add_argument('--force', action='store_true', help='Re-render images that are already cached')
+    args = parser.parse_args()
+    
+    with app.app_context():
+        image_urls = [url for (url,) in Product.query.with_entities(Product.image_url).distinct() if url]
+    
+    rendered, skipped, failed = image_variants.generate_all(image_urls, workers=args.workers, force=args.force)
+    if rendered:
+        # Running servers re-read the manifest and drop cached products when the version moves
+        with app.app_context():
+            catalog_version.bump()
+    print(f"✓ Rendered {rendered} images, skipped {skipped} unchanged, {failed} failed")
+    print(f"  Variants are in {image_variants.IMAGE_CACHE_DIR}")
+
+if __name__ == '__main__':
+    main()
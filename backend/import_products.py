@@ -0,0 +1,37 @@
+"""
+Bulk import products from a CSV or NDJSON file.
+
+Usage: python import_products.py catalogue.csv [--format csv|ndjson] [--batch-size 1000]
+Rows are upserted by (name, brand); see services/product_import.py.
+"""
+import argparse
+import json
+from app import app
+from services import product_import
+
+def main():
+    parser = argparse.ArgumentParser(description='Bulk import products')
+    parser.add_argument('path', help='CSV or NDJSON file')
+    parser.add_argument('--format', choices=product_import.FORMATS,
+                        help='Input format (default: from the file extension)')
+    parser.add_argument('--batch-size', type=int, default=product_import.DEFAULT_BATCH_SIZE)
+    args = parser.parse_args()
+    
+    fmt = args.format or product_import.detect_format(args.path)
+    if not fmt:
+        parser.error('Cannot tell the format from the file name; pass --format')
+    
+    with app.app_context():
+        with open(args.path, encoding='utf-8', newline='') as stream:
+            report = product_import.import_products(stream, fmt, batch_size=args.batch_size)
+    
+    print(f"✓ Processed {report['rows']} rows in {report['elapsed_seconds']}s "
+          f"({report['rows_per_second']} rows/s)")
+    print(f"  Inserted: {report['inserted']}  Updated: {report['updated']}  Failed: {report['failed']}")
+    for error in report['errors']:
+        print(f"  Row {error['row']}: {'; '.join(error['errors'])}")
+    if report['errors_truncated']:
+        print('  (further errors not shown)')
+
+if __name__ == '__main__':
+    main()
@@ -1,8 +1,17 @@
+import os
+from datetime import timedelta
 from functools import wraps
-from flask import jsonify
-from flask_jwt_extended import verify_jwt_in_request, get_jwt_identity
+from flask import jsonify, request
+from flask_jwt_extended import create_access_token, get_jwt, get_jwt_identity, verify_jwt_in_request
 from models import User
 
+# Lifetime of a stream token; it is only checked when the stream (re)connects
+STREAM_TOKEN_SECONDS = int(os.getenv('STREAM_TOKEN_SECONDS', 60))
+STREAM_SCOPE = 'analytics-stream'
+
+# endpoint -> the token scope it accepts besides unscoped access tokens
+_ENDPOINT_SCOPES = {'admin_analytics.stream_analytics': STREAM_SCOPE}
+
 def admin_required(fn):
     """
     Decorator to protect admin-only routes.
@@ -22,3 +31,44 @@ def admin_required(fn):
         
         return fn(*args, **kwargs)
     return wrapper
+
+def token_in_scope(jwt_header, jwt_data):
+    """
+    Token verification hook: a scoped token (see stream_token) is only
+    accepted by the endpoint it was issued for
+    """
+    scope = jwt_data.get('scope')
+    return scope is None or scope == _ENDPOINT_SCOPES.get(request.endpoint)
+
+def stream_token(user_id):
+    """Short-lived token that only opens the analytics event stream; returns (token, seconds)"""
+    token = create_access_token(
+        identity=user_id,
+        expires_delta=timedelta(seconds=STREAM_TOKEN_SECONDS),
+        additional_claims={'scope': STREAM_SCOPE}
+    )
+    return token, STREAM_TOKEN_SECONDS
+
+def admin_required_stream(fn):
+    """
+    admin_required for event streams: the browser's EventSource cannot set
+    headers, so the stream takes a token from stream_token() as ?jwt=
+    instead. Regular access tokens are not accepted in the URL, where they
+    would end up in server and proxy logs.
+    """
+    @wraps(fn)
+    def wrapper(*args, **kwargs):
+        verify_jwt_in_request(locations=['query_string'])
+        if get_jwt().get('scope') != STREAM_SCOPE:
+            return jsonify({'error': 'Stream token required'}), 401
+        current_user_id = get_jwt_identity()
+        
+        user = User.query.get(current_user_id)
+        if not user:
+            return jsonify({'error': 'User not found'}), 404
+        
+        if not user.is_admin:
+            return jsonify({'error': 'Admin access required'}), 403
+        
+        return fn(*args, **kwargs)
+    return wrapper
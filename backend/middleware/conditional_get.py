@@ -0,0 +1,36 @@
+import hashlib
+from functools import wraps
+from flask import request, make_response
+from services import catalog_version
+
+def catalog_conditional(fn):
+    """
+    Decorator for catalog GET routes.
+    Adds a strong ETag and Last-Modified derived from the catalog version,
+    and answers matching If-None-Match / If-Modified-Since with a 304
+    before the view runs.
+    """
+    @wraps(fn)
+    def wrapper(*args, **kwargs):
+        # Read the version before the view so the tag is never newer than the body
+        version, last_modified = catalog_version.current()
+        etag = hashlib.sha1(f'{version}:{request.full_path}'.encode()).hexdigest()
+        
+        if request.if_none_match:
+            not_modified = request.if_none_match.contains(etag)
+        else:
+            since = request.if_modified_since
+            not_modified = since is not None and last_modified <= since
+        
+        if not_modified:
+            response = make_response('', 304)
+        else:
+            response = make_response(fn(*args, **kwargs))
+            if response.status_code != 200:
+                return response
+        
+        response.set_etag(etag)
+        response.last_modified = last_modified
+        response.headers['Cache-Control'] = 'no-cache'
+        return response
+    return wrapper
@@ -0,0 +1,48 @@
+from functools import wraps
+from flask import request, jsonify, make_response
+from flask_jwt_extended import get_jwt_identity
+from services import idempotency
+
+def idempotent(fn):
+    """
+    Decorator for POST routes that must not run twice (use below @jwt_required).
+    With an Idempotency-Key header, the first request's response is stored
+    and retries with the same key and body get it replayed; server errors
+    are not stored, so those can be retried for real. A claim whose request
+    died is taken over by a retry once its lease runs out.
+    """
+    @wraps(fn)
+    def wrapper(*args, **kwargs):
+        key = request.headers.get('Idempotency-Key')
+        if not key:
+            return fn(*args, **kwargs)
+        if len(key) > idempotency.MAX_KEY_LENGTH:
+            return jsonify({'error': f'Idempotency-Key is longer than {idempotency.MAX_KEY_LENGTH} characters'}), 400
+        
+        user_id = get_jwt_identity()
+        request_hash = idempotency.fingerprint(request.method, request.path, request.get_data())
+        
+        try:
+            claim, stored = idempotency.begin(user_id, key, request_hash)
+        except idempotency.IdempotencyError as e:
+            return jsonify({'error': str(e)}), e.status_code
+        
+        if stored is not None:
+            status, body = stored
+            response = make_response(body, status)
+            response.mimetype = 'application/json'
+            response.headers['Idempotent-Replayed'] = 'true'
+            return response
+        
+        try:
+            response = make_response(fn(*args, **kwargs))
+        except Exception:
+            idempotency.release(user_id, key, claim)
+            raise
+        
+        if response.status_code >= 500:
+            idempotency.release(user_id, key, claim)
+        else:
+            idempotency.complete(user_id, key, claim, request_hash, response.status_code, response.get_data(as_text=True))
+        return response
+    return wrapper
@@ -1,6 +1,7 @@
 from database import db
 from datetime import datetime
 from werkzeug.security import generate_password_hash, check_password_hash
+from services.image_variants import variant_urls
 
 class User(db.Model):
     __tablename__ = 'users'
@@ -42,6 +43,11 @@ class User(db.Model):
 
 class Product(db.Model):
     __tablename__ = 'products'
+    __table_args__ = (
+        # Keyset pagination seeks on (sort key, id)
+        db.Index('ix_products_created_at_id', 'created_at', 'id'),
+        db.Index('ix_products_price_id', 'price', 'id'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(200), nullable=False)
@@ -60,25 +66,64 @@ class Product(db.Model):
     cart_items = db.relationship('CartItem', backref='product', lazy=True)
     order_items = db.relationship('OrderItem', backref='product', lazy=True)
     
-    def to_dict(self):
-        return {
-            'id': self.id,
-            'name': self.name,
-            'description': self.description,
-            'price': self.price,
-            'category': self.category,
-            'age_range': self.age_range,
-            'stock_quantity': self.stock_quantity,
-            'image_url': self.image_url,
-            'brand': self.brand,
-            'rating': self.rating,
-            'is_featured': self.is_featured,
-            'created_at': self.created_at.isoformat()
-        }
+    # Fields clients may request with ?fields=
+    SERIALIZABLE_FIELDS = (
+        'id', 'name', 'description', 'price', 'category', 'age_range', 'stock_quantity',
+        'image_url', 'brand', 'rating', 'is_featured', 'created_at'
+    )
+    
+    def to_dict(self, fields=None):
+        """fields: optional subset of SERIALIZABLE_FIELDS; other columns are never touched"""
+        if fields is None:
+            return {
+                'id': self.id,
+                'name': self.name,
+                'description': self.description,
+                'price': self.price,
+                'category': self.category,
+                'age_range': self.age_range,
+                'stock_quantity': self.stock_quantity,
+                'image_url': self.image_url,
+                'image_variants': variant_urls(self.image_url),
+                'brand': self.brand,
+                'rating': self.rating,
+                'is_featured': self.is_featured,
+                'created_at': self.created_at.isoformat()
+            }
+        
+        data = {}
+        for key in self.projected_keys(fields):
+            if key == 'image_variants':
+                data[key] = variant_urls(data['image_url'])
+                continue
+            value = getattr(self, key)
+            if key == 'created_at' and value is not None:
+                value = value.isoformat()
+            data[key] = value
+        return data
+    
+    @staticmethod
+    def projected_keys(fields):
+        """Keys of to_dict(fields): the fields, with image_variants following image_url"""
+        keys = []
+        for field in fields:
+            keys.append(field)
+            if field == 'image_url':
+                keys.append('image_variants')
+        return keys
+    
+    @classmethod
+    def project(cls, data, fields):
+        """The to_dict(fields) shape cut from a full to_dict() result (e.g. a cached one)"""
+        return {key: data[key] for key in cls.projected_keys(fields)}
 
 
 class CartItem(db.Model):
     __tablename__ = 'cart_items'
+    __table_args__ = (
+        # One row per product per cart; cart upserts conflict on this
+        db.Index('uq_cart_items_user_product', 'user_id', 'product_id', unique=True),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
@@ -86,12 +131,17 @@ class CartItem(db.Model):
     quantity = db.Column(db.Integer, nullable=False, default=1)
     added_at = db.Column(db.DateTime, default=datetime.utcnow)
     
-    def to_dict(self):
+    def to_dict(self, products=None):
+        """products: optional {product_id: product dict} to serialize from instead of lazy loading"""
+        if products is not None:
+            product = products.get(self.product_id)
+        else:
+            product = self.product.to_dict() if self.product else None
         return {
             'id': self.id,
             'user_id': self.user_id,
             'product_id': self.product_id,
-            'product': self.product.to_dict() if self.product else None,
+            'product': product,
             'quantity': self.quantity,
             'added_at': self.added_at.isoformat()
         }
@@ -99,6 +149,10 @@ class CartItem(db.Model):
 
 class Order(db.Model):
     __tablename__ = 'orders'
+    __table_args__ = (
+        # Order history pages seek on (user_id, created_at, id)
+        db.Index('ix_orders_user_created_id', 'user_id', 'created_at', 'id'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
@@ -112,8 +166,8 @@ class Order(db.Model):
     # Relationships
     order_items = db.relationship('OrderItem', backref='order', lazy=True)
     
-    def to_dict(self):
-        return {
+    def to_dict(self, products=None, include_items=True):
+        data = {
             'id': self.id,
             'user_id': self.user_id,
             'total_amount': self.total_amount,
@@ -121,26 +175,187 @@ class Order(db.Model):
             'shipping_address': self.shipping_address,
             'payment_method': self.payment_method,
             'created_at': self.created_at.isoformat(),
-            'updated_at': self.updated_at.isoformat(),
-            'items': [item.to_dict() for item in self.order_items]
+            'updated_at': self.updated_at.isoformat()
         }
+        if include_items:
+            data['items'] = [item.to_dict(products) for item in self.order_items]
+        return data
 
 
 class OrderItem(db.Model):
     __tablename__ = 'order_items'
     
     id = db.Column(db.Integer, primary_key=True)
-    order_id = db.Column(db.Integer, db.ForeignKey('orders.id'), nullable=False)
+    order_id = db.Column(db.Integer, db.ForeignKey('orders.id'), nullable=False, index=True)
     product_id = db.Column(db.Integer, db.ForeignKey('products.id'), nullable=False)
     quantity = db.Column(db.Integer, nullable=False)
     price = db.Column(db.Float, nullable=False)  # Price at time of order
     
-    def to_dict(self):
+    def to_dict(self, products=None):
+        """products: optional {product_id: product dict} to serialize from instead of lazy loading"""
+        if products is not None:
+            product = products.get(self.product_id)
+        else:
+            product = self.product.to_dict() if self.product else None
         return {
             'id': self.id,
             'order_id': self.order_id,
             'product_id': self.product_id,
-            'product': self.product.to_dict() if self.product else None,
+            'product': product,
             'quantity': self.quantity,
             'price': self.price
         }
+
+
+class GuestCartMerge(db.Model):
+    """A guest cart that was merged into a user's cart; each cart merges once"""
+    __tablename__ = 'guest_cart_merges'
+    
+    cart_id = db.Column(db.String(32), primary_key=True)  # id carried in every token of the cart
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    merged_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow, index=True)
+
+
+class IdempotencyKey(db.Model):
+    """Stored outcome of a request sent with an Idempotency-Key header"""
+    __tablename__ = 'idempotency_keys'
+    __table_args__ = (
+        db.Index('uq_idempotency_keys_user_key', 'user_id', 'key', unique=True),
+        db.Index('ix_idempotency_keys_expires_at', 'expires_at'),
+    )
+    
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    key = db.Column(db.String(255), nullable=False)
+    request_hash = db.Column(db.String(64), nullable=False)  # SHA-256 of method, path and body
+    response_status = db.Column(db.Integer)  # NULL while the first request is still running
+    response_body = db.Column(db.Text)
+    claim_id = db.Column(db.String(32))  # random id of the request currently running it
+    claimed_at = db.Column(db.DateTime)  # start of that request's lease
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    expires_at = db.Column(db.DateTime, nullable=False)
+
+
+class BackgroundJob(db.Model):
+    """Durable job queue used when JOB_BACKEND=db (see services/jobs.py)"""
+    __tablename__ = 'background_jobs'
+    __table_args__ = (
+        # Workers poll for due jobs with status = 'queued' ORDER BY run_at
+        db.Index('ix_background_jobs_status_run_at', 'status', 'run_at'),
+    )
+    
+    id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String(100), nullable=False)
+    payload = db.Column(db.Text, nullable=False)  # JSON
+    status = db.Column(db.String(20), nullable=False, default='queued')  # queued, running, done, failed
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    max_attempts = db.Column(db.Integer, nullable=False, default=5)
+    run_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    locked_at = db.Column(db.DateTime)
+    last_error = db.Column(db.Text)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    finished_at = db.Column(db.DateTime)
+    
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'name': self.name,
+            'status': self.status,
+            'attempts': self.attempts,
+            'max_attempts': self.max_attempts,
+            'run_at': self.run_at.isoformat(),
+            'last_error': self.last_error,
+            'created_at': self.created_at.isoformat() if self.created_at else None,
+            'finished_at': self.finished_at.isoformat() if self.finished_at else None
+        }
+
+
+class ArchivedOrder(db.Model):
+    """Closed orders moved out of the orders table (see services/order_archive.py)"""
+    __tablename__ = 'orders_archive'
+    __table_args__ = (
+        db.Index('ix_orders_archive_user_created_id', 'user_id', 'created_at', 'id'),
+    )
+    
+    # Same columns as orders; ids are kept, so an order has one id wherever it lives
+    id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    total_amount = db.Column(db.Float, nullable=False)
+    status = db.Column(db.String(50))
+    shipping_address = db.Column(db.Text, nullable=False)
+    payment_method = db.Column(db.String(50))
+    created_at = db.Column(db.DateTime)
+    updated_at = db.Column(db.DateTime)
+    archived_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    order_items = db.relationship('ArchivedOrderItem', backref='order', lazy=True)
+    
+    def to_dict(self, products=None, include_items=True):
+        data = Order.to_dict(self, products, include_items)
+        data['archived'] = True
+        return data
+
+
+class ArchivedOrderItem(db.Model):
+    __tablename__ = 'order_items_archive'
+    
+    id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    order_id = db.Column(db.Integer, db.ForeignKey('orders_archive.id'), nullable=False, index=True)
+    product_id = db.Column(db.Integer, db.ForeignKey('products.id'), nullable=False)
+    quantity = db.Column(db.Integer, nullable=False)
+    price = db.Column(db.Float, nullable=False)
+    
+    product = db.relationship('Product', lazy=True)
+    
+    def to_dict(self, products=None):
+        return OrderItem.to_dict(self, products)
+
+
+class SalesDailyRollup(db.Model):
+    """Per day and status order totals, kept current by services/sales_rollup.py"""
+    __tablename__ = 'sales_daily_rollup'
+    
+    day = db.Column(db.Date, primary_key=True)  # UTC date the order was placed
+    status = db.Column(db.String(50), primary_key=True)
+    order_count = db.Column(db.Integer, nullable=False, default=0)
+    revenue = db.Column(db.Float, nullable=False, default=0)
+    items_sold = db.Column(db.Integer, nullable=False, default=0)
+
+
+class OrderSketch(db.Model):
+    """
+    Quantile sketch (t-digest) of one order metric for the orders placed
+    on one day, overall (category '') or per product category.
+    Kept current by services/order_sketches.py.
+    """
+    __tablename__ = 'order_sketches'
+    
+    day = db.Column(db.Date, primary_key=True)  # UTC date the order was placed
+    metric = db.Column(db.String(20), primary_key=True)  # order_value, item_count
+    category = db.Column(db.String(100), primary_key=True, default='')
+    count = db.Column(db.Integer, nullable=False, default=0)
+    digest = db.Column(db.LargeBinary, nullable=False)
+    version = db.Column(db.Integer, nullable=False, default=1)  # optimistic concurrency
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+
+class CatalogVersion(db.Model):
+    """
+    Single row versioning the public catalog responses, shared by every
+    process. Kept current by services/catalog_version.py.
+    """
+    __tablename__ = 'catalog_version'
+    
+    id = db.Column(db.Integer, primary_key=True, autoincrement=False)  # always 1
+    version = db.Column(db.Integer, nullable=False, default=0)  # any product or stock write
+    index_version = db.Column(db.Integer, nullable=False, default=0)  # writes the search/facet indexes cover
+    updated_at = db.Column(db.DateTime, nullable=False)  # UTC, whole seconds; the Last-Modified
+
+
+class SketchedOrder(db.Model):
+    """An order already folded into order_sketches, so a repeated job skips it"""
+    __tablename__ = 'sketched_orders'
+    
+    # No foreign key: orders keep their id when they move to the archive
+    order_id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    recorded_at = db.Column(db.DateTime, default=datetime.utcnow)
@@ -0,0 +1,22 @@
+"""
+Backfill or rebuild the per-day order value / basket size sketches.
+
+Usage: python rebuild_order_sketches.py
+Run once after upgrading, and whenever the sketches are suspected to have
+drifted. Orders placed while it runs may be missed; run it in a quiet
+period (it takes one pass over the live and archived orders and items).
+"""
+import time
+from app import app
+from services import order_sketches
+
+def main():
+    with app.app_context():
+        started = time.perf_counter()
+        rows = order_sketches.rebuild()
+        elapsed = time.perf_counter() - started
+    
+    print(f'✓ Rebuilt order_sketches: {rows} day/metric/category sketches in {elapsed:.2f}s')
+
+if __name__ == '__main__':
+    main()
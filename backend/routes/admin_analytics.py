@@ -1,36 +1,72 @@
-from flask import Blueprint, jsonify, request
-from middleware.admin_auth import admin_required
+import json
+import os
+from flask import Blueprint, Response, jsonify, request
+from flask_jwt_extended import get_jwt_identity
+from middleware.admin_auth import admin_required, admin_required_stream, stream_token
 from models import Product, Order, User, OrderItem, db
-from sqlalchemy import func
+from sqlalchemy import func, select
+from sqlalchemy.orm import joinedload, selectinload
 from datetime import datetime, timedelta
+from services import analytics_cache, analytics_engine, event_bus, facet_index, live_events, order_archive, order_sketches, product_cache, sales_rollup
+from services.order_status import ORDER_STATUSES
 
 admin_analytics_bp = Blueprint('admin_analytics', __name__)
 
+# A comment line is sent when nothing happened for this long, so proxies keep the stream open
+SSE_KEEPALIVE_SECONDS = float(os.getenv('SSE_KEEPALIVE_SECONDS', 15))
+SSE_RETRY_MS = 5000
+
+def _cached(key, compute):
+    """Serve compute() through the analytics cache, reporting how it was served"""
+    data, state = analytics_cache.get_or_compute(key, compute)
+    response = jsonify(data)
+    response.headers['X-Analytics-Cache'] = state
+    return response, 200
+
+def _best_sellers(limit):
+    """
+    [(product, total_sold, total_revenue)] for the limit products with the
+    most units sold, live and archived orders together, in one statement
+    """
+    items = order_archive.combined_items('product_id', 'quantity', 'price')
+    totals = select(
+        items.c.product_id,
+        func.sum(items.c.quantity).label('total_sold'),
+        func.sum(items.c.quantity * items.c.price).label('total_revenue')
+    ).group_by(items.c.product_id).subquery()
+    return db.session.query(Product, totals.c.total_sold, totals.c.total_revenue).join(
+        totals, totals.c.product_id == Product.id
+    ).order_by(totals.c.total_sold.desc(), Product.id).limit(limit).all()
+
 @admin_analytics_bp.route('/api/admin/analytics/dashboard', methods=['GET'])
 @admin_required
 def get_dashboard_stats():
     """Get overview statistics for admin dashboard"""
-    # Total products
-    total_products = Product.query.count()
-    
-    # Total orders
-    total_orders = Order.query.count()
-    
-    # Total users
-    total_users = User.query.count()
-    
-    # Total revenue
-    total_revenue = db.session.query(func.sum(Order.total_amount)).scalar() or 0
+    return _cached('dashboard', _dashboard_stats)
+
+def _dashboard_stats():
+    # Total products, users, orders and revenue (orders and revenue from the
+    # daily rollup) in one multi-aggregate SELECT
+    total_products, total_users, total_orders, total_revenue = db.session.query(
+        select(func.count(Product.id)).scalar_subquery(),
+        select(func.count(User.id)).scalar_subquery(),
+        *sales_rollup.total_columns()
+    ).one()
     
-    # Low stock products (less than 10)
-    low_stock_products = Product.query.filter(Product.stock_quantity < 10).all()
+    # Low stock products (below the live-update threshold, 10 by default)
+    low_stock_products = Product.query.filter(Product.stock_quantity < live_events.LOW_STOCK_THRESHOLD).all()
     
-    # Recent orders (last 10)
-    recent_orders = Order.query.order_by(Order.created_at.desc()).limit(10).all()
+    # Recent orders (last 10), joined to their users; items in one more query
+    recent_orders = Order.query.options(
+        joinedload(Order.user), selectinload(Order.order_items)
+    ).order_by(Order.created_at.desc()).limit(10).all()
+    products = product_cache.get_products(
+        item.product_id for order in recent_orders for item in order.order_items
+    )
     recent_orders_data = []
     for order in recent_orders:
-        order_dict = order.to_dict()
-        user = User.query.get(order.user_id)
+        order_dict = order.to_dict(products)
+        user = order.user
         if user:
             order_dict['user'] = {
                 'username': user.username,
@@ -38,35 +74,27 @@ def get_dashboard_stats():
             }
         recent_orders_data.append(order_dict)
     
-    # Top selling products
-    top_products = db.session.query(
-        Product.id,
-        Product.name,
-        Product.image_url,
-        Product.price,
-        func.sum(OrderItem.quantity).label('total_sold')
-    ).join(OrderItem).group_by(Product.id).order_by(func.sum(OrderItem.quantity).desc()).limit(5).all()
-    
+    # Top selling products, ranked and limited in the database
     top_products_data = [
         {
             'id': p.id,
             'name': p.name,
             'image_url': p.image_url,
             'price': p.price,
-            'total_sold': p.total_sold
+            'total_sold': total_sold
         }
-        for p in top_products
+        for p, total_sold, _ in _best_sellers(5)
     ]
     
-    return jsonify({
+    return {
         'total_products': total_products,
-        'total_orders': total_orders,
+        'total_orders': int(total_orders),
         'total_users': total_users,
         'total_revenue': float(total_revenue),
         'low_stock_products': [p.to_dict() for p in low_stock_products],
         'recent_orders': recent_orders_data,
         'top_products': top_products_data
-    }), 200
+    }
 
 @admin_analytics_bp.route('/api/admin/analytics/sales', methods=['GET'])
 @admin_required
@@ -79,110 +107,264 @@ def get_sales_data():
     except:
         days = 7
     
-    start_date = datetime.utcnow() - timedelta(days=days)
-    
-    # Sales by day
-    sales_by_day = db.session.query(
-        func.date(Order.created_at).label('date'),
-        func.count(Order.id).label('order_count'),
-        func.sum(Order.total_amount).label('revenue')
-    ).filter(Order.created_at >= start_date).group_by(func.date(Order.created_at)).all()
+    return _cached(f'sales:{days}', lambda: _sales_data(days))
+
+def _sales_data(days):
+    # Sales by day, from the daily rollup
+    sales_by_day = sales_rollup.daily(sales_rollup.days_ago(days))
     
     sales_data = [
         {
-            'date': str(s.date),
-            'order_count': s.order_count,
+            'date': s.day.isoformat(),
+            'order_count': int(s.order_count or 0),
             'revenue': float(s.revenue or 0)
         }
         for s in sales_by_day
     ]
     
-    return jsonify({
+    return {
         'period_days': days,
         'sales_data': sales_data
-    }), 200
+    }
+
+@admin_analytics_bp.route('/api/admin/analytics/timeseries', methods=['GET'])
+@admin_required
+def get_sales_timeseries():
+    """
+    Sales per day, week, month or quarter over any date range.
+    Query: from, to (YYYY-MM-DD, inclusive; default the last 30 days),
+    granularity (day|week|month|quarter), window (moving average buckets),
+    status (comma separated), categories (false to skip the breakdown)
+    """
+    statuses = [status for status in request.args.get('status', '').split(',') if status]
+    invalid = [status for status in statuses if status not in ORDER_STATUSES]
+    if invalid:
+        return jsonify({'error': f'Invalid status. Must be one of: {", ".join(ORDER_STATUSES)}'}), 400
+    
+    granularity = request.args.get('granularity', 'day')
+    window = request.args.get('window', analytics_engine.DEFAULT_WINDOW, type=int)
+    categories = request.args.get('categories', 'true').lower() not in ('0', 'false', 'no')
+    try:
+        start, end = analytics_engine.parse_range(request.args.get('from'), request.args.get('to'))
+        analytics_engine.bucket_starts(start, end, granularity)
+    except analytics_engine.InvalidQuery as e:
+        return jsonify({'error': str(e)}), 400
+    
+    key = f'timeseries:{start}:{end}:{granularity}:{window}:{",".join(sorted(statuses))}:{categories}'
+    try:
+        return _cached(key, lambda: analytics_engine.timeseries(
+            start, end, granularity, window, statuses=sorted(statuses), categories=categories
+        ))
+    except analytics_engine.InvalidQuery as e:
+        return jsonify({'error': str(e)}), 400
+
+DEFAULT_QUANTILES = (0.5, 0.9, 0.95, 0.99)
+MAX_QUANTILES = 20
+
+@admin_analytics_bp.route('/api/admin/analytics/distribution', methods=['GET'])
+@admin_required
+def get_order_distribution():
+    """
+    Percentiles of order value or basket size, overall and per category,
+    from the per-day quantile sketches (no order rows are read).
+    Query: from, to (YYYY-MM-DD, inclusive; default the last 30 days),
+    metric (order_value|item_count), q (comma separated, e.g. 0.5,0.95), category
+    """
+    metric = request.args.get('metric', 'order_value')
+    if metric not in order_sketches.METRICS:
+        return jsonify({'error': f'Invalid metric. Must be one of: {", ".join(order_sketches.METRICS)}'}), 400
+    
+    try:
+        quantiles = sorted({float(q) for q in request.args.get('q', '').split(',') if q.strip()}) or list(DEFAULT_QUANTILES)
+    except ValueError:
+        return jsonify({'error': 'q must be a comma separated list of numbers between 0 and 1'}), 400
+    if len(quantiles) > MAX_QUANTILES or not all(0 <= q <= 1 for q in quantiles):
+        return jsonify({'error': f'q takes up to {MAX_QUANTILES} numbers between 0 and 1'}), 400
+    
+    try:
+        start, end = analytics_engine.parse_range(request.args.get('from'), request.args.get('to'))
+    except analytics_engine.InvalidQuery as e:
+        return jsonify({'error': str(e)}), 400
+    
+    category = request.args.get('category') or None
+    key = f'distribution:{start}:{end}:{metric}:{",".join(map(str, quantiles))}:{category or ""}'
+    return _cached(key, lambda: _order_distribution(start, end, metric, quantiles, category))
+
+def _order_distribution(start, end, metric, quantiles, category):
+    digits = 2 if metric == 'order_value' else 1
+    
+    def summary(stats):
+        return {
+            'count': stats['count'],
+            'mean': round(stats['mean'], digits),
+            'min': round(stats['min'], digits),
+            'max': round(stats['max'], digits),
+            'percentiles': {
+                f'p{q * 100:g}': round(value, digits)
+                for q, value in zip(quantiles, stats['quantiles'])
+            }
+        }
+    
+    sketches = order_sketches.distribution(start, end, metric, quantiles, category)
+    overall = sketches.pop(order_sketches.OVERALL, None)
+    
+    categories = [
+        {'category': name, **summary(stats)}
+        for name, stats in sorted(sketches.items(), key=lambda item: (-item[1]['count'], item[0]))
+    ]
+    
+    return {
+        'from': start.isoformat(),
+        'to': end.isoformat(),
+        'metric': metric,
+        'quantiles': quantiles,
+        'overall': summary(overall) if overall else None,
+        'categories': categories
+    }
 
 @admin_analytics_bp.route('/api/admin/analytics/revenue', methods=['GET'])
 @admin_required
 def get_revenue_trends():
     """Get revenue trends and breakdown"""
-    # Revenue by status
-    revenue_by_status = db.session.query(
-        Order.status,
-        func.count(Order.id).label('count'),
-        func.sum(Order.total_amount).label('revenue')
-    ).group_by(Order.status).all()
+    return _cached('revenue', _revenue_trends)
+
+def _revenue_trends():
+    # Revenue by status, from the daily rollup
+    revenue_by_status = sales_rollup.by_status()
     
     status_data = [
         {
-            'status': r.status,
-            'count': r.count,
-            'revenue': float(r.revenue or 0)
+            'status': status,
+            'count': r['order_count'],
+            'revenue': r['revenue']
         }
-        for r in revenue_by_status
+        for status, r in revenue_by_status.items()
+        if r['order_count']
     ]
     
     # Monthly revenue (last 12 months)
-    twelve_months_ago = datetime.utcnow() - timedelta(days=365)
-    monthly_revenue = db.session.query(
-        func.strftime('%Y-%m', Order.created_at).label('month'),
-        func.sum(Order.total_amount).label('revenue')
-    ).filter(Order.created_at >= twelve_months_ago).group_by(func.strftime('%Y-%m', Order.created_at)).all()
+    monthly_revenue = sales_rollup.monthly(sales_rollup.days_ago(365))
     
     monthly_data = [
         {
-            'month': m.month,
-            'revenue': float(m.revenue or 0)
+            'month': month,
+            'revenue': revenue
         }
-        for m in monthly_revenue
+        for month, revenue in monthly_revenue
     ]
     
-    return jsonify({
+    return {
         'revenue_by_status': status_data,
         'monthly_revenue': monthly_data
-    }), 200
+    }
 
 @admin_analytics_bp.route('/api/admin/analytics/products', methods=['GET'])
 @admin_required
 def get_product_analytics():
     """Get product performance metrics"""
-    # Products by category
-    products_by_category = db.session.query(
-        Product.category,
-        func.count(Product.id).label('count')
-    ).group_by(Product.category).all()
+    return _cached('products', _product_analytics)
+
+def _product_analytics():
+    # Products by category, straight from the bitmap index
+    category_counts = facet_index.value_counts('category')
+    uncategorized = facet_index.product_count() - sum(category_counts.values())
+    uncategorized += category_counts.pop('', 0)
+    if uncategorized:
+        category_counts['Uncategorized'] = category_counts.get('Uncategorized', 0) + uncategorized
     
     category_data = [
         {
-            'category': c.category or 'Uncategorized',
-            'count': c.count
+            'category': category,
+            'count': count
         }
-        for c in products_by_category
+        for category, count in category_counts.items()
     ]
     
     # Best selling products
-    best_sellers = db.session.query(
-        Product.id,
-        Product.name,
-        Product.category,
-        Product.price,
-        func.sum(OrderItem.quantity).label('total_sold'),
-        func.sum(OrderItem.quantity * OrderItem.price).label('total_revenue')
-    ).join(OrderItem).group_by(Product.id).order_by(func.sum(OrderItem.quantity).desc()).limit(10).all()
-    
     best_sellers_data = [
         {
             'id': p.id,
             'name': p.name,
             'category': p.category,
             'price': p.price,
-            'total_sold': p.total_sold,
-            'total_revenue': float(p.total_revenue or 0)
+            'total_sold': total_sold,
+            'total_revenue': float(total_revenue)
         }
-        for p in best_sellers
+        for p, total_sold, total_revenue in _best_sellers(10)
     ]
     
-    return jsonify({
+    return {
         'products_by_category': category_data,
         'best_sellers': best_sellers_data
-    }), 200
+    }
+
+@admin_analytics_bp.route('/api/admin/analytics/cache-stats', methods=['GET'])
+@admin_required
+def get_analytics_cache_stats():
+    """Counters for the analytics response cache"""
+    return jsonify(analytics_cache.stats()), 200
+
+@admin_analytics_bp.route('/api/admin/analytics/stream/token', methods=['POST'])
+@admin_required
+def create_stream_token():
+    """Short-lived token for opening the event stream (passed to it as ?jwt=)"""
+    token, expires_in = stream_token(get_jwt_identity())
+    return jsonify({'token': token, 'expires_in': expires_in}), 200
+
+@admin_analytics_bp.route('/api/admin/analytics/stream', methods=['GET'])
+@admin_required_stream
+def stream_analytics():
+    """
+    Server-sent events with live dashboard deltas: order.created, revenue,
+    order.status_changed, stock.low and stock.restocked. A resync event means
+    updates were lost and the full payloads should be fetched again.
+    Takes a token from POST /stream/token as ?jwt= (EventSource cannot set
+    headers); a client reopening the stream with a fresh token passes the
+    last id it saw as ?last_event_id=.
+    """
+    last_event_id = request.headers.get('Last-Event-ID', type=int)
+    if last_event_id is None:
+        last_event_id = request.args.get('last_event_id', type=int)
+    try:
+        subscription = event_bus.bus.subscribe(last_event_id)
+    except event_bus.TooManySubscribers as e:
+        return jsonify({'error': str(e)}), 503
+    
+    try:
+        live_events.stream_opened()
+    except Exception:
+        subscription.close()
+        raise
+    # The stream can stay open for hours; don't hold a database connection for it
+    db.session.close()
+    
+    def events():
+        try:
+            yield f'retry: {SSE_RETRY_MS}\n\n'
+            while True:
+                batch, dropped = subscription.get(SSE_KEEPALIVE_SECONDS)
+                if subscription.closed:
+                    return
+                if dropped:
+                    yield _sse_message('resync', {'dropped': dropped})
+                for event_id, event_type, data in batch:
+                    yield _sse_message(event_type, data, event_id)
+                if not batch and not dropped:
+                    yield ': keepalive\n\n'
+        finally:
+            subscription.close()
+    
+    return Response(events(), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no'
+    })
+
+def _sse_message(event_type, data, event_id=None):
+    message = f'event: {event_type}\ndata: {json.dumps(data, separators=(",", ":"))}\n\n'
+    return f'id: {event_id}\n{message}' if event_id is not None else message
+
+@admin_analytics_bp.route('/api/admin/analytics/stream/stats', methods=['GET'])
+@admin_required
+def get_stream_stats():
+    """Connected streams and events published by this process"""
+    return jsonify(event_bus.bus.stats()), 200
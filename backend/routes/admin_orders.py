@@ -1,20 +1,25 @@
 from flask import Blueprint, request, jsonify
 from middleware.admin_auth import admin_required
 from models import Order, User, OrderItem, db
-from datetime import datetime, timedelta
 from sqlalchemy import func
+from sqlalchemy.orm import joinedload, selectinload
+from services import analytics_cache, order_archive, order_events, order_status, product_cache, sales_rollup
 
 admin_orders_bp = Blueprint('admin_orders', __name__)
 
 @admin_orders_bp.route('/api/admin/orders', methods=['GET'])
 @admin_required
 def get_all_orders():
-    """Get all orders with pagination and filters"""
+    """
+    Get all orders with pagination and filters.
+    A page costs a fixed number of queries: count, orders joined to users,
+    their items, and products the product cache is missing.
+    """
     page = request.args.get('page', 1, type=int)
     per_page = request.args.get('per_page', 20, type=int)
     status = request.args.get('status', '')
     
-    query = Order.query
+    query = Order.query.options(joinedload(Order.user), selectinload(Order.order_items))
     
     if status:
         query = query.filter(Order.status == status)
@@ -23,11 +28,15 @@ def get_all_orders():
         page=page, per_page=per_page, error_out=False
     )
     
+    products = product_cache.get_products(
+        item.product_id for order in pagination.items for item in order.order_items
+    )
+    
     orders = []
     for order in pagination.items:
-        order_dict = order.to_dict()
+        order_dict = order.to_dict(products)
         # Add user information
-        user = User.query.get(order.user_id)
+        user = order.user
         if user:
             order_dict['user'] = {
                 'id': user.id,
@@ -49,7 +58,7 @@ def get_all_orders():
 @admin_required
 def get_order_details(order_id):
     """Get detailed information about a specific order"""
-    order = Order.query.get(order_id)
+    order = order_archive.find_order(order_id)
     if not order:
         return jsonify({'error': 'Order not found'}), 404
     
@@ -65,7 +74,7 @@ def get_order_details(order_id):
 @admin_orders_bp.route('/api/admin/orders/<int:order_id>/status', methods=['PATCH'])
 @admin_required
 def update_order_status(order_id):
-    """Update order status"""
+    """Update order status (only allowed transitions, as for the bulk endpoint)"""
     order = Order.query.get(order_id)
     if not order:
         return jsonify({'error': 'Order not found'}), 404
@@ -74,54 +83,100 @@ def update_order_status(order_id):
     if 'status' not in data:
         return jsonify({'error': 'status is required'}), 400
     
-    valid_statuses = ['pending', 'processing', 'shipped', 'delivered', 'cancelled']
+    valid_statuses = order_status.ORDER_STATUSES
     if data['status'] not in valid_statuses:
         return jsonify({'error': f'Invalid status. Must be one of: {", ".join(valid_statuses)}'}), 400
     
     try:
-        order.status = data['status']
-        order.updated_at = datetime.utcnow()
+        result, changes = order_status.change_status(order.id, data['status'])
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 500
+    
+    if result['result'] in ('rejected', 'conflict'):
+        return jsonify({'error': result['error']}), 409
+    order_events.orders_status_changed(changes)
+    
+    return jsonify({
+        'message': 'Order status updated successfully',
+        'order': order.to_dict()
+    }), 200
+
+@admin_orders_bp.route('/api/admin/orders/status', methods=['PATCH'])
+@admin_required
+def bulk_update_order_status():
+    """
+    Change the status of many orders at once.
+    Body: {"updates": [{"order_id": 1, "status": "shipped"}, ...]}
+      or: {"order_ids": [1, 2, 3], "status": "shipped"}
+    Only allowed transitions are applied; each order gets a compact result.
+    """
+    data = request.get_json(silent=True) or {}
+    if 'updates' in data:
+        entries = data['updates']
+    elif isinstance(data.get('order_ids'), list):
+        entries = [{'order_id': order_id, 'status': data.get('status')} for order_id in data['order_ids']]
+    else:
+        return jsonify({'error': 'updates or order_ids and status are required'}), 400
+    
+    try:
+        results, changes = order_status.apply_status_changes(entries)
         db.session.commit()
-        
-        return jsonify({
-            'message': 'Order status updated successfully',
-            'order': order.to_dict()
-        }), 200
+    except order_status.StatusUpdateError as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         db.session.rollback()
         return jsonify({'error': str(e)}), 500
+    
+    order_events.orders_status_changed(changes)
+    
+    summary = {}
+    for result in results:
+        summary[result['result']] = summary.get(result['result'], 0) + 1
+    return jsonify({
+        'results': results,
+        'summary': summary
+    }), 200
 
 @admin_orders_bp.route('/api/admin/orders/stats', methods=['GET'])
 @admin_required
 def get_order_stats():
-    """Get order statistics"""
-    # Total orders
-    total_orders = Order.query.count()
+    """Get order statistics (from the daily sales rollup)"""
+    data, state = analytics_cache.get_or_compute('order-stats', _order_stats)
+    response = jsonify(data)
+    response.headers['X-Analytics-Cache'] = state
+    return response, 200
+
+def _order_stats():
+    # Every figure comes from one grouped pass over the rollup
+    by_status = sales_rollup.by_status(windows={
+        'last_7_days': sales_rollup.days_ago(7),
+        'last_30_days': sales_rollup.days_ago(30)
+    })
     
-    # Orders by status
-    orders_by_status = db.session.query(
-        Order.status, func.count(Order.id)
-    ).group_by(Order.status).all()
+    # Total orders and revenue
+    total_orders = sum(totals['order_count'] for totals in by_status.values())
+    total_revenue = sum(totals['revenue'] for totals in by_status.values())
     
-    status_counts = {status: count for status, count in orders_by_status}
+    # Orders by status
+    status_counts = {
+        status: totals['order_count']
+        for status, totals in by_status.items()
+        if totals['order_count']
+    }
     
     # Recent orders (last 7 days)
-    seven_days_ago = datetime.utcnow() - timedelta(days=7)
-    recent_orders = Order.query.filter(Order.created_at >= seven_days_ago).count()
-    
-    # Total revenue
-    total_revenue = db.session.query(func.sum(Order.total_amount)).scalar() or 0
+    recent_orders = sum(totals['last_7_days']['order_count'] for totals in by_status.values())
     
     # Revenue last 30 days
-    thirty_days_ago = datetime.utcnow() - timedelta(days=30)
-    recent_revenue = db.session.query(func.sum(Order.total_amount)).filter(
-        Order.created_at >= thirty_days_ago
-    ).scalar() or 0
+    recent_revenue = sum(totals['last_30_days']['revenue'] for totals in by_status.values())
     
-    return jsonify({
+    return {
         'total_orders': total_orders,
         'orders_by_status': status_counts,
         'recent_orders_7_days': recent_orders,
         'total_revenue': float(total_revenue),
         'revenue_last_30_days': float(recent_revenue)
-    }), 200
+    }
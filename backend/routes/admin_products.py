@@ -3,6 +3,12 @@ from flask_jwt_extended import jwt_required
 from middleware.admin_auth import admin_required
 from models import Product, db
 from datetime import datetime
+from services import product_events, product_cache, facet_index
+from services.facet_index import bitset_from_ids, iter_ids
+from services.search_index import search_product_ids
+from services import product_import
+from services.stock_updates import apply_stock_updates, StockUpdateError
+from services.fieldsets import parse_product_fields, product_columns, InvalidFields
 
 admin_products_bp = Blueprint('admin_products', __name__)
 
@@ -15,10 +21,17 @@ def get_all_products():
     search = request.args.get('search', '')
     category = request.args.get('category', '')
     
+    try:
+        fields = parse_product_fields(request.args.get('fields'))
+    except InvalidFields as e:
+        return jsonify({'error': str(e)}), 400
+    
     query = Product.query
+    if fields:
+        query = query.options(product_columns(fields))
     
     if search:
-        query = query.filter(Product.name.ilike(f'%{search}%'))
+        return _search_results(query, search, category, page, per_page, fields)
     if category:
         query = query.filter(Product.category == category)
     
@@ -27,12 +40,31 @@ def get_all_products():
     )
     
     return jsonify({
-        'products': [product.to_dict() for product in pagination.items],
+        'products': [product.to_dict(fields) for product in pagination.items],
         'total': pagination.total,
         'pages': pagination.pages,
         'current_page': page
     }), 200
 
+def _search_results(query, search, category, page, per_page, fields):
+    """Page through search hits in relevance order"""
+    ranked_ids = search_product_ids(search)
+    if category and ranked_ids:
+        hits = bitset_from_ids(ranked_ids)
+        matching = set(iter_ids(facet_index.match({'category': category}, within=hits)))
+        ranked_ids = [pid for pid in ranked_ids if pid in matching]
+    
+    total = len(ranked_ids)
+    page_ids = ranked_ids[(page - 1) * per_page:page * per_page]
+    by_id = {p.id: p for p in query.filter(Product.id.in_(page_ids))} if page_ids else {}
+    
+    return jsonify({
+        'products': [by_id[pid].to_dict(fields) for pid in page_ids if pid in by_id],
+        'total': total,
+        'pages': (total + per_page - 1) // per_page if per_page > 0 else 0,
+        'current_page': page
+    }), 200
+
 @admin_products_bp.route('/api/admin/products', methods=['POST'])
 @admin_required
 def create_product():
@@ -60,6 +92,7 @@ def create_product():
         
         db.session.add(product)
         db.session.commit()
+        product_events.product_saved(product)
         
         return jsonify({
             'message': 'Product created successfully',
@@ -102,6 +135,7 @@ def update_product(product_id):
             product.is_featured = data['is_featured']
         
         db.session.commit()
+        product_events.product_saved(product)
         
         return jsonify({
             'message': 'Product updated successfully',
@@ -122,6 +156,7 @@ def delete_product(product_id):
     try:
         db.session.delete(product)
         db.session.commit()
+        product_events.product_deleted(product_id)
         
         return jsonify({'message': 'Product deleted successfully'}), 200
     except Exception as e:
@@ -143,6 +178,7 @@ def update_stock(product_id):
     try:
         product.stock_quantity = data['stock_quantity']
         db.session.commit()
+        product_events.stock_changed([product_id])
         
         return jsonify({
             'message': 'Stock updated successfully',
@@ -151,3 +187,68 @@ def update_stock(product_id):
     except Exception as e:
         db.session.rollback()
         return jsonify({'error': str(e)}), 500
+
+@admin_products_bp.route('/api/admin/products/stock', methods=['PATCH'])
+@admin_required
+def bulk_update_stock():
+    """
+    Update stock for many products in one transaction.
+    Body: {"updates": [{"product_id": 1, "stock_quantity": 10}, {"product_id": 2, "delta": -3}]}
+    """
+    data = request.get_json(silent=True) or {}
+    if 'updates' not in data:
+        return jsonify({'error': 'updates is required'}), 400
+    
+    try:
+        result = apply_stock_updates(data['updates'])
+        db.session.commit()
+    except StockUpdateError as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 500
+    
+    if result['updated']:
+        product_events.stock_changed([entry['product_id'] for entry in result['updated']])
+    
+    return jsonify(result), 200
+
+@admin_products_bp.route('/api/admin/products/import', methods=['POST'])
+@admin_required
+def import_products():
+    """
+    Bulk upsert products from CSV or NDJSON, keyed on (name, brand).
+    Send the file as multipart 'file' or as the raw request body; the
+    format comes from ?format=, the file name or the Content-Type.
+    """
+    upload = request.files.get('file')
+    fmt = request.args.get('format')
+    if upload:
+        fmt = fmt or product_import.detect_format(upload.filename, upload.mimetype)
+        stream = upload.stream
+    else:
+        fmt = fmt or product_import.detect_format(content_type=request.content_type)
+        stream = request.stream
+    
+    if fmt not in product_import.FORMATS:
+        return jsonify({'error': f'format must be one of: {", ".join(product_import.FORMATS)}'}), 400
+    
+    batch_size = request.args.get('batch_size', product_import.DEFAULT_BATCH_SIZE, type=int)
+    
+    try:
+        report = product_import.import_products(
+            product_import.open_text_stream(stream), fmt, batch_size=batch_size
+        )
+    except UnicodeDecodeError:
+        return jsonify({'error': 'Input must be UTF-8 encoded'}), 400
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+    
+    return jsonify(report), 200
+
+@admin_products_bp.route('/api/admin/products/cache-stats', methods=['GET'])
+@admin_required
+def get_cache_stats():
+    """Hit/miss/eviction counters for the product cache"""
+    return jsonify(product_cache.stats()), 200
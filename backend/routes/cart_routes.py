@@ -1,17 +1,55 @@
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, request, jsonify, abort
 from flask_jwt_extended import jwt_required, get_jwt_identity
+from sqlalchemy import case, func
 from models import CartItem, Product
 from database import db
+from services import cart_store, guest_cart, product_cache
 
 bp = Blueprint('cart', __name__, url_prefix='/api/cart')
 
+MAX_BATCH_OPERATIONS = 500
+
 @bp.route('/', methods=['GET'])
 @jwt_required()
 def get_cart():
-    """Get user's cart items"""
+    """Get user's cart items with a server-computed summary"""
     user_id = get_jwt_identity()
-    cart_items = CartItem.query.filter_by(user_id=user_id).all()
-    return jsonify([item.to_dict() for item in cart_items])
+    return jsonify(cart_view(user_id))
+
+def cart_view(user_id):
+    """
+    Cart items, their products, line totals, stock flags and the cart
+    totals, all from one joined query (window sums carry the totals).
+    """
+    line_total = CartItem.quantity * Product.price
+    rows = db.session.query(
+        CartItem,
+        Product,
+        line_total.label('line_total'),
+        case((Product.stock_quantity >= CartItem.quantity, 1), else_=0).label('in_stock'),
+        func.sum(CartItem.quantity).over().label('item_count'),
+        func.sum(line_total).over().label('subtotal')
+    ).join(Product, CartItem.product_id == Product.id).filter(
+        CartItem.user_id == user_id
+    ).order_by(CartItem.added_at, CartItem.id).all()
+    
+    items = []
+    for row in rows:
+        item = row.CartItem.to_dict({row.Product.id: row.Product.to_dict()})
+        item['line_total'] = round(float(row.line_total), 2)
+        item['in_stock'] = bool(row.in_stock)
+        items.append(item)
+    
+    first = rows[0] if rows else None
+    return {
+        'items': items,
+        'summary': {
+            'line_count': len(rows),
+            'item_count': int(first.item_count) if first else 0,
+            'subtotal': round(float(first.subtotal), 2) if first else 0.0,
+            'all_in_stock': all(item['in_stock'] for item in items)
+        }
+    }
 
 @bp.route('/add', methods=['POST'])
 @jwt_required()
@@ -24,26 +62,109 @@ def add_to_cart():
     quantity = data.get('quantity', 1)
     
     # Check if product exists
-    product = Product.query.get_or_404(product_id)
-    
-    # Check if item already in cart
-    cart_item = CartItem.query.filter_by(
-        user_id=user_id,
-        product_id=product_id
-    ).first()
-    
-    if cart_item:
-        cart_item.quantity += quantity
-    else:
-        cart_item = CartItem(
-            user_id=user_id,
-            product_id=product_id,
-            quantity=quantity
-        )
-        db.session.add(cart_item)
+    product = product_cache.get_product(product_id)
+    if product is None:
+        abort(404)
     
+    # Insert the line or add to the existing one in a single statement
+    row = cart_store.add_items(user_id, {product_id: quantity})[0]
     db.session.commit()
-    return jsonify(cart_item.to_dict()), 201
+    
+    cart_item = CartItem(**row._mapping)
+    return jsonify(cart_item.to_dict({product_id: product})), 201
+
+@bp.route('/batch', methods=['POST'])
+@jwt_required()
+def batch_cart():
+    """
+    Apply many cart operations in one transaction.
+    Body: {"operations": [{"op": "add" | "set" | "remove", "product_id": 1, "quantity": 2}, ...]}
+    Operations apply in order; either all of them succeed or none do.
+    """
+    user_id = get_jwt_identity()
+    data = request.get_json(silent=True) or {}
+    operations = data.get('operations')
+    
+    if not isinstance(operations, list) or not operations:
+        return jsonify({'error': 'operations must be a non-empty list'}), 400
+    if len(operations) > MAX_BATCH_OPERATIONS:
+        return jsonify({'error': f'At most {MAX_BATCH_OPERATIONS} operations per request'}), 400
+    
+    adds, sets, removes, errors = cart_store.fold_operations(operations)
+    if errors:
+        return jsonify({'error': 'Invalid operations', 'details': errors}), 400
+    
+    wanted = list(adds) + list(sets)
+    products = product_cache.get_products(wanted)
+    missing = [product_id for product_id in wanted if product_id not in products]
+    if missing:
+        return jsonify({'error': 'Products not found', 'missing': missing}), 404
+    
+    try:
+        cart_store.apply_operations(user_id, adds, sets, removes)
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+    
+    return jsonify(cart_view(user_id))
+
+@bp.route('/guest', methods=['GET'])
+def get_guest_cart():
+    """Guest cart from the signed token in the X-Guest-Cart header (no login, no writes)"""
+    try:
+        cart_id, items = guest_cart.read(request.headers.get('X-Guest-Cart'))
+    except guest_cart.InvalidGuestCart as e:
+        return jsonify({'error': str(e)}), 400
+    return jsonify(guest_cart.view(items, cart_id))
+
+@bp.route('/guest/batch', methods=['POST'])
+def batch_guest_cart():
+    """
+    Apply cart operations to a guest cart.
+    Body: {"token": "...", "operations": [...]} with the same operations as /batch.
+    Returns the cart and its new token.
+    """
+    data = request.get_json(silent=True) or {}
+    operations = data.get('operations')
+    
+    if not isinstance(operations, list) or not operations:
+        return jsonify({'error': 'operations must be a non-empty list'}), 400
+    if len(operations) > MAX_BATCH_OPERATIONS:
+        return jsonify({'error': f'At most {MAX_BATCH_OPERATIONS} operations per request'}), 400
+    
+    adds, sets, removes, errors = cart_store.fold_operations(operations)
+    if errors:
+        return jsonify({'error': 'Invalid operations', 'details': errors}), 400
+    
+    wanted = list(adds) + list(sets)
+    products = product_cache.get_products(wanted)
+    missing = [product_id for product_id in wanted if product_id not in products]
+    if missing:
+        return jsonify({'error': 'Products not found', 'missing': missing}), 404
+    
+    try:
+        cart_id, items = guest_cart.read(data.get('token'))
+        items = guest_cart.apply_operations(items, adds, sets, removes)
+    except guest_cart.InvalidGuestCart as e:
+        return jsonify({'error': str(e)}), 400
+    return jsonify(guest_cart.view(items, cart_id))
+
+@bp.route('/merge', methods=['POST'])
+@jwt_required()
+def merge_guest_cart():
+    """Fold a guest cart token into the user's cart (a cart that was already merged adds nothing)"""
+    user_id = get_jwt_identity()
+    data = request.get_json(silent=True) or {}
+    
+    try:
+        guest_cart.merge_into(user_id, data.get('token'))
+        db.session.commit()
+    except guest_cart.InvalidGuestCart as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 400
+    
+    return jsonify(cart_view(user_id))
 
 @bp.route('/<int:id>', methods=['PUT'])
 @jwt_required()
@@ -56,7 +177,7 @@ def update_cart_item(id):
     cart_item.quantity = data['quantity']
     
     db.session.commit()
-    return jsonify(cart_item.to_dict())
+    return jsonify(cart_item.to_dict(product_cache.get_products([cart_item.product_id])))
 
 @bp.route('/<int:id>', methods=['DELETE'])
 @jwt_required()
@@ -0,0 +1,16 @@
+from flask import Blueprint, send_from_directory
+from services.image_variants import IMAGE_CACHE_DIR, MANIFEST_NAME
+
+bp = Blueprint('media', __name__, url_prefix='/media')
+
+# Variant file names embed the source's content hash, so they never change
+VARIANT_MAX_AGE = 365 * 24 * 3600
+
+@bp.route('/variants/<path:filename>', methods=['GET'])
+def get_image_variant(filename):
+    """Serve a generated image variant"""
+    if filename == MANIFEST_NAME:
+        return '', 404
+    response = send_from_directory(IMAGE_CACHE_DIR, filename, max_age=VARIANT_MAX_AGE)
+    response.headers['Cache-Control'] = f'public, max-age={VARIANT_MAX_AGE}, immutable'
+    return response
@@ -1,84 +1,142 @@
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, request, jsonify, abort
 from flask_jwt_extended import jwt_required, get_jwt_identity
-from models import Order, OrderItem, CartItem, Product
+from sqlalchemy import func
+from sqlalchemy.orm import selectinload
+from models import Order
 from database import db
-from datetime import datetime
+from middleware.admin_auth import admin_required
+from middleware.idempotency import idempotent
+from services import checkout, order_archive, order_events, order_status, product_cache, product_events
+from services.pagination import merged_keyset_page, InvalidCursor
 
 bp = Blueprint('orders', __name__, url_prefix='/api/orders')
 
+DEFAULT_PAGE_SIZE = 20
+MAX_PAGE_SIZE = 100
+
+# SQL Server allows at most 2100 parameters per statement
+MAX_IN_CLAUSE = 1000
+
 @bp.route('/', methods=['GET'])
 @jwt_required()
 def get_orders():
-    """Get user's orders"""
+    """
+    Get user's orders, newest first.
+    Results are cursor paginated (limit, cursor); pass all=true for the full list.
+    view=summary leaves out the items and returns an item count instead.
+    """
     user_id = get_jwt_identity()
-    orders = Order.query.filter_by(user_id=user_id).order_by(Order.created_at.desc()).all()
-    return jsonify([order.to_dict() for order in orders])
+    view = request.args.get('view', 'full')
+    if view not in ('full', 'summary'):
+        return jsonify({'error': 'Invalid view. Must be one of: full, summary'}), 400
+    
+    # Closed orders may have moved to the archive; both tables are read and merged
+    sources = []
+    for model, _ in order_archive.SOURCES:
+        query = model.query.filter_by(user_id=user_id)
+        if view == 'full':
+            query = query.options(selectinload(model.order_items))
+        sources.append((query, model.created_at, model.id))
+    
+    if request.args.get('all', '').lower() in ('1', 'true', 'yes'):
+        orders = [order for query, _, _ in sources for order in query.all()]
+        orders.sort(key=lambda order: (order.created_at, order.id), reverse=True)
+        return jsonify(_serialize_orders(orders, view))
+    
+    limit = max(1, min(request.args.get('limit', DEFAULT_PAGE_SIZE, type=int), MAX_PAGE_SIZE))
+    try:
+        orders, next_cursor, prev_cursor = merged_keyset_page(
+            sources, 'orders', limit,
+            cursor=request.args.get('cursor'), descending=True
+        )
+    except InvalidCursor as e:
+        return jsonify({'error': str(e)}), 400
+    
+    return jsonify({
+        'orders': _serialize_orders(orders, view),
+        'next_cursor': next_cursor,
+        'prev_cursor': prev_cursor,
+        'limit': limit,
+        'view': view
+    })
+
+def _serialize_orders(orders, view):
+    """Orders with items (products from the product cache) or with item counts only"""
+    if view == 'summary':
+        counts = _item_counts([order.id for order in orders])
+        result = []
+        for order in orders:
+            data = order.to_dict(include_items=False)
+            data['item_count'] = counts.get(order.id, 0)
+            result.append(data)
+        return result
+    
+    products = product_cache.get_products(
+        item.product_id for order in orders for item in order.order_items
+    )
+    return [order.to_dict(products) for order in orders]
+
+def _item_counts(order_ids):
+    """{order_id: total quantity} in one grouped query per chunk and table"""
+    counts = {}
+    for start in range(0, len(order_ids), MAX_IN_CLAUSE):
+        chunk = order_ids[start:start + MAX_IN_CLAUSE]
+        for _, item_model in order_archive.SOURCES:
+            counts.update(db.session.query(
+                item_model.order_id, func.sum(item_model.quantity)
+            ).filter(item_model.order_id.in_(chunk)).group_by(item_model.order_id))
+    return {order_id: int(total) for order_id, total in counts.items()}
 
 @bp.route('/<int:id>', methods=['GET'])
 @jwt_required()
 def get_order(id):
     """Get a specific order"""
     user_id = get_jwt_identity()
-    order = Order.query.filter_by(id=id, user_id=user_id).first_or_404()
-    return jsonify(order.to_dict())
+    order = order_archive.find_order(id, user_id=user_id)
+    if order is None:
+        abort(404)
+    return jsonify(order.to_dict(_order_products(order)))
 
 @bp.route('/create', methods=['POST'])
 @jwt_required()
+@idempotent
 def create_order():
-    """Create a new order from cart"""
+    """Create a new order from cart (retries with the same Idempotency-Key replay the result)"""
     user_id = get_jwt_identity()
     data = request.get_json()
     
-    # Get cart items
-    cart_items = CartItem.query.filter_by(user_id=user_id).all()
-    
-    if not cart_items:
-        return jsonify({'error': 'Cart is empty'}), 400
-    
-    # Calculate total
-    total_amount = 0
-    for item in cart_items:
-        total_amount += item.product.price * item.quantity
-    
-    # Create order
-    order = Order(
-        user_id=user_id,
-        total_amount=total_amount,
-        shipping_address=data['shipping_address'],
-        payment_method=data.get('payment_method', 'cash_on_delivery')
-    )
-    
-    db.session.add(order)
-    db.session.flush()  # Get order ID
-    
-    # Create order items
-    for cart_item in cart_items:
-        order_item = OrderItem(
-            order_id=order.id,
-            product_id=cart_item.product_id,
-            quantity=cart_item.quantity,
-            price=cart_item.product.price
+    try:
+        order, product_ids = checkout.place_order(
+            user_id,
+            shipping_address=data['shipping_address'],
+            payment_method=data.get('payment_method', 'cash_on_delivery')
         )
-        db.session.add(order_item)
-        
-        # Update product stock
-        cart_item.product.stock_quantity -= cart_item.quantity
+    except checkout.EmptyCart as e:
+        return jsonify({'error': str(e)}), 400
+    except checkout.InsufficientStock as e:
+        return jsonify({'error': str(e), 'shortages': e.shortages}), 409
     
-    # Clear cart
-    CartItem.query.filter_by(user_id=user_id).delete()
-    
-    db.session.commit()
-    return jsonify(order.to_dict()), 201
+    product_events.stock_changed(product_ids)
+    order_events.order_placed(order)
+    return jsonify(order.to_dict(_order_products(order))), 201
 
 @bp.route('/<int:id>/status', methods=['PUT'])
-@jwt_required()
+@admin_required
 def update_order_status(id):
-    """Update order status (Admin only)"""
+    """Update order status (Admin only; only allowed transitions)"""
     order = Order.query.get_or_404(id)
-    data = request.get_json()
+    data = request.get_json(silent=True) or {}
+    if data.get('status') not in order_status.ORDER_STATUSES:
+        return jsonify({'error': f'Invalid status. Must be one of: {", ".join(order_status.ORDER_STATUSES)}'}), 400
     
-    order.status = data['status']
-    order.updated_at = datetime.utcnow()
+    result, changes = order_status.change_status(order.id, data['status'])
+    if result['result'] in ('rejected', 'conflict'):
+        db.session.rollback()
+        return jsonify({'error': result['error']}), 409
     
     db.session.commit()
-    return jsonify(order.to_dict())
+    order_events.orders_status_changed(changes)
+    return jsonify(order.to_dict(_order_products(order)))
+
+def _order_products(order):
+    return product_cache.get_products(item.product_id for item in order.order_items)
@@ -1,39 +1,226 @@
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, request, jsonify, abort
 from models import Product
 from database import db
+from middleware.conditional_get import catalog_conditional
+from services.pagination import keyset_page, encode_cursor, decode_cursor, InvalidCursor
+from services import product_events, product_cache, facet_index
+from services.fieldsets import parse_product_fields, product_columns, InvalidFields
+from services.facet_index import FACET_FIELDS, bitset_from_ids, iter_ids, popcount
+from services.search_index import search_product_ids
 
 bp = Blueprint('products', __name__, url_prefix='/api/products')
 
+DEFAULT_PAGE_SIZE = 24
+MAX_PAGE_SIZE = 100
+
+# An explicitly sorted search is narrowed to the top hits with an IN list;
+# keep it well under SQL Server's 2100 parameter limit
+SEARCH_RESULT_LIMIT = 1000
+
+# Upper bound on ids per batch lookup
+MAX_BATCH_IDS = 500
+
+# sort name -> (column, descending)
+SORT_OPTIONS = {
+    'newest': (Product.created_at, True),
+    'oldest': (Product.created_at, False),
+    'price_asc': (Product.price, False),
+    'price_desc': (Product.price, True),
+}
+
 @bp.route('/', methods=['GET'])
+@catalog_conditional
 def get_products():
-    """Get all products with optional filtering"""
-    category = request.args.get('category')
-    age_range = request.args.get('age_range')
+    """
+    Get products with optional filtering.
+    Results are cursor paginated; pass all=true for the full unpaginated list.
+    Searches are ranked by relevance unless an explicit sort is given.
+    Paginated responses include facet counts for the filterable fields.
+    fields=name,price,... limits the columns loaded and returned.
+    """
+    try:
+        fields = parse_product_fields(request.args.get('fields'))
+    except InvalidFields as e:
+        return jsonify({'error': str(e)}), 400
+    
+    filters = _filter_args()
     search = request.args.get('search')
+    return_all = request.args.get('all', '').lower() in ('1', 'true', 'yes')
     
     query = Product.query
+    for field, value in filters.items():
+        query = query.filter(getattr(Product, field) == value)
     
-    if category:
-        query = query.filter_by(category=category)
-    if age_range:
-        query = query.filter_by(age_range=age_range)
+    hits = None
     if search:
-        query = query.filter(Product.name.contains(search))
+        ranked_ids = search_product_ids(search)
+        hits = bitset_from_ids(ranked_ids)
+        if filters:
+            matching = set(iter_ids(facet_index.match(filters, within=hits)))
+            ranked_ids = [pid for pid in ranked_ids if pid in matching]
+        if 'sort' not in request.args:
+            return _relevance_page(ranked_ids, return_all, filters, hits, fields)
+        query = query.filter(Product.id.in_(ranked_ids[:SEARCH_RESULT_LIMIT]))
+    
+    if return_all:
+        if fields:
+            query = query.options(product_columns(fields))
+        products = query.all()
+        return jsonify([product.to_dict(fields) for product in products])
+    
+    sort = request.args.get('sort', 'newest')
+    if sort not in SORT_OPTIONS:
+        return jsonify({'error': f'Invalid sort. Must be one of: {", ".join(SORT_OPTIONS)}'}), 400
+    sort_column, descending = SORT_OPTIONS[sort]
     
-    products = query.all()
-    return jsonify([product.to_dict() for product in products])
+    limit = _page_limit()
+    if fields:
+        query = query.options(product_columns(fields, sort_column))
+    
+    try:
+        products, next_cursor, prev_cursor = keyset_page(
+            query, sort, sort_column, Product.id, limit,
+            cursor=request.args.get('cursor'), descending=descending
+        )
+    except InvalidCursor as e:
+        return jsonify({'error': str(e)}), 400
+    
+    return jsonify({
+        'products': [product.to_dict(fields) for product in products],
+        'next_cursor': next_cursor,
+        'prev_cursor': prev_cursor,
+        'limit': limit,
+        'sort': sort,
+        **_facet_summary(filters, hits)
+    })
+
+def _filter_args():
+    """Facet filters from the query string (is_featured accepts true/false)"""
+    filters = {}
+    for field in FACET_FIELDS:
+        value = request.args.get(field)
+        if not value:
+            continue
+        if field == 'is_featured':
+            if value.lower() not in ('1', 'true', '0', 'false'):
+                continue
+            value = value.lower() in ('1', 'true')
+        filters[field] = value
+    return filters
+
+def _facet_summary(filters, hits=None):
+    """Total match count plus per-value facet counts, all from the bitmap index"""
+    return {
+        'total': popcount(facet_index.match(filters, within=hits)),
+        'facets': facet_index.facet_counts(filters, within=hits)
+    }
+
+def _page_limit():
+    limit = request.args.get('limit', DEFAULT_PAGE_SIZE, type=int)
+    return max(1, min(limit, MAX_PAGE_SIZE))
+
+def _products_in_order(ids, fields=None):
+    """Load products by id, preserving the order of ids"""
+    if not ids:
+        return []
+    query = Product.query.filter(Product.id.in_(ids))
+    if fields:
+        query = query.options(product_columns(fields))
+    by_id = {p.id: p for p in query}
+    return [by_id[pid] for pid in ids if pid in by_id]
+
+def _relevance_page(ranked_ids, return_all, filters, hits, fields):
+    """Paginate an in-memory ranking; the cursor is a position in it"""
+    if return_all:
+        return jsonify([p.to_dict(fields) for p in _products_in_order(ranked_ids, fields)])
+    
+    limit = _page_limit()
+    offset = 0
+    cursor = request.args.get('cursor')
+    if cursor:
+        try:
+            offset, _, _ = decode_cursor(cursor, 'relevance')
+        except InvalidCursor as e:
+            return jsonify({'error': str(e)}), 400
+        if not isinstance(offset, int) or offset < 0:
+            return jsonify({'error': 'Invalid cursor'}), 400
+    
+    page_ids = ranked_ids[offset:offset + limit]
+    next_offset = offset + limit
+    return jsonify({
+        'products': [p.to_dict(fields) for p in _products_in_order(page_ids, fields)],
+        'next_cursor': encode_cursor('relevance', next_offset, 0, 'next') if next_offset < len(ranked_ids) else None,
+        'prev_cursor': encode_cursor('relevance', max(0, offset - limit), 0, 'prev') if offset > 0 else None,
+        'limit': limit,
+        'sort': 'relevance',
+        **_facet_summary(filters, hits)
+    })
 
 @bp.route('/<int:id>', methods=['GET'])
+@catalog_conditional
 def get_product(id):
     """Get a single product by ID"""
-    product = Product.query.get_or_404(id)
-    return jsonify(product.to_dict())
+    product = product_cache.get_product(id)
+    if product is None:
+        abort(404)
+    return jsonify(product)
+
+@bp.route('/batch', methods=['GET'])
+@catalog_conditional
+def get_products_batch():
+    """Look up many products at once: ?ids=1,2,3"""
+    raw_ids = [part for part in request.args.get('ids', '').split(',') if part.strip()]
+    return _batch_response(raw_ids, request.args.get('fields'))
+
+@bp.route('/batch', methods=['POST'])
+def post_products_batch():
+    """Batch lookup for id lists too long for a query string: {"ids": [...]}"""
+    data = request.get_json(silent=True) or {}
+    raw_ids = data.get('ids')
+    if not isinstance(raw_ids, list):
+        return jsonify({'error': 'ids must be a list'}), 400
+    return _batch_response(raw_ids, data.get('fields'))
+
+def _batch_response(raw_ids, raw_fields):
+    """Products keyed by id, served from the product cache with one IN query for misses"""
+    try:
+        ids = list(dict.fromkeys(int(product_id) for product_id in raw_ids))
+    except (TypeError, ValueError):
+        return jsonify({'error': 'ids must be integers'}), 400
+    if not ids:
+        return jsonify({'error': 'ids is required'}), 400
+    if len(ids) > MAX_BATCH_IDS:
+        return jsonify({'error': f'At most {MAX_BATCH_IDS} ids per request'}), 400
+    
+    if isinstance(raw_fields, list):
+        raw_fields = ','.join(str(field) for field in raw_fields)
+    try:
+        fields = parse_product_fields(raw_fields)
+    except InvalidFields as e:
+        return jsonify({'error': str(e)}), 400
+    
+    found = product_cache.get_products(ids)
+    if fields:
+        found = {pid: Product.project(data, fields) for pid, data in found.items()}
+    
+    return jsonify({
+        'products': {str(pid): found[pid] for pid in ids if pid in found},
+        'missing': [pid for pid in ids if pid not in found]
+    })
 
 @bp.route('/featured', methods=['GET'])
+@catalog_conditional
 def get_featured_products():
-    """Get featured products"""
-    products = Product.query.filter_by(is_featured=True).all()
-    return jsonify([product.to_dict() for product in products])
+    """Get featured products (supports fields= like the product list)"""
+    try:
+        fields = parse_product_fields(request.args.get('fields'))
+    except InvalidFields as e:
+        return jsonify({'error': str(e)}), 400
+    
+    query = Product.query.filter_by(is_featured=True)
+    if fields:
+        query = query.options(product_columns(fields))
+    return jsonify([product.to_dict(fields) for product in query])
 
 @bp.route('/', methods=['POST'])
 def create_product():
@@ -54,6 +241,7 @@ def create_product():
     
     db.session.add(product)
     db.session.commit()
+    product_events.product_saved(product)
     
     return jsonify(product.to_dict()), 201
 
@@ -68,6 +256,7 @@ def update_product(id):
             setattr(product, key, value)
     
     db.session.commit()
+    product_events.product_saved(product)
     return jsonify(product.to_dict())
 
 @bp.route('/<int:id>', methods=['DELETE'])
@@ -76,4 +265,5 @@ def delete_product(id):
     product = Product.query.get_or_404(id)
     db.session.delete(product)
     db.session.commit()
+    product_events.product_deleted(id)
     return '', 204
@@ -2,6 +2,7 @@ from flask import Blueprint, request, jsonify
 from flask_jwt_extended import create_access_token, jwt_required, get_jwt_identity
 from models import User
 from database import db
+from services import guest_cart
 
 bp = Blueprint('users', __name__, url_prefix='/api/users')
 
@@ -42,10 +43,21 @@ def login():
     if not user or not user.check_password(data['password']):
         return jsonify({'error': 'Invalid username or password'}), 401
     
+    # Carry over a cart built before logging in; false when nothing was added
+    # (invalid or expired token, or a cart that was merged before)
+    guest_cart_merged = False
+    if data.get('guest_cart'):
+        try:
+            guest_cart_merged = guest_cart.merge_into(user.id, data['guest_cart']) > 0
+            db.session.commit()
+        except guest_cart.InvalidGuestCart:
+            db.session.rollback()
+    
     access_token = create_access_token(identity=user.id)
     return jsonify({
         'access_token': access_token,
-        'user': user.to_dict()
+        'user': user.to_dict(),
+        'guest_cart_merged': guest_cart_merged
     })
 
 @bp.route('/profile', methods=['GET'])
@@ -174,9 +174,7 @@ def seed_database():
         ]
 
         # Add products to database
-        for product in products:
-            db.session.add(product)
-        
+        db.session.add_all(products)
         db.session.commit()
         print(f"✓ Added {len(products)} products to database")
 
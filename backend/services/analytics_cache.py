@@ -0,0 +1,142 @@
+"""
+Response cache for the admin analytics endpoints.
+
+Entries are fresh for ANALYTICS_CACHE_TTL seconds. After that (or after
+invalidate()), the next request still gets the stale copy immediately and
+triggers a refresh in a background thread; only when an entry is older
+than ANALYTICS_CACHE_STALE_TTL does a request wait for a recompute.
+Computations are single-flight: however many requests miss the same key
+at once, one of them runs the queries and the others wait for its
+result. The cache is per process.
+"""
+import logging
+import os
+import threading
+import time
+from flask import current_app
+from services.lru_cache import LRUCache
+
+logger = logging.getLogger(__name__)
+
+ANALYTICS_CACHE_TTL = float(os.getenv('ANALYTICS_CACHE_TTL', 30))
+ANALYTICS_CACHE_STALE_TTL = float(os.getenv('ANALYTICS_CACHE_STALE_TTL', 300))
+
+# key -> (computed_at, generation, value); the LRU TTL drops entries past the stale window
+cache = LRUCache(max_size=256, ttl=ANALYTICS_CACHE_STALE_TTL)
+
+_lock = threading.Lock()
+_generation = 0
+_in_flight = {}   # key -> _Flight
+_counters = {'fresh': 0, 'stale': 0, 'computed': 0, 'shared': 0, 'refreshes': 0, 'errors': 0}
+
+
+class _Flight:
+    def __init__(self):
+        self.done = threading.Event()
+        self.value = None
+        self.error = None
+
+
+def _count(name):
+    with _lock:
+        _counters[name] += 1
+
+
+def _compute(key, compute, flight):
+    """Run compute for a flight we lead, store the result and wake the waiters"""
+    with _lock:
+        generation = _generation
+    try:
+        flight.value = compute()
+        with _lock:
+            # An invalidation during the computation leaves the result stale
+            cache.set(key, (time.monotonic(), generation, flight.value))
+    except Exception as e:
+        flight.error = e
+        _count('errors')
+        raise
+    finally:
+        with _lock:
+            _in_flight.pop(key, None)
+        flight.done.set()
+
+
+def _refresh_in_background(key, compute):
+    with _lock:
+        if key in _in_flight:
+            return
+        flight = _in_flight[key] = _Flight()
+    app = current_app._get_current_object()
+
+    def run():
+        with app.app_context():
+            try:
+                _compute(key, compute, flight)
+            except Exception:
+                logger.exception('Background refresh of analytics %s failed', key)
+
+    _count('refreshes')
+    threading.Thread(target=run, name=f'analytics-refresh-{key}', daemon=True).start()
+
+
+def get_or_compute(key, compute):
+    """
+    Cached value for key, computing it with compute() when needed.
+    Returns (value, state) where state is 'fresh', 'stale' or 'computed'.
+    """
+    entry = cache.get(key)
+    if entry is not None:
+        computed_at, generation, value = entry
+        if generation == _generation and time.monotonic() - computed_at < ANALYTICS_CACHE_TTL:
+            _count('fresh')
+            return value, 'fresh'
+        _refresh_in_background(key, compute)
+        _count('stale')
+        return value, 'stale'
+
+    with _lock:
+        flight = _in_flight.get(key)
+        leader = flight is None
+        if leader:
+            flight = _in_flight[key] = _Flight()
+
+    if leader:
+        _count('computed')
+        _compute(key, compute, flight)
+        return flight.value, 'computed'
+
+    _count('shared')
+    flight.done.wait()
+    if flight.error is not None:
+        raise flight.error
+    return flight.value, 'computed'
+
+
+def invalidate():
+    """
+    Mark every entry stale (order and product writes call this). The next
+    request for each key gets the old value once and triggers a refresh.
+    """
+    global _generation
+    with _lock:
+        _generation += 1
+
+
+def clear():
+    global _generation
+    with _lock:
+        _generation += 1
+        cache.clear()
+
+
+def stats():
+    with _lock:
+        counters = dict(_counters)
+        in_flight = len(_in_flight)
+    return {
+        'entries': len(cache),
+        'ttl_seconds': ANALYTICS_CACHE_TTL,
+        'stale_ttl_seconds': ANALYTICS_CACHE_STALE_TTL,
+        'in_flight': in_flight,
+        **counters
+    }
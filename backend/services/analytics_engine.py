@@ -0,0 +1,307 @@
+"""
+Sales time series over arbitrary date ranges.
+
+Rows are streamed from the database in batches into typed NumPy arrays
+and everything after that - bucketing by day/week/month/quarter, sums,
+moving averages, period-over-period changes and category breakdowns - is
+vectorized. Only plain column selects and range filters reach SQL, so
+the engine works unchanged on SQL Server, SQLite or anything else.
+
+Order-level series read sales_daily_rollup (already one row per day and
+status); category breakdowns stream order items from the live and
+archive tables.
+"""
+import os
+from datetime import date, datetime, timedelta
+import numpy as np
+from sqlalchemy import select
+from database import db
+from models import Product, SalesDailyRollup
+
+GRANULARITIES = ('day', 'week', 'month', 'quarter')
+DEFAULT_RANGE_DAYS = 30
+DEFAULT_WINDOW = 3
+MAX_WINDOW = 52
+
+# Guards against ranges that would produce absurd payloads (e.g. 50 years by day)
+MAX_BUCKETS = int(os.getenv('ANALYTICS_MAX_BUCKETS', 3660))
+STREAM_BATCH_SIZE = int(os.getenv('ANALYTICS_STREAM_BATCH_SIZE', 50000))
+
+UNCATEGORIZED = 'Uncategorized'
+
+
+class InvalidQuery(ValueError):
+    """Raised for a bad range, granularity or window"""
+
+
+def parse_range(from_value=None, to_value=None, default_days=DEFAULT_RANGE_DAYS):
+    """(start, end) dates from optional ISO strings; both ends are inclusive"""
+    try:
+        end = date.fromisoformat(to_value) if to_value else datetime.utcnow().date()
+        start = date.fromisoformat(from_value) if from_value else end - timedelta(days=default_days - 1)
+    except ValueError:
+        raise InvalidQuery('from and to must be dates (YYYY-MM-DD)')
+    if start > end:
+        raise InvalidQuery('from must not be after to')
+    return start, end
+
+
+# Bucketing
+
+def bucket_keys(days, granularity):
+    """Start day of the bucket each datetime64[D] day falls in"""
+    if granularity == 'day':
+        return days
+    if granularity == 'week':
+        # 1970-01-01 was a Thursday; weeks start on Monday
+        return days - ((days.astype('int64') + 3) % 7).astype('timedelta64[D]')
+    months = days.astype('datetime64[M]')
+    if granularity == 'quarter':
+        index = months.astype('int64')
+        months = (index - index % 3).astype('datetime64[M]')
+    return months.astype('datetime64[D]')
+
+
+def bucket_starts(start, end, granularity):
+    """Sorted bucket start days covering start..end (inclusive)"""
+    if granularity not in GRANULARITIES:
+        raise InvalidQuery(f'Invalid granularity. Must be one of: {", ".join(GRANULARITIES)}')
+    first, last = bucket_keys(np.array([start, end], dtype='datetime64[D]'), granularity)
+    step = {'day': 1, 'week': 7}.get(granularity)
+    if step:
+        starts = np.arange(first, last + np.timedelta64(1, 'D'), step, dtype='datetime64[D]')
+    else:
+        months = np.arange(first.astype('datetime64[M]'), last.astype('datetime64[M]') + 1,
+                           3 if granularity == 'quarter' else 1)
+        starts = months.astype('datetime64[D]')
+    if len(starts) > MAX_BUCKETS:
+        raise InvalidQuery(f'Range too large: {len(starts)} buckets (max {MAX_BUCKETS})')
+    return starts
+
+
+def bucket_index(days, starts, granularity):
+    """Position in starts of each day's bucket"""
+    return np.searchsorted(starts, bucket_keys(days, granularity))
+
+
+def bucket_ends(starts, granularity):
+    """Last day of each bucket"""
+    if granularity == 'day':
+        return starts
+    if granularity == 'week':
+        return starts + np.timedelta64(6, 'D')
+    months = 3 if granularity == 'quarter' else 1
+    return (starts.astype('datetime64[M]') + months).astype('datetime64[D]') - np.timedelta64(1, 'D')
+
+
+def moving_average(values, window):
+    """Trailing mean over window buckets; NaN until a full window is available"""
+    result = np.full(len(values), np.nan)
+    if window <= len(values):
+        sums = np.cumsum(np.insert(values, 0, 0.0))
+        result[window - 1:] = (sums[window:] - sums[:-window]) / window
+    return result
+
+
+def pct_change(current, previous):
+    """Relative change (0.25 == +25%); NaN where previous is zero"""
+    current = np.asarray(current, dtype='float64')
+    previous = np.asarray(previous, dtype='float64')
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return np.where(previous != 0, (current - previous) / previous, np.nan)
+
+
+# Loading
+
+# Proleptic ordinal of 1970-01-01, the datetime64 epoch
+EPOCH_ORDINAL = date(1970, 1, 1).toordinal()
+
+
+def _column_array(column, dtype):
+    """
+    One column of a batch as a typed array. dtype 'day' takes dates or
+    timestamps to datetime64[D] through their ordinals, which is far
+    cheaper than letting NumPy convert datetime objects.
+    """
+    if dtype == 'day':
+        ordinals = np.fromiter(map(date.toordinal, column), dtype='int64', count=len(column))
+        return (ordinals - EPOCH_ORDINAL).astype('datetime64[D]')
+    return np.array(column, dtype=dtype)
+
+
+def _stream(statement, dtypes):
+    """
+    Run statement in batches of STREAM_BATCH_SIZE rows and return one typed
+    array per column. dtypes gives the NumPy type (or 'day') of each column.
+    """
+    chunks = [[] for _ in dtypes]
+    # Core execution on the session's connection: no ORM row processing
+    result = db.session.connection().execute(statement.execution_options(yield_per=STREAM_BATCH_SIZE))
+    for partition in result.partitions():
+        for chunk, dtype, column in zip(chunks, dtypes, zip(*partition)):
+            chunk.append(_column_array(column, dtype))
+    return [np.concatenate(chunk) if chunk else _column_array((), dtype)
+            for chunk, dtype in zip(chunks, dtypes)]
+
+
+def load_rollup(start, end, statuses=None):
+    """(day, order_count, revenue, items_sold) arrays from the daily rollup for start..end"""
+    statement = select(
+        SalesDailyRollup.day, SalesDailyRollup.order_count,
+        SalesDailyRollup.revenue, SalesDailyRollup.items_sold
+    ).where(SalesDailyRollup.day >= start, SalesDailyRollup.day <= end)
+    if statuses:
+        statement = statement.where(SalesDailyRollup.status.in_(statuses))
+    return _stream(statement, ('day', 'int64', 'float64', 'int64'))
+
+
+def load_items(start, end, statuses=None):
+    """(day, product_id, quantity, line_revenue) arrays for items of orders placed start..end"""
+    from services.order_archive import SOURCES
+
+    columns = []
+    for order_model, item_model in SOURCES:
+        statement = select(
+            order_model.created_at, item_model.product_id, item_model.quantity, item_model.price
+        ).join(order_model, order_model.id == item_model.order_id).where(
+            order_model.created_at >= datetime.combine(start, datetime.min.time()),
+            order_model.created_at < datetime.combine(end + timedelta(days=1), datetime.min.time())
+        )
+        if statuses:
+            statement = statement.where(order_model.status.in_(statuses))
+        columns.append(_stream(statement, ('day', 'int64', 'int64', 'float64')))
+
+    days, product_ids, quantity, price = (np.concatenate(parts) for parts in zip(*columns))
+    return days, product_ids, quantity, quantity * price
+
+
+def category_codes(product_ids):
+    """
+    (codes, names): the category of each product id as an index into names.
+    Products without a category, or deleted since, map to UNCATEGORIZED.
+    """
+    rows = db.session.query(Product.id, Product.category).all()
+    names = sorted({category for _, category in rows if category} | {UNCATEGORIZED})
+    if not len(product_ids):
+        return np.array([], dtype='int64'), names
+
+    fallback = names.index(UNCATEGORIZED)
+    size = max(int(product_ids.max()), max((product_id for product_id, _ in rows), default=0)) + 1
+    lookup = np.full(size, fallback, dtype='int64')
+    position = {name: i for i, name in enumerate(names)}
+    for product_id, category in rows:
+        if category:
+            lookup[product_id] = position[category]
+    return lookup[product_ids], names
+
+
+# Queries
+
+def _number(value, digits=2):
+    """JSON-friendly float: rounded, None for NaN"""
+    return None if np.isnan(value) else round(float(value), digits)
+
+
+def timeseries(start, end, granularity='day', window=DEFAULT_WINDOW, statuses=None, categories=True):
+    """
+    Order count, revenue and items sold per bucket for start..end, with a
+    trailing moving average of revenue, the change from the previous bucket,
+    totals compared with the equally long range just before start, and
+    (optionally) revenue and units per category.
+    """
+    if not 1 <= window <= MAX_WINDOW:
+        raise InvalidQuery(f'window must be between 1 and {MAX_WINDOW}')
+    starts = bucket_starts(start, end, granularity)
+
+    # One read covers the range and the comparison range right before it
+    span = (end - start).days + 1
+    previous_start = start - timedelta(days=span)
+    days, orders, revenue, items = load_rollup(previous_start, end, statuses)
+    current = days >= np.datetime64(start, 'D')
+
+    index = bucket_index(days[current], starts, granularity)
+    size = len(starts)
+    order_series = np.bincount(index, weights=orders[current], minlength=size)
+    revenue_series = np.bincount(index, weights=revenue[current], minlength=size)
+    item_series = np.bincount(index, weights=items[current], minlength=size)
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        average_order = np.where(order_series > 0, revenue_series / order_series, np.nan)
+    revenue_average = moving_average(revenue_series, window)
+    revenue_change = np.diff(revenue_series, prepend=np.nan)
+    revenue_change_pct = pct_change(revenue_series, np.concatenate(([np.nan], revenue_series[:-1])))
+
+    # The first and last buckets are clipped to the requested range
+    firsts = np.maximum(starts, np.datetime64(start, 'D'))
+    lasts = np.minimum(bucket_ends(starts, granularity), np.datetime64(end, 'D'))
+
+    buckets = []
+    for i in range(size):
+        buckets.append({
+            'start': str(firsts[i]),
+            'end': str(lasts[i]),
+            'order_count': int(order_series[i]),
+            'revenue': _number(revenue_series[i]),
+            'items_sold': int(item_series[i]),
+            'average_order_value': _number(average_order[i]),
+            'revenue_moving_average': _number(revenue_average[i]),
+            'revenue_change': _number(revenue_change[i]),
+            'revenue_change_pct': _number(revenue_change_pct[i], 4)
+        })
+
+    def summary(mask):
+        count, total, units = int(orders[mask].sum()), float(revenue[mask].sum()), int(items[mask].sum())
+        return {
+            'order_count': count,
+            'revenue': round(total, 2),
+            'items_sold': units,
+            'average_order_value': round(total / count, 2) if count else None
+        }
+
+    totals, previous = summary(current), summary(~current)
+    result = {
+        'from': start.isoformat(),
+        'to': end.isoformat(),
+        'granularity': granularity,
+        'window': window,
+        'buckets': buckets,
+        'totals': totals,
+        'previous_period': {
+            'from': previous_start.isoformat(),
+            'to': (start - timedelta(days=1)).isoformat(),
+            **previous
+        },
+        'change_pct': {
+            field: _number(pct_change(totals[field], previous[field]), 4)
+            for field in ('order_count', 'revenue', 'items_sold')
+        }
+    }
+    if categories:
+        result['categories'] = category_breakdown(start, end, starts, granularity, statuses)
+    return result
+
+
+def category_breakdown(start, end, starts, granularity, statuses=None):
+    """Revenue, units and revenue share per category, with a revenue series per bucket"""
+    days, product_ids, quantity, line_revenue = load_items(start, end, statuses)
+    codes, names = category_codes(product_ids)
+
+    size = len(starts)
+    cells = codes * size + bucket_index(days, starts, granularity)
+    revenue_grid = np.bincount(cells, weights=line_revenue, minlength=len(names) * size).reshape(len(names), size)
+    units = np.bincount(codes, weights=quantity, minlength=len(names))
+    revenue = revenue_grid.sum(axis=1)
+    total = revenue.sum()
+
+    breakdown = [
+        {
+            'category': names[i],
+            'revenue': round(float(revenue[i]), 2),
+            'units': int(units[i]),
+            'share': round(float(revenue[i] / total), 4) if total else 0.0,
+            'series': [round(float(value), 2) for value in revenue_grid[i]]
+        }
+        for i in np.argsort(-revenue, kind='stable')
+        if units[i] or revenue[i]
+    ]
+    return breakdown
@@ -0,0 +1,96 @@
+"""
+Cart writes as set-based statements.
+
+Adds and quantity sets are single upserts on the (user_id, product_id)
+unique index, so concurrent adds of the same product merge into one row
+instead of racing into duplicates.
+"""
+from datetime import datetime
+from database import db
+from models import CartItem
+from services.upsert import upsert
+
+CART_KEY = ('user_id', 'product_id')
+RETURNED_COLUMNS = ('id', 'user_id', 'product_id', 'quantity', 'added_at')
+
+
+def _rows(user_id, quantities):
+    now = datetime.utcnow()
+    return [
+        {'user_id': user_id, 'product_id': product_id, 'quantity': quantity, 'added_at': now}
+        for product_id, quantity in quantities.items()
+    ]
+
+
+def add_items(user_id, quantities):
+    """Add {product_id: quantity} on top of what is already in the cart"""
+    return upsert(CartItem, _rows(user_id, quantities), CART_KEY,
+                  increment=('quantity',), returning=RETURNED_COLUMNS)
+
+
+def set_items(user_id, quantities):
+    """Set {product_id: quantity}, inserting lines that are not in the cart yet"""
+    return upsert(CartItem, _rows(user_id, quantities), CART_KEY,
+                  replace=('quantity',), returning=RETURNED_COLUMNS)
+
+
+def remove_items(user_id, product_ids):
+    if not product_ids:
+        return 0
+    return CartItem.query.filter(
+        CartItem.user_id == user_id,
+        CartItem.product_id.in_(list(product_ids))
+    ).delete(synchronize_session=False)
+
+
+def fold_operations(operations):
+    """
+    Collapse a list of cart operations into one final action per product,
+    as if they were applied in order.
+    Returns (adds, sets, removes, errors); adds/sets are {product_id: quantity}.
+    """
+    state = {}
+    errors = []
+    for index, operation in enumerate(operations):
+        if not isinstance(operation, dict):
+            errors.append({'index': index, 'error': 'Operation must be an object'})
+            continue
+        op = operation.get('op')
+        product_id = operation.get('product_id')
+        quantity = operation.get('quantity', 1 if op == 'add' else None)
+        if not isinstance(product_id, int) or isinstance(product_id, bool):
+            errors.append({'index': index, 'error': 'product_id must be an integer'})
+            continue
+
+        current = state.get(product_id)
+        if op == 'remove':
+            state[product_id] = ('remove', 0)
+        elif op in ('add', 'set'):
+            if not isinstance(quantity, int) or isinstance(quantity, bool) or quantity < (1 if op == 'add' else 0):
+                errors.append({'index': index, 'error': 'quantity must be a positive integer' if op == 'add'
+                               else 'quantity must be a non-negative integer'})
+                continue
+            if op == 'set':
+                state[product_id] = ('set', quantity) if quantity else ('remove', 0)
+            elif current is None:
+                state[product_id] = ('add', quantity)
+            elif current[0] == 'remove':
+                state[product_id] = ('set', quantity)
+            else:
+                state[product_id] = (current[0], current[1] + quantity)
+        else:
+            errors.append({'index': index, 'error': 'op must be add, set or remove'})
+
+    adds = {pid: q for pid, (action, q) in state.items() if action == 'add'}
+    sets = {pid: q for pid, (action, q) in state.items() if action == 'set'}
+    removes = [pid for pid, (action, _) in state.items() if action == 'remove']
+    return adds, sets, removes, errors
+
+
+def apply_operations(user_id, adds, sets, removes):
+    """Apply folded operations in the current transaction (one statement per kind)"""
+    remove_items(user_id, removes)
+    if adds:
+        add_items(user_id, adds)
+    if sets:
+        set_items(user_id, sets)
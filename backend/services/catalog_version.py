@@ -0,0 +1,134 @@
+"""
+Version of everything served by the public catalog endpoints.
+
+The version is stored in the catalog_version table, so a write made by
+any process (another server worker, the import CLI, worker.py) moves it.
+services.product_events bumps it after every product or stock commit and
+the conditional GET decorator derives ETag/Last-Modified from it.
+
+Each process re-reads the row at most every CATALOG_VERSION_POLL
+seconds, which bounds how long a write made elsewhere can still be
+answered with a 304; writes made in this process are seen immediately.
+When the row moved by more than this process's own bumps, the product
+cache is dropped and, if index_version moved too, the search and facet
+indexes are rebuilt on their next use.
+"""
+import logging
+import os
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from sqlalchemy import select, insert, update
+from sqlalchemy.exc import IntegrityError
+from database import db
+
+logger = logging.getLogger(__name__)
+
+POLL_SECONDS = float(os.getenv('CATALOG_VERSION_POLL', 1))
+
+ROW_ID = 1
+
+_lock = threading.Lock()
+_seen = None        # (version, index version, last modified) as last read or written by this process
+_checked_at = 0.0
+
+
+def _table():
+    from models import CatalogVersion
+    return CatalogVersion.__table__
+
+
+def _now():
+    return datetime.utcnow().replace(microsecond=0)
+
+
+def _select_row(conn):
+    table = _table()
+    return conn.execute(
+        select(table.c.version, table.c.index_version, table.c.updated_at).where(table.c.id == ROW_ID)
+    ).first()
+
+
+def _read(conn):
+    """(version, index_version, updated_at) of the stored row, creating it on first use"""
+    row = _select_row(conn)
+    if row is not None:
+        return tuple(row)
+    try:
+        with conn.begin_nested():
+            conn.execute(insert(_table()).values(id=ROW_ID, version=0, index_version=0, updated_at=_now()))
+    except IntegrityError:
+        # Another process created it first
+        pass
+    return tuple(_select_row(conn))
+
+
+def _outside_writes(reindex):
+    """Another process wrote products or stock: drop what this process derived from them"""
+    from services import analytics_cache, facet_index, image_variants, product_cache, search_index
+
+    # Image variants recorded elsewhere show up in the manifest first
+    image_variants.reload_manifest()
+    product_cache.clear()
+    analytics_cache.invalidate()
+    if reindex:
+        search_index.invalidate()
+        facet_index.invalidate()
+
+
+def _remember(version, index_version, updated_at, own=(0, 0)):
+    """Record the row as read; own is (version, index_version) added by this process since _seen"""
+    global _seen, _checked_at
+    if _seen is not None:
+        seen_version, seen_index, _ = _seen
+        if version != seen_version + own[0]:
+            _outside_writes(reindex=index_version != seen_index + own[1])
+    _seen = (version, index_version, updated_at.replace(tzinfo=timezone.utc))
+    _checked_at = time.monotonic()
+
+
+def bump(indexes=False):
+    """
+    Record a catalog write (call after it is committed). indexes: the
+    write may have changed fields the search or facet index covers.
+    """
+    global _checked_at
+    table = _table()
+    with _lock:
+        try:
+            # Own short transaction: the caller's session is left alone
+            with db.engine.begin() as conn:
+                _read(conn)
+                # The increment locks the row, so the stamp below is read and set atomically
+                conn.execute(update(table).where(table.c.id == ROW_ID).values(
+                    version=table.c.version + 1,
+                    index_version=table.c.index_version + (1 if indexes else 0)
+                ))
+                version, index_version, updated_at = _select_row(conn)
+                # HTTP dates have one-second resolution; never reuse the previous
+                # stamp or If-Modified-Since could miss a write in the same second
+                updated_at = max(_now(), updated_at + timedelta(seconds=1))
+                conn.execute(update(table).where(table.c.id == ROW_ID).values(updated_at=updated_at))
+        except Exception:
+            # The write itself is committed; re-read on the next request instead of failing it
+            logger.exception('Could not bump the catalog version')
+            _checked_at = 0.0
+            return
+        _remember(version, index_version, updated_at, own=(1, 1 if indexes else 0))
+
+
+def sync():
+    """Pick up writes made by other processes (re-reads the row at most every POLL_SECONDS)"""
+    with _lock:
+        if _seen is None or time.monotonic() - _checked_at >= POLL_SECONDS:
+            with db.engine.connect() as conn:
+                _remember(*_read(conn))
+                conn.commit()
+        return _seen
+
+
+def current():
+    """(version tag, last modified) for the catalog, at most POLL_SECONDS old"""
+    version, _, last_modified = sync()
+    # The stamp keeps tags unique if the row is ever recreated from zero
+    return f'{version}-{int(last_modified.timestamp())}', last_modified
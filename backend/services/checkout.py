@@ -0,0 +1,145 @@
+"""
+Set-based checkout.
+
+The cart and its products are read with one joined query, stock is taken
+with conditional UPDATEs (stock_quantity >= requested, CASE on the
+product id) and the order lines are written with one bulk INSERT. If any
+line is short the whole transaction is rolled back, so concurrent
+checkouts can never oversell or drive stock negative.
+"""
+from sqlalchemy import case, insert, update
+from database import db
+from models import CartItem, Order, OrderItem, Product
+from services import sales_rollup
+
+# Each product costs three bound parameters (id, and the quantity in the
+# CASE twice); keep a chunk under SQL Server's 2100 parameter limit
+CHUNK_SIZE = 300
+
+
+class CheckoutError(Exception):
+    pass
+
+
+class EmptyCart(CheckoutError):
+    pass
+
+
+class InsufficientStock(CheckoutError):
+    def __init__(self, shortages):
+        super().__init__('Insufficient stock')
+        self.shortages = shortages
+
+
+def _cart_lines(user_id):
+    """Cart lines joined with the current price and stock of their products"""
+    return db.session.query(
+        CartItem.id,
+        CartItem.product_id,
+        CartItem.quantity,
+        Product.price,
+        Product.stock_quantity
+    ).join(Product, CartItem.product_id == Product.id).filter(
+        CartItem.user_id == user_id
+    ).order_by(CartItem.product_id).all()
+
+
+def _shortages(requested, stock):
+    return [
+        {'product_id': pid, 'requested': quantity, 'available': stock.get(pid) or 0}
+        for pid, quantity in requested.items()
+        if (stock.get(pid) or 0) < quantity
+    ]
+
+
+def _take_stock(requested):
+    """
+    Decrement stock for {product_id: quantity}, only where enough is left.
+    Returns True when every product was decremented.
+    """
+    items = sorted(requested.items())
+    for start in range(0, len(items), CHUNK_SIZE):
+        chunk = dict(items[start:start + CHUNK_SIZE])
+        wanted = case(chunk, value=Product.id)
+        result = db.session.execute(
+            update(Product).where(
+                Product.id.in_(list(chunk)),
+                Product.stock_quantity >= wanted
+            ).values(stock_quantity=Product.stock_quantity - wanted),
+            execution_options={'synchronize_session': False}
+        )
+        if result.rowcount != len(chunk):
+            return False
+    return True
+
+
+def _current_stock(product_ids):
+    stock = {}
+    ids = list(product_ids)
+    for start in range(0, len(ids), CHUNK_SIZE):
+        stock.update(db.session.query(Product.id, Product.stock_quantity).filter(
+            Product.id.in_(ids[start:start + CHUNK_SIZE])
+        ))
+    return stock
+
+
+def place_order(user_id, shipping_address, payment_method):
+    """
+    Turn the user's cart into an order and commit.
+    Returns (order, product_ids). Raises EmptyCart or InsufficientStock
+    (with the transaction rolled back).
+    """
+    lines = _cart_lines(user_id)
+    if not lines:
+        raise EmptyCart('Cart is empty')
+
+    requested = {}
+    prices = {}
+    stock = {}
+    for line in lines:
+        requested[line.product_id] = requested.get(line.product_id, 0) + line.quantity
+        prices[line.product_id] = line.price
+        stock[line.product_id] = line.stock_quantity
+
+    # Cheap early exit; the conditional UPDATE below is what actually guards
+    shortages = _shortages(requested, stock)
+    if shortages:
+        db.session.rollback()
+        raise InsufficientStock(shortages)
+
+    try:
+        if not _take_stock(requested):
+            db.session.rollback()
+            raise InsufficientStock(_shortages(requested, _current_stock(requested)))
+
+        order = Order(
+            user_id=user_id,
+            total_amount=sum(prices[pid] * quantity for pid, quantity in requested.items()),
+            shipping_address=shipping_address,
+            payment_method=payment_method
+        )
+        db.session.add(order)
+        db.session.flush()  # Get order ID
+
+        db.session.execute(insert(OrderItem), [
+            {'order_id': order.id, 'product_id': pid, 'quantity': quantity, 'price': prices[pid]}
+            for pid, quantity in requested.items()
+        ])
+
+        sales_rollup.record_order(order.created_at, order.status, order.total_amount, sum(requested.values()))
+
+        # Only the lines that were read; anything added meanwhile stays in the cart
+        cart_ids = [line.id for line in lines]
+        for start in range(0, len(cart_ids), CHUNK_SIZE):
+            CartItem.query.filter(
+                CartItem.id.in_(cart_ids[start:start + CHUNK_SIZE])
+            ).delete(synchronize_session=False)
+
+        db.session.commit()
+    except InsufficientStock:
+        raise
+    except Exception:
+        db.session.rollback()
+        raise
+
+    return order, list(requested)
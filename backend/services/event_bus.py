@@ -0,0 +1,127 @@
+"""
+In-process publish/subscribe for live admin updates.
+
+Write paths publish small events after their commit; every connected
+stream subscribes. There is a single publisher per process: publish()
+appends the event to each subscriber's bounded buffer under one lock and
+wakes the waiting streams, so its cost does not depend on how slowly any
+client reads. A client that falls further behind than SSE_CLIENT_BUFFER
+events loses the oldest ones and is told to resync (re-fetch the full
+payloads) instead of the process buffering without limit.
+
+A short replay log lets a reconnecting client (Last-Event-ID) catch up.
+Events only reach clients connected to the process that made the change.
+"""
+import os
+import threading
+from collections import deque
+from datetime import datetime
+
+SSE_CLIENT_BUFFER = int(os.getenv('SSE_CLIENT_BUFFER', 256))
+SSE_REPLAY_SIZE = int(os.getenv('SSE_REPLAY_SIZE', 512))
+SSE_MAX_CLIENTS = int(os.getenv('SSE_MAX_CLIENTS', 100))
+
+
+class TooManySubscribers(RuntimeError):
+    """Raised when SSE_MAX_CLIENTS streams are already connected"""
+
+
+class Subscription:
+    def __init__(self, bus, buffer_size):
+        self._bus = bus
+        self._events = deque(maxlen=buffer_size)
+        self.dropped = 0
+        self.closed = False
+
+    def _push(self, event):
+        # Called with the bus lock held
+        if len(self._events) == self._events.maxlen:
+            self.dropped += 1
+        self._events.append(event)
+
+    def get(self, timeout):
+        """
+        Wait up to timeout seconds for events.
+        Returns (events, dropped): the buffered (id, type, data) tuples and
+        how many were lost to overflow since the last call.
+        """
+        with self._bus._condition:
+            self._bus._condition.wait_for(lambda: self._events or self.closed, timeout)
+            events = list(self._events)
+            self._events.clear()
+            dropped, self.dropped = self.dropped, 0
+        return events, dropped
+
+    def close(self):
+        self._bus.unsubscribe(self)
+
+
+class EventBus:
+    def __init__(self, buffer_size=SSE_CLIENT_BUFFER, replay_size=SSE_REPLAY_SIZE, max_subscribers=SSE_MAX_CLIENTS):
+        self.buffer_size = buffer_size
+        self.max_subscribers = max_subscribers
+        self._condition = threading.Condition(threading.Lock())
+        self._subscribers = set()
+        self._recent = deque(maxlen=replay_size)
+        self._last_id = 0
+        self.published = 0
+
+    def has_subscribers(self):
+        return bool(self._subscribers)
+
+    def publish(self, event_type, data):
+        """Send an event to every subscriber; returns its id"""
+        with self._condition:
+            self._last_id += 1
+            event = (self._last_id, event_type, data)
+            self._recent.append(event)
+            for subscription in self._subscribers:
+                subscription._push(event)
+            self.published += 1
+            self._condition.notify_all()
+            return self._last_id
+
+    def subscribe(self, last_event_id=None):
+        """
+        New subscription. With last_event_id, events after it that are still
+        in the replay log are delivered first; if some already fell out of
+        the log the subscription starts with a resync.
+        """
+        subscription = Subscription(self, self.buffer_size)
+        with self._condition:
+            if len(self._subscribers) >= self.max_subscribers:
+                raise TooManySubscribers(f'{self.max_subscribers} streams already connected')
+            if last_event_id is not None and last_event_id != self._last_id:
+                missed = [event for event in self._recent if event[0] > last_event_id]
+                # An id from the future means the process restarted since
+                if last_event_id > self._last_id or not missed or missed[0][0] != last_event_id + 1:
+                    subscription.dropped = 1
+                for event in missed:
+                    subscription._push(event)
+            self._subscribers.add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._condition:
+            subscription.closed = True
+            self._subscribers.discard(subscription)
+            self._condition.notify_all()
+
+    def stats(self):
+        with self._condition:
+            return {
+                'subscribers': len(self._subscribers),
+                'max_subscribers': self.max_subscribers,
+                'buffer_size': self.buffer_size,
+                'published': self.published,
+                'last_event_id': self._last_id,
+                'replay_size': len(self._recent)
+            }
+
+
+bus = EventBus()
+
+
+def publish(event_type, **data):
+    data.setdefault('at', datetime.utcnow().isoformat())
+    return bus.publish(event_type, data)
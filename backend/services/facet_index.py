@@ -0,0 +1,206 @@
+"""
+In-memory bitmap index over the product filter columns.
+
+For every distinct value of a facet field there is one bitset (a Python
+int, bit N set when product N has that value). Filter combinations are
+bitwise ANDs and facet counts are popcounts, so neither filtering nor
+counting needs a query. Product ids are dense auto-increment keys, which
+keeps each bitset close to one bit per product.
+"""
+import threading
+
+FACET_FIELDS = ('category', 'age_range', 'brand', 'is_featured')
+
+
+if hasattr(int, 'bit_count'):
+    def popcount(bits):
+        return bits.bit_count()
+else:  # Python < 3.10
+    def popcount(bits):
+        return bin(bits).count('1')
+
+
+def iter_ids(bits):
+    """Yield the positions of the set bits, lowest first"""
+    digits = bin(bits)[:1:-1]
+    pos = digits.find('1')
+    while pos != -1:
+        yield pos
+        pos = digits.find('1', pos + 1)
+
+
+def bitset_from_ids(ids):
+    ids = list(ids)
+    if not ids:
+        return 0
+    buf = bytearray(max(ids) // 8 + 1)
+    for doc_id in ids:
+        buf[doc_id >> 3] |= 1 << (doc_id & 7)
+    return int.from_bytes(buf, 'little')
+
+
+def facet_key(value):
+    """JSON-safe facet value (bools become 'true'/'false')"""
+    if isinstance(value, bool):
+        return 'true' if value else 'false'
+    return value
+
+
+class FacetIndex:
+    def __init__(self, fields=FACET_FIELDS):
+        self._lock = threading.RLock()
+        self.fields = fields
+        self._bitmaps = {field: {} for field in fields}   # field -> {value: bits}
+        self._doc_values = {}                             # doc_id -> {field: value}
+        self._all = 0
+        self.built = False
+
+    def add(self, doc_id, values):
+        with self._lock:
+            self._remove(doc_id)
+            bit = 1 << doc_id
+            stored = {}
+            for field in self.fields:
+                value = values.get(field)
+                if value is None:
+                    continue
+                value = facet_key(value)
+                bitmaps = self._bitmaps[field]
+                bitmaps[value] = bitmaps.get(value, 0) | bit
+                stored[field] = value
+            self._doc_values[doc_id] = stored
+            self._all |= bit
+
+    def remove(self, doc_id):
+        with self._lock:
+            self._remove(doc_id)
+
+    def _remove(self, doc_id):
+        stored = self._doc_values.pop(doc_id, None)
+        if stored is None:
+            return
+        mask = ~(1 << doc_id)
+        for field, value in stored.items():
+            bitmaps = self._bitmaps[field]
+            remaining = bitmaps[value] & mask
+            if remaining:
+                bitmaps[value] = remaining
+            else:
+                del bitmaps[value]
+        self._all &= mask
+
+    def clear(self):
+        with self._lock:
+            for field in self.fields:
+                self._bitmaps[field] = {}
+            self._doc_values.clear()
+            self._all = 0
+
+    def _match(self, filters, skip=None, within=None):
+        bits = self._all if within is None else self._all & within
+        for field, value in filters.items():
+            if field == skip:
+                continue
+            bits &= self._bitmaps[field].get(facet_key(value), 0)
+            if not bits:
+                break
+        return bits
+
+    def match(self, filters, within=None):
+        """Bitset of docs matching every field=value filter"""
+        with self._lock:
+            return self._match(filters, within=within)
+
+    def facet_counts(self, filters, within=None):
+        """
+        For each field, how many docs each of its values would leave if it
+        replaced that field's current filter, with the other filters held.
+        """
+        with self._lock:
+            counts = {}
+            for field in self.fields:
+                base = self._match(filters, skip=field, within=within)
+                field_counts = {}
+                if base:
+                    for value, bits in self._bitmaps[field].items():
+                        n = popcount(bits & base)
+                        if n:
+                            field_counts[value] = n
+                counts[field] = field_counts
+            return counts
+
+    def doc_count(self):
+        with self._lock:
+            return popcount(self._all)
+
+    def value_counts(self, field):
+        with self._lock:
+            return {value: popcount(bits) for value, bits in self._bitmaps[field].items()}
+
+
+product_facets = FacetIndex()
+
+
+def _product_values(product):
+    return {field: getattr(product, field) for field in FACET_FIELDS}
+
+
+def ensure_built():
+    if product_facets.built:
+        return
+    with product_facets._lock:
+        if product_facets.built:
+            return
+        rebuild()
+
+
+def rebuild():
+    """Drop and rebuild the bitmaps from the products table"""
+    from models import Product
+
+    with product_facets._lock:
+        product_facets.clear()
+        rows = Product.query.with_entities(
+            Product.id, Product.category, Product.age_range, Product.brand, Product.is_featured
+        ).yield_per(1000)
+        for row in rows:
+            product_facets.add(row.id, _product_values(row))
+        product_facets.built = True
+
+
+def invalidate():
+    """Products changed outside this process; rebuild from the database on next use"""
+    with product_facets._lock:
+        product_facets.built = False
+
+
+def index_product(product):
+    with product_facets._lock:
+        if product_facets.built:
+            product_facets.add(product.id, _product_values(product))
+
+
+def remove_product(product_id):
+    with product_facets._lock:
+        if product_facets.built:
+            product_facets.remove(product_id)
+
+
+def match(filters, within=None):
+    ensure_built()
+    return product_facets.match(filters, within=within)
+
+
+def facet_counts(filters, within=None):
+    ensure_built()
+    return product_facets.facet_counts(filters, within=within)
+
+
+def value_counts(field):
+    ensure_built()
+    return product_facets.value_counts(field)
+
+
+def product_count():
+    ensure_built()
+    return product_facets.doc_count()
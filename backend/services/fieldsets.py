@@ -0,0 +1,43 @@
+"""Sparse fieldset (?fields=) support for product listings"""
+from sqlalchemy.orm import load_only
+
+
+class InvalidFields(ValueError):
+    """Raised when ?fields= names a field that cannot be serialized"""
+
+
+def parse_product_fields(raw):
+    """
+    Parse a comma separated field list.
+    Returns None when no list was given (serialize everything); 'id' is
+    always included so clients can key the results.
+    """
+    from models import Product
+
+    if not raw:
+        return None
+    fields = ['id']
+    for field in raw.split(','):
+        field = field.strip()
+        if not field or field in fields:
+            continue
+        if field not in Product.SERIALIZABLE_FIELDS:
+            raise InvalidFields(
+                f'Unknown field "{field}". Must be one of: {", ".join(Product.SERIALIZABLE_FIELDS)}'
+            )
+        fields.append(field)
+    return fields
+
+
+def product_columns(fields, *extra):
+    """
+    Query option that selects only the requested columns (plus any extra
+    columns the query itself needs, such as a keyset sort key).
+    """
+    from models import Product
+
+    names = list(fields)
+    for column in extra:
+        if column.key not in names:
+            names.append(column.key)
+    return load_only(*[getattr(Product, name) for name in names])
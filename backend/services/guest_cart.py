@@ -0,0 +1,146 @@
+"""
+Carts for shoppers who are not logged in.
+
+The cart lives entirely in a signed token the client keeps (e.g. in
+localStorage) and sends back with each change: a random cart id and a
+list of [product_id, quantity] pairs signed with SECRET_KEY. Nothing is
+written to the database while shopping; product data comes from the
+product cache. On login the token is folded into the user's cart with
+one batched upsert, and the cart id is recorded in guest_cart_merges in
+the same transaction, so a retried login or a later /merge with any
+token of that cart adds nothing twice.
+"""
+import os
+import secrets
+import time
+from datetime import datetime, timedelta
+from flask import current_app
+from itsdangerous import BadSignature, URLSafeTimedSerializer
+from sqlalchemy.exc import IntegrityError
+from database import db
+from models import GuestCartMerge
+from services import cart_store, product_cache
+
+GUEST_CART_MAX_AGE = int(os.getenv('GUEST_CART_MAX_AGE', 30 * 24 * 3600))
+MAX_GUEST_LINES = 100
+MAX_GUEST_QUANTITY = 999
+
+SALT = 'guest-cart'
+
+# Merge records outlive every token of their cart; older ones are deleted
+# by merges at most this often
+PURGE_INTERVAL_SECONDS = 3600
+_purged_at = 0.0
+
+
+class InvalidGuestCart(Exception):
+    pass
+
+
+def _serializer():
+    return URLSafeTimedSerializer(current_app.config['SECRET_KEY'], salt=SALT)
+
+
+def read(token):
+    """(cart id, {product_id: quantity}) from a token; (None, {}) for no token"""
+    if not token:
+        return None, {}
+    try:
+        data = _serializer().loads(token, max_age=GUEST_CART_MAX_AGE)
+        items = {int(product_id): int(quantity) for product_id, quantity in data['items']}
+        return str(data['cart']), items
+    except (BadSignature, KeyError, TypeError, ValueError):
+        raise InvalidGuestCart('Invalid or expired guest cart')
+
+
+def dump(items, cart_id=None):
+    """
+    Signed token for {product_id: quantity}, or None for an empty cart.
+    cart_id keeps the id of the cart the items came from; a new cart gets a fresh one.
+    """
+    if not items:
+        return None
+    return _serializer().dumps({
+        'cart': cart_id or secrets.token_hex(16),
+        'items': [[product_id, quantity] for product_id, quantity in items.items()]
+    })
+
+
+def apply_operations(items, adds, sets, removes):
+    """New {product_id: quantity} after folded operations (see cart_store.fold_operations)"""
+    items = dict(items)
+    for product_id in removes:
+        items.pop(product_id, None)
+    for product_id, quantity in adds.items():
+        items[product_id] = min(items.get(product_id, 0) + quantity, MAX_GUEST_QUANTITY)
+    for product_id, quantity in sets.items():
+        items[product_id] = min(quantity, MAX_GUEST_QUANTITY)
+    if len(items) > MAX_GUEST_LINES:
+        raise InvalidGuestCart(f'A guest cart holds at most {MAX_GUEST_LINES} products')
+    return items
+
+
+def view(items, cart_id=None):
+    """
+    Same shape as the logged-in cart view. Items are keyed by product id
+    (there are no cart rows); products that no longer exist are dropped.
+    """
+    products = product_cache.get_products(list(items))
+    lines = []
+    for product_id, quantity in items.items():
+        product = products.get(product_id)
+        if product is None:
+            continue
+        lines.append({
+            'id': product_id,
+            'product_id': product_id,
+            'product': product,
+            'quantity': quantity,
+            'line_total': round(product['price'] * quantity, 2),
+            'in_stock': (product['stock_quantity'] or 0) >= quantity
+        })
+    live = {line['product_id']: line['quantity'] for line in lines}
+    return {
+        'items': lines,
+        'summary': {
+            'line_count': len(lines),
+            'item_count': sum(live.values()),
+            'subtotal': round(sum(line['line_total'] for line in lines), 2),
+            'all_in_stock': all(line['in_stock'] for line in lines)
+        },
+        'token': dump(live, cart_id)
+    }
+
+
+def _claim(cart_id, user_id):
+    """Record the cart as merged; False if it already was (caller commits)"""
+    try:
+        with db.session.begin_nested():
+            db.session.add(GuestCartMerge(cart_id=cart_id, user_id=user_id))
+    except IntegrityError:
+        return False
+    return True
+
+
+def purge_merged():
+    """Delete merge records older than any token of their cart can be; returns the count"""
+    cutoff = datetime.utcnow() - timedelta(seconds=GUEST_CART_MAX_AGE)
+    return GuestCartMerge.query.filter(GuestCartMerge.merged_at < cutoff).delete(synchronize_session=False)
+
+
+def merge_into(user_id, token):
+    """
+    Add a guest cart's lines to the user's cart (one upsert, caller commits).
+    Returns the number of lines merged; 0 when the cart was merged before.
+    """
+    global _purged_at
+    cart_id, items = read(token)
+    products = product_cache.get_products(list(items))
+    items = {product_id: quantity for product_id, quantity in items.items() if product_id in products}
+    if not items or not _claim(cart_id, user_id):
+        return 0
+    cart_store.add_items(user_id, items)
+    if time.monotonic() - _purged_at >= PURGE_INTERVAL_SECONDS:
+        _purged_at = time.monotonic()
+        purge_merged()
+    return len(items)
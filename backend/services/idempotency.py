@@ -0,0 +1,186 @@
+"""
+Idempotency keys for non-repeatable requests (checkout).
+
+The first request with a given (user, key) claims a row in
+idempotency_keys before doing any work; when it finishes, its status and
+body are stored on that row. Retries with the same key get the stored
+response back instead of running the handler again. Completed responses
+are also kept in an in-process LRU so most replays skip the database.
+Keys expire after IDEMPOTENCY_KEY_TTL seconds.
+
+A claim is a lease: if the request holding it has not finished within
+IDEMPOTENCY_LEASE_SECONDS (its worker died mid-request), the next retry
+takes the key over and runs the request itself. Each claim carries a
+random id, so a request that lost its lease can neither store its
+outcome over the new one nor release the new claim.
+"""
+import hashlib
+import logging
+import os
+import secrets
+import time
+from datetime import datetime, timedelta
+from sqlalchemy.exc import IntegrityError
+from database import db
+from services.lru_cache import LRUCache
+
+logger = logging.getLogger(__name__)
+
+IDEMPOTENCY_KEY_TTL = int(os.getenv('IDEMPOTENCY_KEY_TTL', 24 * 3600))
+# Must be longer than any request using keys can take
+IDEMPOTENCY_LEASE_SECONDS = int(os.getenv('IDEMPOTENCY_LEASE_SECONDS', 60))
+MAX_KEY_LENGTH = 255
+
+# Expired keys are deleted by begin() at most this often per process
+PURGE_INTERVAL_SECONDS = 60
+_purged_at = 0.0
+
+# (user_id, key) -> (request_hash, status, body)
+cache = LRUCache(
+    max_size=int(os.getenv('IDEMPOTENCY_CACHE_SIZE', 4096)),
+    ttl=IDEMPOTENCY_KEY_TTL
+)
+
+
+class IdempotencyError(Exception):
+    status_code = 409
+
+
+class RequestInProgress(IdempotencyError):
+    status_code = 409
+
+
+class KeyReused(IdempotencyError):
+    status_code = 422
+
+
+def fingerprint(method, path, body):
+    digest = hashlib.sha256()
+    for part in (method.encode(), path.encode(), body or b''):
+        digest.update(part)
+        digest.update(b'\0')
+    return digest.hexdigest()
+
+
+def _check(request_hash, stored_hash):
+    if request_hash != stored_hash:
+        raise KeyReused('Idempotency-Key was already used with a different request')
+
+
+def _maybe_purge():
+    global _purged_at
+    if time.monotonic() - _purged_at < PURGE_INTERVAL_SECONDS:
+        return
+    _purged_at = time.monotonic()
+    try:
+        purge_expired()
+    except Exception:
+        db.session.rollback()
+        logger.exception('Could not purge expired idempotency keys')
+
+
+def _take_over(record, now):
+    """Claim a key whose lease ran out; returns the new claim id, or None if someone else did"""
+    from models import IdempotencyKey
+
+    claim = secrets.token_hex(16)
+    taken = IdempotencyKey.query.filter_by(
+        id=record.id, claim_id=record.claim_id, response_status=None
+    ).update({'claim_id': claim, 'claimed_at': now}, synchronize_session=False)
+    db.session.commit()
+    return claim if taken else None
+
+
+def begin(user_id, key, request_hash):
+    """
+    Claim a key for a new request, or find its earlier outcome.
+    Returns (claim, None) when the caller should run the request and then
+    call complete() or release() with the claim, or (None, (status, body))
+    to replay. Raises RequestInProgress or KeyReused.
+    """
+    from models import IdempotencyKey
+
+    cached = cache.get((user_id, key))
+    if cached is not None:
+        _check(request_hash, cached[0])
+        return None, (cached[1], cached[2])
+
+    _maybe_purge()
+    now = datetime.utcnow()
+    record = IdempotencyKey.query.filter_by(user_id=user_id, key=key).first()
+    if record is not None and record.expires_at <= now:
+        db.session.delete(record)
+        db.session.flush()
+        record = None
+
+    if record is None:
+        claim = secrets.token_hex(16)
+        db.session.add(IdempotencyKey(
+            user_id=user_id,
+            key=key,
+            request_hash=request_hash,
+            claim_id=claim,
+            claimed_at=now,
+            expires_at=now + timedelta(seconds=IDEMPOTENCY_KEY_TTL)
+        ))
+        try:
+            db.session.commit()
+            return claim, None
+        except IntegrityError:
+            # A concurrent request claimed the key first
+            db.session.rollback()
+            record = IdempotencyKey.query.filter_by(user_id=user_id, key=key).first()
+            if record is None:
+                raise RequestInProgress('A request with this Idempotency-Key is still being processed')
+
+    _check(request_hash, record.request_hash)
+    if record.response_status is None:
+        claimed_at = record.claimed_at or record.created_at
+        if claimed_at <= now - timedelta(seconds=IDEMPOTENCY_LEASE_SECONDS):
+            claim = _take_over(record, now)
+            if claim is not None:
+                logger.warning('Idempotency-Key %r of user %s taken over after its lease ran out', key, user_id)
+                return claim, None
+        raise RequestInProgress('A request with this Idempotency-Key is still being processed')
+    cache.set((user_id, key), (record.request_hash, record.response_status, record.response_body))
+    return None, (record.response_status, record.response_body)
+
+
+def complete(user_id, key, claim, request_hash, status, body):
+    """Store the outcome of a claimed request so retries can replay it"""
+    from models import IdempotencyKey
+
+    stored = IdempotencyKey.query.filter_by(user_id=user_id, key=key, claim_id=claim, response_status=None).update(
+        {'response_status': status, 'response_body': body},
+        synchronize_session=False
+    )
+    db.session.commit()
+    if stored:
+        cache.set((user_id, key), (request_hash, status, body))
+    else:
+        logger.warning('Idempotency-Key %r of user %s finished after another request took it over', key, user_id)
+
+
+def release(user_id, key, claim):
+    """Give a claimed key back (the request failed before producing an outcome)"""
+    from models import IdempotencyKey
+
+    db.session.rollback()
+    IdempotencyKey.query.filter_by(user_id=user_id, key=key, claim_id=claim, response_status=None).delete(
+        synchronize_session=False
+    )
+    db.session.commit()
+    cache.delete((user_id, key))
+
+
+def purge_expired(limit=1000):
+    """Delete up to limit expired keys; returns how many were removed"""
+    from models import IdempotencyKey
+
+    ids = [row.id for row in IdempotencyKey.query.with_entities(IdempotencyKey.id).filter(
+        IdempotencyKey.expires_at <= datetime.utcnow()
+    ).limit(limit)]
+    if ids:
+        IdempotencyKey.query.filter(IdempotencyKey.id.in_(ids)).delete(synchronize_session=False)
+        db.session.commit()
+    return len(ids)
@@ -0,0 +1,276 @@
+"""
+Resized derivatives of locally stored product images.
+
+Source images live under IMAGE_ROOT and are referenced from
+Product.image_url as /static/<path>. Each one is rendered into the
+VARIANTS sizes (WebP, or JPEG when Pillow lacks WebP support) in a
+process pool and written to IMAGE_CACHE_DIR under a name derived from the
+source's content hash, so the files can be served as immutable.
+
+A small JSON manifest maps each image URL to its rendered files. Product.to_dict
+looks variants up there, which never touches the image files or starts
+any work. Product writes queue their image for background rendering
+through schedule() (see services.product_events), and generate_all()
+(python generate_images.py) pre-renders the whole catalogue and
+re-renders sources that changed on disk. Once variants are recorded the
+catalog version is bumped, so cached products and ETags pick them up.
+"""
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from flask import current_app, has_app_context
+
+logger = logging.getLogger(__name__)
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+IMAGE_ROOT = os.getenv('IMAGE_ROOT', os.path.join(BASE_DIR, 'static'))
+IMAGE_CACHE_DIR = os.getenv('IMAGE_CACHE_DIR', os.path.join(BASE_DIR, 'media', 'variants'))
+IMAGE_URL_PREFIX = '/static/'
+VARIANT_URL_PREFIX = '/media/variants/'
+MAX_WORKERS = int(os.getenv('IMAGE_WORKERS', os.cpu_count() or 2))
+
+# name -> (max width, max height, quality)
+VARIANTS = {
+    'thumbnail': (160, 160, 75),
+    'card': (480, 480, 80),
+    'detail': (1200, 1200, 85),
+}
+
+MANIFEST_NAME = 'manifest.json'
+MANIFEST_RELOAD_SECONDS = 5
+
+_lock = threading.Lock()
+_manifest = {}
+_manifest_mtime = None
+_manifest_checked = 0.0
+_pending = set()
+_executor = None
+
+
+def _output_format():
+    from PIL import features
+    return ('WEBP', 'webp') if features.check('webp') else ('JPEG', 'jpg')
+
+
+def source_path(image_url):
+    """Filesystem path for a local image URL, or None for remote/unsafe URLs"""
+    if not image_url or not image_url.startswith(IMAGE_URL_PREFIX):
+        return None
+    relative = image_url[len(IMAGE_URL_PREFIX):]
+    root = os.path.realpath(IMAGE_ROOT)
+    path = os.path.realpath(os.path.join(root, relative))
+    cache_dir = os.path.realpath(IMAGE_CACHE_DIR)
+    if not path.startswith(root + os.sep) or path.startswith(cache_dir + os.sep):
+        return None
+    return path
+
+
+def content_hash(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 16), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _variant_filename(digest, variant, extension):
+    return f'{digest[:2]}/{digest}-{variant}.{extension}'
+
+
+def render_variants(path):
+    """
+    Render every variant of one source image (runs in a worker process).
+    Returns (content hash, {variant: relative filename}).
+    """
+    from PIL import Image, ImageOps
+
+    digest = content_hash(path)
+    image_format, extension = _output_format()
+    files = {}
+
+    with Image.open(path) as source:
+        source = ImageOps.exif_transpose(source)
+        if source.mode not in ('RGB', 'RGBA'):
+            source = source.convert('RGBA' if 'A' in source.getbands() else 'RGB')
+        if image_format == 'JPEG' and source.mode == 'RGBA':
+            background = Image.new('RGB', source.size, (255, 255, 255))
+            background.paste(source, mask=source.getchannel('A'))
+            source = background
+
+        for variant, (width, height, quality) in VARIANTS.items():
+            filename = _variant_filename(digest, variant, extension)
+            target = os.path.join(IMAGE_CACHE_DIR, filename)
+            if not os.path.exists(target):
+                os.makedirs(os.path.dirname(target), exist_ok=True)
+                resized = source.copy()
+                resized.thumbnail((width, height), Image.LANCZOS)
+                tmp = f'{target}.{os.getpid()}.tmp'
+                resized.save(tmp, image_format, quality=quality, optimize=True)
+                os.replace(tmp, target)
+            files[variant] = filename
+    return digest, files
+
+
+def _manifest_path():
+    return os.path.join(IMAGE_CACHE_DIR, MANIFEST_NAME)
+
+
+def _load_manifest(force=False):
+    """Reload the manifest if another process (e.g. the CLI) rewrote it"""
+    global _manifest, _manifest_mtime, _manifest_checked
+    now = time.monotonic()
+    if not force and now - _manifest_checked < MANIFEST_RELOAD_SECONDS:
+        return
+    _manifest_checked = now
+    try:
+        mtime = os.path.getmtime(_manifest_path())
+    except OSError:
+        return
+    if force or mtime != _manifest_mtime:
+        try:
+            with open(_manifest_path()) as f:
+                _manifest = json.load(f)
+            _manifest_mtime = mtime
+        except (OSError, ValueError):
+            pass
+
+
+def _save_manifest():
+    os.makedirs(IMAGE_CACHE_DIR, exist_ok=True)
+    tmp = f'{_manifest_path()}.{os.getpid()}.tmp'
+    with open(tmp, 'w') as f:
+        json.dump(_manifest, f)
+    os.replace(tmp, _manifest_path())
+
+
+def _entry(path, files):
+    stat = os.stat(path)
+    return {'files': files, 'mtime': stat.st_mtime, 'size': stat.st_size}
+
+
+def _record(entries):
+    """
+    Merge {image_url: entry} into the manifest on disk: other processes
+    (servers, the CLI) record their renders in the same file
+    """
+    global _manifest_mtime
+    with _lock:
+        _load_manifest(force=True)
+        _manifest.update(entries)
+        _save_manifest()
+        _manifest_mtime = os.path.getmtime(_manifest_path())
+
+
+def _get_executor():
+    global _executor
+    if _executor is None:
+        _executor = ProcessPoolExecutor(max_workers=MAX_WORKERS)
+    return _executor
+
+
+def reload_manifest():
+    """Re-read the manifest now (another process recorded variants)"""
+    with _lock:
+        _load_manifest(force=True)
+
+
+def _is_current(entry, path):
+    if not entry:
+        return False
+    stat = os.stat(path)
+    return entry.get('mtime') == stat.st_mtime and entry.get('size') == stat.st_size
+
+
+def schedule(image_urls):
+    """
+    Queue background renders for local images that have no variants yet
+    or changed on disk. Called from the product write paths; when a
+    render is recorded, services.product_events.image_variants_ready runs
+    in an app context.
+    """
+    app = current_app._get_current_object() if has_app_context() else None
+    for image_url in set(image_urls):
+        path = source_path(image_url)
+        if path is None or not os.path.isfile(path):
+            continue
+        with _lock:
+            _load_manifest()
+            if image_url in _pending or _is_current(_manifest.get(image_url), path):
+                continue
+            _pending.add(image_url)
+        _get_executor().submit(render_variants, path).add_done_callback(_rendered(app, image_url, path))
+
+
+def _rendered(app, image_url, path):
+    def done(future):
+        with _lock:
+            _pending.discard(image_url)
+        try:
+            _, files = future.result()
+        except Exception:
+            logger.exception('Rendering variants of %s failed', image_url)
+            return
+        _record({image_url: _entry(path, files)})
+        if app is None:
+            return
+        from services import product_events
+
+        with app.app_context():
+            product_events.image_variants_ready(image_url)
+    return done
+
+
+def variant_urls(image_url):
+    """{variant: url} for a product image, or {} when there are none (yet)"""
+    if source_path(image_url) is None:
+        return {}
+
+    with _lock:
+        _load_manifest()
+        entry = _manifest.get(image_url)
+    if entry is None:
+        return {}
+    return {variant: VARIANT_URL_PREFIX + filename for variant, filename in entry['files'].items()}
+
+
+def generate_all(image_urls, workers=MAX_WORKERS, force=False):
+    """
+    Render variants for many images in a process pool.
+    Sources whose size and mtime match the manifest are skipped unless force.
+    Returns (rendered, skipped, failed) counts.
+    """
+    with _lock:
+        _load_manifest(force=True)
+        known = dict(_manifest)
+    todo = {}
+    skipped = 0
+    for image_url in set(image_urls):
+        path = source_path(image_url)
+        if path is None or not os.path.isfile(path):
+            continue
+        if not force and _is_current(known.get(image_url), path):
+            skipped += 1
+            continue
+        todo[image_url] = path
+
+    entries = {}
+    failed = 0
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = {pool.submit(render_variants, path): (url, path) for url, path in todo.items()}
+        for future, (url, path) in futures.items():
+            try:
+                _, files = future.result()
+            except Exception:
+                failed += 1
+                continue
+            entries[url] = _entry(path, files)
+
+    # Servers may have recorded renders while this ran; keep theirs
+    if entries:
+        _record(entries)
+    return len(entries), skipped, failed
@@ -0,0 +1,236 @@
+"""
+Background jobs.
+
+Handlers are plain functions registered with @job('name') and queued with
+enqueue('name', **payload). Payloads must be JSON-serializable. Two
+backends are available (JOB_BACKEND):
+
+- thread (default): jobs run in an in-process thread pool. Nothing is
+  persisted, so jobs queued right before a restart are lost.
+- db: jobs are rows in background_jobs, run by one or more
+  `python worker.py` processes. They survive restarts, and several
+  workers can share the queue.
+
+A failed job is retried with exponential backoff until max_attempts is
+reached. Handlers may therefore run more than once and must be safe to
+repeat.
+"""
+import json
+import logging
+import os
+import random
+import threading
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from flask import current_app
+from database import db
+
+logger = logging.getLogger(__name__)
+
+JOB_BACKEND = os.getenv('JOB_BACKEND', 'thread')
+JOB_WORKERS = int(os.getenv('JOB_WORKERS', 4))
+JOB_MAX_ATTEMPTS = int(os.getenv('JOB_MAX_ATTEMPTS', 5))
+JOB_RETRY_BASE_SECONDS = float(os.getenv('JOB_RETRY_BASE_SECONDS', 2))
+JOB_RETRY_MAX_SECONDS = float(os.getenv('JOB_RETRY_MAX_SECONDS', 600))
+# A 'running' job whose worker has not finished it within this time is
+# assumed to have died with its worker and is queued again
+JOB_LOCK_TIMEOUT_SECONDS = int(os.getenv('JOB_LOCK_TIMEOUT_SECONDS', 600))
+
+BACKENDS = ('thread', 'db')
+
+_handlers = {}
+_executor = None
+_executor_lock = threading.Lock()
+
+
+class UnknownJob(KeyError):
+    pass
+
+
+def job(name):
+    """Register a function as the handler for jobs called name"""
+    def register(fn):
+        _handlers[name] = fn
+        return fn
+    return register
+
+
+def retry_delay(attempt):
+    """Seconds to wait before retry number `attempt` (1-based), with jitter"""
+    delay = min(JOB_RETRY_BASE_SECONDS * 2 ** (attempt - 1), JOB_RETRY_MAX_SECONDS)
+    return delay * random.uniform(0.8, 1.2)
+
+
+def enqueue(name, max_attempts=None, delay=0, **payload):
+    """
+    Queue a job on the configured backend.
+    With the db backend the job row is committed here, so call this after
+    the commit of whatever the job depends on.
+    """
+    if name not in _handlers:
+        raise UnknownJob(name)
+    max_attempts = max_attempts or JOB_MAX_ATTEMPTS
+    if JOB_BACKEND == 'db':
+        return _enqueue_db(name, payload, max_attempts, delay)
+    _submit(current_app._get_current_object(), name, payload, 1, max_attempts, delay)
+    return None
+
+
+def enqueue_many(name, payloads, max_attempts=None):
+    """Queue one job per payload dict (one commit for all of them with the db backend)"""
+    if name not in _handlers:
+        raise UnknownJob(name)
+    max_attempts = max_attempts or JOB_MAX_ATTEMPTS
+    if JOB_BACKEND == 'db':
+        from models import BackgroundJob
+
+        now = datetime.utcnow()
+        db.session.add_all([
+            BackgroundJob(name=name, payload=json.dumps(payload), max_attempts=max_attempts, run_at=now)
+            for payload in payloads
+        ])
+        db.session.commit()
+        return
+    app = current_app._get_current_object()
+    for payload in payloads:
+        _submit(app, name, payload, 1, max_attempts, 0)
+
+
+# Thread backend
+
+def _get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=JOB_WORKERS, thread_name_prefix='job')
+        return _executor
+
+
+def _submit(app, name, payload, attempt, max_attempts, delay):
+    if delay > 0:
+        timer = threading.Timer(delay, _submit, (app, name, payload, attempt, max_attempts, 0))
+        timer.daemon = True
+        timer.start()
+        return
+    _get_executor().submit(_run_in_thread, app, name, payload, attempt, max_attempts)
+
+
+def _run_in_thread(app, name, payload, attempt, max_attempts):
+    with app.app_context():
+        try:
+            _handlers[name](**payload)
+        except Exception:
+            db.session.rollback()
+            if attempt >= max_attempts:
+                logger.exception('Job %s failed after %d attempts', name, attempt)
+                return
+            logger.warning('Job %s failed (attempt %d), retrying', name, attempt, exc_info=True)
+            _submit(app, name, payload, attempt + 1, max_attempts, retry_delay(attempt))
+        finally:
+            db.session.remove()
+
+
+# Database backend
+
+def _enqueue_db(name, payload, max_attempts, delay):
+    from models import BackgroundJob
+
+    record = BackgroundJob(
+        name=name,
+        payload=json.dumps(payload),
+        max_attempts=max_attempts,
+        run_at=datetime.utcnow() + timedelta(seconds=delay)
+    )
+    db.session.add(record)
+    db.session.commit()
+    return record.id
+
+
+def _claim(job_id, expected_status):
+    """Mark one job running; False if another worker got it first"""
+    from models import BackgroundJob
+
+    claimed = BackgroundJob.query.filter_by(id=job_id, status=expected_status).update(
+        {'status': 'running', 'locked_at': datetime.utcnow(), 'attempts': BackgroundJob.attempts + 1},
+        synchronize_session=False
+    )
+    db.session.commit()
+    return claimed == 1
+
+
+def requeue_stale():
+    """Queue 'running' jobs again whose worker appears to have died; returns the count"""
+    from models import BackgroundJob
+
+    cutoff = datetime.utcnow() - timedelta(seconds=JOB_LOCK_TIMEOUT_SECONDS)
+    count = BackgroundJob.query.filter(
+        BackgroundJob.status == 'running',
+        BackgroundJob.locked_at < cutoff
+    ).update({'status': 'queued', 'locked_at': None}, synchronize_session=False)
+    db.session.commit()
+    return count
+
+
+def run_due_jobs(limit=10):
+    """
+    Claim and run up to limit due jobs from the queue table (worker loop body).
+    Returns how many jobs were run.
+    """
+    from models import BackgroundJob
+
+    due = [row.id for row in BackgroundJob.query.with_entities(BackgroundJob.id).filter(
+        BackgroundJob.status == 'queued',
+        BackgroundJob.run_at <= datetime.utcnow()
+    ).order_by(BackgroundJob.run_at, BackgroundJob.id).limit(limit)]
+    db.session.commit()
+
+    ran = 0
+    for job_id in due:
+        if not _claim(job_id, 'queued'):
+            continue
+        _run_record(db.session.get(BackgroundJob, job_id))
+        ran += 1
+    return ran
+
+
+def _run_record(record):
+    handler = _handlers.get(record.name)
+    error = None
+    try:
+        if handler is None:
+            raise UnknownJob(record.name)
+        handler(**json.loads(record.payload))
+    except Exception:
+        db.session.rollback()
+        error = traceback.format_exc()
+
+    record = db.session.get(record.__class__, record.id)
+    now = datetime.utcnow()
+    record.locked_at = None
+    if error is None:
+        record.status = 'done'
+        record.finished_at = now
+        record.last_error = None
+    elif record.attempts >= record.max_attempts or handler is None:
+        record.status = 'failed'
+        record.finished_at = now
+        record.last_error = error
+        logger.error('Job %s #%d failed after %d attempts', record.name, record.id, record.attempts)
+    else:
+        record.status = 'queued'
+        record.run_at = now + timedelta(seconds=retry_delay(record.attempts))
+        record.last_error = error
+    db.session.commit()
+
+
+def retry_failed(job_id):
+    """Put a failed job back on the queue with a fresh set of attempts"""
+    from models import BackgroundJob
+
+    updated = BackgroundJob.query.filter_by(id=job_id, status='failed').update(
+        {'status': 'queued', 'attempts': 0, 'run_at': datetime.utcnow(), 'finished_at': None},
+        synchronize_session=False
+    )
+    db.session.commit()
+    return updated == 1
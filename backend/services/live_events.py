@@ -0,0 +1,148 @@
+"""
+Dashboard deltas published to services.event_bus.
+
+Called from the order and product after-commit hooks. Events are small:
+the dashboard patches what it already shows rather than re-fetching.
+Nothing here runs (and no queries are made) while no admin is connected.
+
+Low stock is tracked as a set of product ids below LOW_STOCK_THRESHOLD,
+loaded when a stream connects, so an event is sent only when a product
+crosses the threshold in either direction.
+"""
+import logging
+import os
+import threading
+from functools import wraps
+from database import db
+from services import event_bus
+
+logger = logging.getLogger(__name__)
+
+LOW_STOCK_THRESHOLD = int(os.getenv('LOW_STOCK_THRESHOLD', 10))
+
+# SQL Server allows at most 2100 parameters per statement
+MAX_IN_CLAUSE = 1000
+
+_low_stock = None   # product ids below the threshold; None while nobody is connected
+_low_stock_lock = threading.Lock()
+
+
+def _load_low_stock():
+    from models import Product
+
+    return {product_id for product_id, in db.session.query(Product.id).filter(
+        Product.stock_quantity < LOW_STOCK_THRESHOLD
+    )}
+
+
+def _active():
+    global _low_stock
+    if event_bus.bus.has_subscribers():
+        return True
+    # Nobody listening: drop the low-stock set rather than let it go stale
+    with _low_stock_lock:
+        _low_stock = None
+    return False
+
+
+def _quietly(hook):
+    """The write is already committed; a failed live update must not turn it into an error"""
+    @wraps(hook)
+    def wrapper(*args, **kwargs):
+        try:
+            hook(*args, **kwargs)
+        except Exception:
+            logger.exception('Live event hook %s failed', hook.__name__)
+    return wrapper
+
+
+def stream_opened():
+    """Make sure the low-stock set is loaded for a newly connected stream"""
+    global _low_stock
+    with _low_stock_lock:
+        if _low_stock is None:
+            _low_stock = _load_low_stock()
+
+
+@_quietly
+def catalog_reloaded():
+    """Many products changed at once; reload the low-stock set without events"""
+    global _low_stock
+    with _low_stock_lock:
+        _low_stock = _load_low_stock() if event_bus.bus.has_subscribers() else None
+
+
+@_quietly
+def order_created(order):
+    if not _active():
+        return
+    from models import User
+
+    user = db.session.get(User, order.user_id)
+    event_bus.publish(
+        'order.created',
+        id=order.id,
+        user_id=order.user_id,
+        user={'username': user.username, 'email': user.email} if user else None,
+        total_amount=order.total_amount,
+        status=order.status,
+        created_at=order.created_at.isoformat()
+    )
+    event_bus.publish(
+        'revenue',
+        day=order.created_at.date().isoformat(),
+        order_count=1,
+        revenue=order.total_amount
+    )
+
+
+@_quietly
+def orders_status_changed(changes):
+    """changes are (order_id, old_status, new_status)"""
+    if changes and _active():
+        event_bus.publish('order.status_changed', changes=[
+            {'id': order_id, 'old_status': old, 'new_status': new}
+            for order_id, old, new in changes
+        ])
+
+
+@_quietly
+def stock_changed(product_ids):
+    """Publish threshold crossings for products whose stock was written"""
+    global _low_stock
+    if not product_ids or not _active():
+        return
+    from models import Product
+
+    product_ids = list(set(product_ids))
+    rows = []
+    for start in range(0, len(product_ids), MAX_IN_CLAUSE):
+        rows.extend(db.session.query(Product.id, Product.name, Product.stock_quantity).filter(
+            Product.id.in_(product_ids[start:start + MAX_IN_CLAUSE])
+        ))
+
+    crossings = []
+    with _low_stock_lock:
+        if _low_stock is None:
+            # Loaded after this write committed, so there is nothing to compare against
+            _low_stock = _load_low_stock()
+            return
+        for product_id, name, stock in rows:
+            low = stock < LOW_STOCK_THRESHOLD
+            if low == (product_id in _low_stock):
+                continue
+            if low:
+                _low_stock.add(product_id)
+            else:
+                _low_stock.discard(product_id)
+            crossings.append(('stock.low' if low else 'stock.restocked', product_id, name, stock))
+
+    for event_type, product_id, name, stock in crossings:
+        event_bus.publish(event_type, id=product_id, name=name, stock_quantity=stock, threshold=LOW_STOCK_THRESHOLD)
+
+
+@_quietly
+def product_deleted(product_id):
+    with _low_stock_lock:
+        if _low_stock is not None:
+            _low_stock.discard(product_id)
@@ -0,0 +1,14 @@
+"""
+Outgoing customer notifications.
+
+There is no mail provider configured yet, so messages are written to the
+'notifications' logger. Swap send_email for a real transport when one is
+added; callers run in background jobs and may retry on exceptions.
+"""
+import logging
+
+logger = logging.getLogger('notifications')
+
+
+def send_email(to, subject, body):
+    logger.info('Email to %s: %s\n%s', to, subject, body)
@@ -0,0 +1,123 @@
+"""
+Hot/cold storage for orders.
+
+Closed orders (delivered or cancelled) that have not changed for
+ORDER_ARCHIVE_AFTER_DAYS are moved, with their items, from orders /
+order_items into orders_archive / order_items_archive. Each batch is
+copied and deleted in its own transaction, so an interrupted run loses
+nothing and the next run simply carries on. Ids are kept, and the
+read helpers here look in the hot tables first and then in the archive.
+"""
+import os
+import time
+from datetime import datetime, timedelta
+from sqlalchemy import delete, func, insert, literal, select, union_all
+from database import db
+from models import ArchivedOrder, ArchivedOrderItem, Order, OrderItem
+
+ORDER_ARCHIVE_AFTER_DAYS = int(os.getenv('ORDER_ARCHIVE_AFTER_DAYS', 180))
+CLOSED_STATUSES = ('delivered', 'cancelled')
+
+DEFAULT_BATCH_SIZE = 500
+# Order ids of one batch go into IN lists; SQL Server allows 2100 parameters
+MAX_BATCH_SIZE = 1000
+
+ORDER_COLUMNS = ('id', 'user_id', 'total_amount', 'status', 'shipping_address',
+                 'payment_method', 'created_at', 'updated_at')
+ITEM_COLUMNS = ('id', 'order_id', 'product_id', 'quantity', 'price')
+
+# (order model, item model) for the hot tables and the archive
+SOURCES = ((Order, OrderItem), (ArchivedOrder, ArchivedOrderItem))
+
+
+def _archivable(cutoff):
+    return (Order.status.in_(CLOSED_STATUSES), Order.updated_at < cutoff)
+
+
+def archive_batch(cutoff, batch_size=DEFAULT_BATCH_SIZE):
+    """Move one batch of closed orders last updated before cutoff; returns (orders, items) moved"""
+    batch_size = max(1, min(batch_size, MAX_BATCH_SIZE))
+    ids = [row.id for row in db.session.query(Order.id).filter(
+        *_archivable(cutoff)
+    ).order_by(Order.id).limit(batch_size)]
+    if not ids:
+        db.session.rollback()
+        return 0, 0
+
+    try:
+        now = datetime.utcnow()
+        db.session.execute(insert(ArchivedOrder).from_select(
+            ORDER_COLUMNS + ('archived_at',),
+            select(*[getattr(Order, c) for c in ORDER_COLUMNS], literal(now)).where(
+                Order.id.in_(ids), *_archivable(cutoff)
+            )
+        ))
+        moved = [row.id for row in db.session.query(ArchivedOrder.id).filter(ArchivedOrder.id.in_(ids))]
+        items = db.session.execute(insert(ArchivedOrderItem).from_select(
+            ITEM_COLUMNS,
+            select(*[getattr(OrderItem, c) for c in ITEM_COLUMNS]).where(OrderItem.order_id.in_(moved))
+        )).rowcount
+        db.session.execute(delete(OrderItem).where(OrderItem.order_id.in_(moved)))
+        db.session.execute(delete(Order).where(Order.id.in_(moved)))
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+    return len(moved), items
+
+
+def archive_closed_orders(older_than_days=ORDER_ARCHIVE_AFTER_DAYS, batch_size=DEFAULT_BATCH_SIZE,
+                          max_batches=None, pause=0):
+    """
+    Archive closed orders in batches until none are left (or max_batches).
+    pause sleeps between batches to leave room for regular traffic.
+    """
+    cutoff = datetime.utcnow() - timedelta(days=older_than_days)
+    report = {'orders': 0, 'items': 0, 'batches': 0, 'cutoff': cutoff.isoformat()}
+    started = time.perf_counter()
+    while max_batches is None or report['batches'] < max_batches:
+        orders, items = archive_batch(cutoff, batch_size)
+        if not orders:
+            break
+        report['orders'] += orders
+        report['items'] += items
+        report['batches'] += 1
+        if pause:
+            time.sleep(pause)
+    report['elapsed_seconds'] = round(time.perf_counter() - started, 3)
+    return report
+
+
+def pending_count(older_than_days=ORDER_ARCHIVE_AFTER_DAYS):
+    cutoff = datetime.utcnow() - timedelta(days=older_than_days)
+    return db.session.query(func.count(Order.id)).filter(*_archivable(cutoff)).scalar()
+
+
+def find_order(order_id, user_id=None):
+    """An Order, or the ArchivedOrder with that id, or None"""
+    for model, _ in SOURCES:
+        query = model.query.filter_by(id=order_id)
+        if user_id is not None:
+            query = query.filter_by(user_id=user_id)
+        order = query.first()
+        if order is not None:
+            return order
+    return None
+
+
+def combined_scalar(build):
+    """
+    Sum of a scalar aggregate over the hot and archive tables.
+    build(order_model, item_model) returns the query for one pair.
+    """
+    return sum(build(order_model, item_model).scalar() or 0 for order_model, item_model in SOURCES)
+
+
+def combined_items(*columns):
+    """
+    Subquery with the given order item columns from the hot and archive
+    tables (UNION ALL), for aggregates the database should order and limit
+    """
+    return union_all(*[
+        select(*[getattr(item_model, column) for column in columns]) for _, item_model in SOURCES
+    ]).subquery()
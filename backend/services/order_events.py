@@ -0,0 +1,46 @@
+"""
+Hooks called by the order write paths after a commit.
+
+Side effects of order changes (notifications, and anything added later)
+run as background jobs queued from here, so requests only pay for the
+enqueue. Cached analytics are marked stale and live dashboard events
+published synchronously.
+"""
+import logging
+from services import analytics_cache, jobs, live_events
+from services import order_jobs  # noqa: F401  (registers the handlers)
+
+logger = logging.getLogger(__name__)
+
+
+def _enqueue(name, **payload):
+    # The order is already committed; a queue hiccup must not turn that into an error response
+    try:
+        jobs.enqueue(name, **payload)
+    except Exception:
+        logger.exception('Could not enqueue job %s %r', name, payload)
+
+
+def _enqueue_many(name, payloads):
+    try:
+        jobs.enqueue_many(name, payloads)
+    except Exception:
+        logger.exception('Could not enqueue %d %s jobs', len(payloads), name)
+
+
+def order_placed(order):
+    analytics_cache.invalidate()
+    live_events.order_created(order)
+    _enqueue('orders.placed', order_id=order.id)
+    _enqueue('orders.record_sketches', order_id=order.id)
+
+
+def orders_status_changed(changes):
+    """Status changes, single or bulk; changes are (order_id, old_status, new_status)"""
+    if changes:
+        analytics_cache.invalidate()
+        live_events.orders_status_changed(changes)
+        _enqueue_many('orders.status_changed', [
+            {'order_id': order_id, 'old_status': old, 'new_status': new}
+            for order_id, old, new in changes
+        ])
@@ -0,0 +1,48 @@
+"""
+Background job handlers for order side effects.
+
+Customer notifications go through services.notifications; handlers
+re-read the order so a retry always acts on the current state.
+"""
+from database import db
+from services import notifications, order_sketches
+from services.jobs import job
+
+
+def _order_and_user(order_id):
+    from models import Order, User
+
+    order = db.session.get(Order, order_id)
+    if order is None:
+        return None, None
+    return order, db.session.get(User, order.user_id)
+
+
+@job('orders.placed')
+def order_placed(order_id):
+    order, user = _order_and_user(order_id)
+    if order is None or user is None:
+        return
+    notifications.send_email(
+        user.email,
+        f'Order #{order.id} received',
+        f'Thanks for your order of ${order.total_amount:.2f}. We will let you know when it ships.'
+    )
+
+
+@job('orders.record_sketches')
+def record_sketches(order_id):
+    order_sketches.record_order(order_id)
+
+
+@job('orders.status_changed')
+def order_status_changed(order_id, old_status, new_status):
+    order, user = _order_and_user(order_id)
+    if order is None or user is None or order.status != new_status:
+        # Changed again since; the newer change has its own job
+        return
+    notifications.send_email(
+        user.email,
+        f'Order #{order.id} is {new_status}',
+        f'Your order status changed from {old_status} to {new_status}.'
+    )
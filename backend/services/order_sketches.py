@@ -0,0 +1,245 @@
+"""
+Per-day quantile sketches of order value and basket size.
+
+order_sketches holds one t-digest per (day, metric, category): metric is
+order_value (money) or item_count (units), category '' covers whole
+orders and a category name covers only that category's lines. Each
+placed order is folded in by a background job; percentile queries over
+any range merge the day sketches and never touch order rows.
+
+Writers use optimistic concurrency: a row is read with its version,
+merged in Python, and written back with UPDATE ... WHERE version = read
+version. If another writer got there first nothing matches and the
+whole order is retried from a fresh read.
+
+Jobs can run more than once (retries, requeued stale jobs), so each
+order's id goes into sketched_orders in the same transaction as its
+merge; an order that is already there is skipped.
+"""
+import logging
+from collections import defaultdict
+from datetime import datetime
+from sqlalchemy import insert, select
+from sqlalchemy.exc import IntegrityError
+from database import db
+from models import OrderSketch, Product, SketchedOrder
+from services.analytics_engine import UNCATEGORIZED
+from services.tdigest import TDigest
+
+logger = logging.getLogger(__name__)
+
+METRICS = ('order_value', 'item_count')
+OVERALL = ''
+
+MAX_ATTEMPTS = 10
+
+# Rebuild buffers raw values per sketch and folds them in this many at a time
+REBUILD_CHUNK = 10000
+
+
+class SketchConflict(RuntimeError):
+    """Raised when a sketch update keeps losing to concurrent writers"""
+
+
+def _categories(product_ids):
+    return dict(db.session.query(Product.id, Product.category).filter(Product.id.in_(set(product_ids))))
+
+
+def observations(created_at, total_amount, lines, categories):
+    """
+    {(day, metric, category): [values]} for one order.
+    lines are (product_id, quantity, price); categories maps product ids to
+    category names (products missing from it count as Uncategorized).
+    """
+    values = defaultdict(float)
+    units = defaultdict(int)
+    for product_id, quantity, price in lines:
+        category = categories.get(product_id) or UNCATEGORIZED
+        values[category] += quantity * price
+        units[category] += quantity
+
+    day = created_at.date()
+    result = {
+        (day, 'order_value', OVERALL): [total_amount],
+        (day, 'item_count', OVERALL): [sum(units.values())]
+    }
+    for category in values:
+        result[(day, 'order_value', category)] = [values[category]]
+        result[(day, 'item_count', category)] = [units[category]]
+    return result
+
+
+def _merge(order_id, digests):
+    """
+    Fold one order's {(day, metric, category): TDigest} into the stored
+    sketches in one transaction, retrying on version conflicts. Commits.
+    Returns False if the order had already been folded in.
+    """
+    for attempt in range(1, MAX_ATTEMPTS + 1):
+        if db.session.get(SketchedOrder, order_id) is not None:
+            db.session.rollback()
+            return False
+        try:
+            if _try_merge(order_id, digests):
+                db.session.commit()
+                return True
+        except IntegrityError:
+            # Someone inserted one of our new rows (or this order's marker) first;
+            # re-read and merge into theirs, or find the order already recorded
+            pass
+        db.session.rollback()
+        logger.debug('Sketch update conflict (attempt %d), retrying', attempt)
+    raise SketchConflict(f'Gave up after {MAX_ATTEMPTS} conflicting sketch updates')
+
+
+def _try_merge(order_id, digests):
+    db.session.add(SketchedOrder(order_id=order_id))
+    db.session.flush()
+
+    days = {day for day, _, _ in digests}
+    stored = {
+        (row.day, row.metric, row.category): row
+        for row in db.session.query(
+            OrderSketch.day, OrderSketch.metric, OrderSketch.category,
+            OrderSketch.digest, OrderSketch.version
+        ).filter(
+            OrderSketch.day.in_(days),
+            OrderSketch.metric.in_({metric for _, metric, _ in digests}),
+            OrderSketch.category.in_({category for _, _, category in digests})
+        )
+    }
+
+    now = datetime.utcnow()
+    for key, digest in digests.items():
+        day, metric, category = key
+        row = stored.get(key)
+        if row is None:
+            db.session.add(OrderSketch(day=day, metric=metric, category=category,
+                                       count=digest.count, digest=digest.to_bytes(), version=1))
+            db.session.flush()
+            continue
+
+        merged = TDigest.from_bytes(row.digest).merge(digest)
+        updated = OrderSketch.query.filter_by(
+            day=day, metric=metric, category=category, version=row.version
+        ).update({
+            'digest': merged.to_bytes(),
+            'count': merged.count,
+            'version': row.version + 1,
+            'updated_at': now
+        }, synchronize_session=False)
+        if not updated:
+            return False
+    return True
+
+
+def record_order(order_id):
+    """
+    Fold one placed order into the sketches (run from a background job).
+    Safe to repeat: returns False when the order was already recorded.
+    """
+    from models import Order
+
+    if db.session.get(SketchedOrder, order_id) is not None:
+        return False
+    order = db.session.get(Order, order_id)
+    if order is None:
+        return False
+    lines = [(item.product_id, item.quantity, item.price) for item in order.order_items]
+    cells = observations(order.created_at, order.total_amount, lines,
+                         _categories(product_id for product_id, _, _ in lines))
+    return _merge(order_id, {key: TDigest.of(values) for key, values in cells.items()})
+
+
+def rebuild(batch_size=5000):
+    """
+    Recompute every sketch from the live and archived orders, in one
+    transaction. Returns the number of sketch rows written.
+    """
+    from services.order_archive import SOURCES
+
+    categories = dict(db.session.query(Product.id, Product.category))
+    digests = defaultdict(TDigest)
+    pending = defaultdict(list)
+
+    def collect(order, lines):
+        _, created_at, total_amount = order
+        for key, values in observations(created_at, total_amount, lines, categories).items():
+            pending[key].extend(values)
+            if len(pending[key]) >= REBUILD_CHUNK:
+                digests[key].add(pending.pop(key))
+
+    last_ids = {}
+    for order_model, item_model in SOURCES:
+        rows = db.session.query(
+            order_model.id, order_model.created_at, order_model.total_amount,
+            item_model.product_id, item_model.quantity, item_model.price
+        ).outerjoin(item_model, item_model.order_id == order_model.id).order_by(order_model.id).yield_per(batch_size)
+
+        current, lines = None, []
+        for order_id, created_at, total_amount, product_id, quantity, price in rows:
+            if current is not None and order_id != current[0]:
+                collect(current, lines)
+                lines = []
+            current = (order_id, created_at, total_amount)
+            if product_id is not None:
+                lines.append((product_id, quantity, price))
+        if current is not None:
+            collect(current, lines)
+            last_ids[order_model] = current[0]
+
+    for key, values in pending.items():
+        digests[key].add(values)
+
+    try:
+        OrderSketch.query.delete(synchronize_session=False)
+        for (day, metric, category), digest in digests.items():
+            db.session.add(OrderSketch(day=day, metric=metric, category=category,
+                                       count=digest.count, digest=digest.to_bytes(), version=1))
+        # Every order read above is in the sketches now; jobs still queued for them must skip
+        SketchedOrder.query.delete(synchronize_session=False)
+        for order_model, last_id in last_ids.items():
+            db.session.execute(insert(SketchedOrder).from_select(
+                ['order_id'], select(order_model.id).where(order_model.id <= last_id)
+            ))
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+    return len(digests)
+
+
+# Reads
+
+def distribution(start_day, end_day, metric, quantiles, category=None):
+    """
+    Merged sketches for start_day..end_day:
+    {category: {'count', 'mean', 'min', 'max', 'quantiles': [...]}} with
+    OVERALL ('') for whole orders; category limits it to one category.
+    """
+    query = db.session.query(OrderSketch.category, OrderSketch.digest).filter(
+        OrderSketch.metric == metric,
+        OrderSketch.day >= start_day,
+        OrderSketch.day <= end_day
+    )
+    if category is not None:
+        query = query.filter(OrderSketch.category == category)
+
+    merged = {}
+    for row_category, data in query:
+        digest = TDigest.from_bytes(data)
+        if row_category in merged:
+            merged[row_category].merge(digest)
+        else:
+            merged[row_category] = digest
+
+    return {
+        name: {
+            'count': digest.count,
+            'mean': digest.mean(),
+            'min': digest.min,
+            'max': digest.max,
+            'quantiles': [float(value) for value in digest.quantile(quantiles)]
+        }
+        for name, digest in merged.items()
+    }
@@ -0,0 +1,155 @@
+"""
+Order status transitions, single and in bulk.
+
+Bulk changes read the current statuses once, then apply one guarded
+UPDATE per (read status, target status) pair (WHERE status = <read
+status>), so an order that another request moved in the meantime is
+reported as a conflict instead of being overwritten or recorded with the
+wrong previous status.
+"""
+from datetime import datetime
+from sqlalchemy import func, update
+from database import db
+from models import Order, OrderItem
+from services import sales_rollup
+
+ORDER_STATUSES = ('pending', 'processing', 'shipped', 'delivered', 'cancelled')
+
+# current status -> statuses it may move to
+ALLOWED_TRANSITIONS = {
+    'pending': ('processing', 'shipped', 'cancelled'),
+    'processing': ('shipped', 'cancelled'),
+    'shipped': ('delivered',),
+    'delivered': (),
+    'cancelled': (),
+}
+
+MAX_ENTRIES = 5000
+# SQL Server allows at most 2100 parameters per statement
+CHUNK_SIZE = 1000
+
+
+class StatusUpdateError(ValueError):
+    pass
+
+
+def _is_int(value):
+    return isinstance(value, int) and not isinstance(value, bool)
+
+
+def _chunks(ids):
+    for start in range(0, len(ids), CHUNK_SIZE):
+        yield ids[start:start + CHUNK_SIZE]
+
+
+def _current_orders(order_ids):
+    """{order_id: (status, created_at, total_amount)}"""
+    orders = {}
+    for chunk in _chunks(order_ids):
+        for row in db.session.query(Order.id, Order.status, Order.created_at, Order.total_amount).filter(
+            Order.id.in_(chunk)
+        ):
+            orders[row.id] = (row.status, row.created_at, row.total_amount)
+    return orders
+
+
+def _items_sold(order_ids):
+    items = {}
+    for chunk in _chunks(order_ids):
+        items.update(db.session.query(OrderItem.order_id, func.sum(OrderItem.quantity)).filter(
+            OrderItem.order_id.in_(chunk)
+        ).group_by(OrderItem.order_id))
+    return items
+
+
+def change_status(order_id, status):
+    """
+    Move one order to status with the same transition checks and guarded
+    UPDATE as the bulk path; the caller commits.
+    Returns (result, changes) as for apply_status_changes.
+    """
+    results, changes = apply_status_changes([{'order_id': order_id, 'status': status}])
+    return results[0], changes
+
+
+def apply_status_changes(entries):
+    """
+    Apply [{order_id, status}, ...] in one transaction (sales rollup
+    included); the caller commits.
+    Returns (results, changes): one compact result per entry, and
+    (order_id, old_status, new_status) for every order that changed.
+    """
+    if not isinstance(entries, list):
+        raise StatusUpdateError('updates must be a list')
+    if len(entries) > MAX_ENTRIES:
+        raise StatusUpdateError(f'At most {MAX_ENTRIES} updates per request')
+
+    results = {}
+    targets = {}
+    sequence = []
+    for index, entry in enumerate(entries):
+        order_id = entry.get('order_id') if isinstance(entry, dict) else None
+        status = entry.get('status') if isinstance(entry, dict) else None
+        if not _is_int(order_id):
+            results[('index', index)] = {'index': index, 'result': 'rejected', 'error': 'order_id must be an integer'}
+            sequence.append(('index', index))
+            continue
+        if order_id in targets or order_id in results:
+            continue
+        sequence.append(order_id)
+        if status not in ORDER_STATUSES:
+            results[order_id] = {'order_id': order_id, 'result': 'rejected',
+                                 'error': f'status must be one of: {", ".join(ORDER_STATUSES)}'}
+            continue
+        targets[order_id] = status
+
+    orders = _current_orders(list(targets))
+    current = {order_id: order[0] for order_id, order in orders.items()}
+    by_transition = {}
+    for order_id, status in targets.items():
+        old = current.get(order_id)
+        if old is None:
+            results[order_id] = {'order_id': order_id, 'result': 'not_found'}
+        elif old == status:
+            results[order_id] = {'order_id': order_id, 'result': 'unchanged', 'status': old}
+        elif status not in ALLOWED_TRANSITIONS.get(old, ()):
+            results[order_id] = {'order_id': order_id, 'result': 'rejected', 'status': old,
+                                 'error': f'Cannot change status from {old} to {status}'}
+        else:
+            by_transition.setdefault((old, status), []).append(order_id)
+
+    now = datetime.utcnow()
+    changes = []
+    for (old, status), order_ids in by_transition.items():
+        for chunk in _chunks(order_ids):
+            # Guard on the status that was read: the rollup moves totals out of it
+            updated = db.session.execute(
+                update(Order).where(
+                    Order.id.in_(chunk),
+                    Order.status == old
+                ).values(status=status, updated_at=now),
+                execution_options={'synchronize_session': False}
+            ).rowcount
+            landed = set(chunk)
+            if updated != len(chunk):
+                # Some orders moved since they were read; see which ones we got
+                landed = {row.id for row in db.session.query(Order.id).filter(
+                    Order.id.in_(chunk), Order.status == status, Order.updated_at == now
+                )}
+            for order_id in chunk:
+                if order_id in landed:
+                    results[order_id] = {'order_id': order_id, 'result': 'updated',
+                                         'status': status, 'previous_status': old}
+                    changes.append((order_id, old, status))
+                else:
+                    results[order_id] = {'order_id': order_id, 'result': 'conflict',
+                                         'error': 'Order status changed concurrently'}
+
+    if changes:
+        items = _items_sold([order_id for order_id, _, _ in changes])
+        sales_rollup.record_status_changes(
+            (orders[order_id][1], old, new, orders[order_id][2], int(items.get(order_id) or 0))
+            for order_id, old, new in changes
+        )
+
+    return [results[key] for key in sequence], changes
@@ -0,0 +1,107 @@
+import base64
+import json
+from datetime import datetime
+from sqlalchemy import and_, or_
+
+
+class InvalidCursor(ValueError):
+    """Raised when a pagination cursor cannot be decoded"""
+
+
+def encode_cursor(sort, value, row_id, direction):
+    """Pack a sort key position into an opaque, URL-safe token"""
+    if isinstance(value, datetime):
+        value = value.isoformat()
+    raw = json.dumps([sort, value, row_id, direction], separators=(',', ':'))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_cursor(token, sort):
+    """Unpack a cursor token; returns (value, id, direction)"""
+    try:
+        raw = base64.urlsafe_b64decode(token + '=' * (-len(token) % 4))
+        cursor_sort, value, row_id, direction = json.loads(raw)
+    except (ValueError, TypeError):
+        raise InvalidCursor('Invalid cursor')
+
+    if cursor_sort != sort or direction not in ('next', 'prev') or not isinstance(row_id, int):
+        raise InvalidCursor('Cursor does not match the requested sort order')
+    return value, row_id, direction
+
+
+def keyset_page(query, sort, sort_column, id_column, limit, cursor=None, descending=True):
+    """
+    Fetch one page of `query` ordered by (sort_column, id_column).
+
+    Rows are located by comparing against the key of the last row seen
+    rather than with OFFSET, so every page costs the same index seek no
+    matter how deep the client has paged.
+    Returns (rows, next_cursor, prev_cursor).
+    """
+    return merged_keyset_page([(query, sort_column, id_column)], sort, limit, cursor, descending)
+
+
+def merged_keyset_page(sources, sort, limit, cursor=None, descending=True):
+    """
+    Like keyset_page, over several queries whose rows share one key space
+    (e.g. a table and its archive). sources is a list of
+    (query, sort_column, id_column); the columns must have the same names
+    in every source. Each query is seeked separately and the results merged.
+    """
+    backwards = False
+    value = last_id = None
+    if cursor:
+        value, last_id, direction = decode_cursor(cursor, sort)
+        backwards = direction == 'prev'
+
+    rows = []
+    for query, sort_column, id_column in sources:
+        rows.extend(_seek(query, sort_column, id_column, limit, cursor, value, last_id, descending, backwards))
+
+    # Walking backwards flips the ordering; the page is reversed again
+    # below so rows always come out in display order.
+    sort_key, id_key = sources[0][1].key, sources[0][2].key
+    if len(sources) > 1:
+        rows.sort(key=lambda row: (getattr(row, sort_key), getattr(row, id_key)), reverse=descending != backwards)
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    if backwards:
+        rows.reverse()
+
+    def cursor_for(row, direction):
+        return encode_cursor(sort, getattr(row, sort_key), getattr(row, id_key), direction)
+
+    next_cursor = prev_cursor = None
+    if rows:
+        if backwards or has_more:
+            next_cursor = cursor_for(rows[-1], 'next')
+        if (backwards and has_more) or (not backwards and cursor):
+            prev_cursor = cursor_for(rows[0], 'prev')
+    return rows, next_cursor, prev_cursor
+
+
+def _seek(query, sort_column, id_column, limit, cursor, value, last_id, descending, backwards):
+    """Up to limit + 1 rows of one source past the cursor position"""
+    if cursor:
+        if sort_column.type.python_type is datetime:
+            try:
+                value = datetime.fromisoformat(value)
+            except (TypeError, ValueError):
+                raise InvalidCursor('Invalid cursor')
+
+        if descending != backwards:
+            query = query.filter(or_(
+                sort_column < value,
+                and_(sort_column == value, id_column < last_id)
+            ))
+        else:
+            query = query.filter(or_(
+                sort_column > value,
+                and_(sort_column == value, id_column > last_id)
+            ))
+
+    if descending != backwards:
+        query = query.order_by(sort_column.desc(), id_column.desc())
+    else:
+        query = query.order_by(sort_column.asc(), id_column.asc())
+    return query.limit(limit + 1).all()
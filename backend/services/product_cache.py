@@ -0,0 +1,93 @@
+"""
+Read-through cache of serialized products (Product.to_dict output).
+
+Entries are dropped through services.product_events whenever a product
+or its stock is written, so cached prices and stock never outlive a
+commit in this process. Writes made by other processes clear the cache
+once services.catalog_version notices them; the TTL is a backstop.
+"""
+import os
+import threading
+from services.lru_cache import LRUCache
+
+cache = LRUCache(
+    max_size=int(os.getenv('PRODUCT_CACHE_SIZE', 2048)),
+    ttl=float(os.getenv('PRODUCT_CACHE_TTL', 300))
+)
+
+# SQL Server allows at most 2100 parameters per statement
+MAX_IN_CLAUSE = 1000
+
+# Bumped on every invalidation. A reader that loaded from the database
+# while an invalidation happened must not put its (possibly old) copy back.
+_generation = 0
+_generation_lock = threading.Lock()
+
+
+def _store(rows, generation):
+    with _generation_lock:
+        if generation != _generation:
+            return
+        for product_id, data in rows.items():
+            cache.set(product_id, data)
+
+
+def get_product(product_id):
+    """Serialized product, or None if it does not exist"""
+    data = cache.get(product_id)
+    if data is not None:
+        return dict(data)
+
+    from models import Product
+
+    generation = _generation
+    product = Product.query.get(product_id)
+    if product is None:
+        return None
+    data = product.to_dict()
+    _store({product_id: data}, generation)
+    return dict(data)
+
+
+def get_products(product_ids):
+    """Serialized products keyed by id; ids that do not exist are left out"""
+    found = {}
+    missing = []
+    for product_id in set(product_ids):
+        data = cache.get(product_id)
+        if data is None:
+            missing.append(product_id)
+        else:
+            found[product_id] = dict(data)
+
+    if missing:
+        from models import Product
+
+        generation = _generation
+        loaded = {}
+        for start in range(0, len(missing), MAX_IN_CLAUSE):
+            chunk = missing[start:start + MAX_IN_CLAUSE]
+            for product in Product.query.filter(Product.id.in_(chunk)):
+                loaded[product.id] = product.to_dict()
+        _store(loaded, generation)
+        found.update((product_id, dict(data)) for product_id, data in loaded.items())
+    return found
+
+
+def invalidate(product_ids):
+    global _generation
+    with _generation_lock:
+        _generation += 1
+        for product_id in product_ids:
+            cache.delete(product_id)
+
+
+def clear():
+    global _generation
+    with _generation_lock:
+        _generation += 1
+        cache.clear()
+
+
+def stats():
+    return cache.stats()
@@ -0,0 +1,70 @@
+"""
+Hooks called by the product write paths after a commit.
+
+Every in-process structure derived from the products table is kept in
+sync from here, and live dashboard events are published, so routes only
+need to report what changed. The shared catalog version is bumped too,
+which is how other processes (server workers, the import CLI) learn
+about the write; see services.catalog_version.
+"""
+from database import db
+from services import search_index, facet_index, product_cache, catalog_version, analytics_cache, live_events
+from services import image_variants
+
+
+def rebuild_indexes():
+    """Reload every product index from the database"""
+    search_index.rebuild()
+    facet_index.rebuild()
+
+
+def products_bulk_changed(image_urls=()):
+    """
+    Many products were written at once (bulk import); the indexes reload
+    from the database on next use rather than being patched.
+    image_urls: images the written rows refer to, rendered if new
+    """
+    image_variants.schedule(image_urls)
+    product_cache.clear()
+    search_index.invalidate()
+    facet_index.invalidate()
+    catalog_version.bump(indexes=True)
+    analytics_cache.invalidate()
+    live_events.catalog_reloaded()
+
+
+def product_saved(product):
+    """A product was created or updated"""
+    image_variants.schedule([product.image_url])
+    search_index.index_product(product)
+    facet_index.index_product(product)
+    product_cache.invalidate([product.id])
+    catalog_version.bump(indexes=True)
+    analytics_cache.invalidate()
+    live_events.stock_changed([product.id])
+
+
+def product_deleted(product_id):
+    search_index.remove_product(product_id)
+    facet_index.remove_product(product_id)
+    product_cache.invalidate([product_id])
+    catalog_version.bump(indexes=True)
+    analytics_cache.invalidate()
+    live_events.product_deleted(product_id)
+
+
+def image_variants_ready(image_url):
+    """Variants of an image were rendered; products showing it serialize differently now"""
+    from models import Product
+
+    product_ids = [product_id for (product_id,) in db.session.query(Product.id).filter(Product.image_url == image_url)]
+    product_cache.invalidate(product_ids)
+    catalog_version.bump()
+
+
+def stock_changed(product_ids):
+    """Stock was written for these products (indexes don't cover stock)"""
+    product_cache.invalidate(product_ids)
+    catalog_version.bump()
+    analytics_cache.invalidate()
+    live_events.stock_changed(product_ids)
@@ -0,0 +1,249 @@
+"""
+Streaming bulk product import (CSV or NDJSON).
+
+Rows are read lazily from the input, validated, and upserted in bounded
+batches keyed on (name, brand): existing products are updated, new ones
+inserted, each batch with one executemany per statement type and its own
+commit. Memory use stays flat regardless of the file size.
+"""
+import csv
+import io
+import json
+import time
+from sqlalchemy import insert, update
+from database import db
+from models import Product
+from services import product_events
+
+DEFAULT_BATCH_SIZE = 1000
+# Product names of one batch go into an IN list; stay under SQL Server's 2100 parameter limit
+MAX_BATCH_SIZE = 2000
+MAX_REPORTED_ERRORS = 1000
+
+FORMATS = ('csv', 'ndjson')
+
+STRING_COLUMNS = {
+    'name': 200,
+    'description': None,
+    'category': 100,
+    'age_range': 50,
+    'image_url': 500,
+    'brand': 100,
+}
+
+TRUE_VALUES = ('1', 'true', 'yes', 'y')
+FALSE_VALUES = ('0', 'false', 'no', 'n')
+
+
+def detect_format(filename=None, content_type=None):
+    """Guess the input format from a file name or content type"""
+    name = (filename or '').lower()
+    ctype = (content_type or '').lower()
+    if name.endswith(('.ndjson', '.jsonl')) or 'ndjson' in ctype or 'jsonl' in ctype:
+        return 'ndjson'
+    if name.endswith('.csv') or 'csv' in ctype:
+        return 'csv'
+    return None
+
+
+def iter_records(stream, fmt):
+    """Yield (row_number, record or None, parse_error or None) from a text stream"""
+    if fmt == 'csv':
+        for row_number, record in enumerate(csv.DictReader(stream), start=1):
+            yield row_number, record, None
+    elif fmt == 'ndjson':
+        row_number = 0
+        for line in stream:
+            if not line.strip():
+                continue
+            row_number += 1
+            try:
+                record = json.loads(line)
+            except ValueError as e:
+                yield row_number, None, f'Invalid JSON: {e}'
+                continue
+            if not isinstance(record, dict):
+                yield row_number, None, 'Each line must be a JSON object'
+                continue
+            yield row_number, record, None
+    else:
+        raise ValueError(f'Unsupported format: {fmt}')
+
+
+def _blank(value):
+    return value is None or (isinstance(value, str) and not value.strip())
+
+
+def validate_record(record):
+    """
+    Normalize one input record.
+    Returns (values, errors). Blank values are left out so an update never
+    overwrites a column the input did not provide.
+    """
+    values = {}
+    errors = []
+
+    for column, max_length in STRING_COLUMNS.items():
+        value = record.get(column)
+        if _blank(value):
+            continue
+        value = str(value).strip()
+        if max_length and len(value) > max_length:
+            errors.append(f'{column} is longer than {max_length} characters')
+            continue
+        values[column] = value
+
+    for column, cast, minimum, maximum in (
+        ('price', float, 0, None),
+        ('stock_quantity', int, 0, None),
+        ('rating', float, 0, 5),
+    ):
+        value = record.get(column)
+        if _blank(value):
+            continue
+        try:
+            value = cast(value)
+        except (TypeError, ValueError):
+            errors.append(f'{column} must be a number')
+            continue
+        if value < minimum or (maximum is not None and value > maximum):
+            errors.append(f'{column} is out of range')
+            continue
+        values[column] = value
+
+    featured = record.get('is_featured')
+    if isinstance(featured, bool):
+        values['is_featured'] = featured
+    elif not _blank(featured):
+        flag = str(featured).strip().lower()
+        if flag in TRUE_VALUES:
+            values['is_featured'] = True
+        elif flag in FALSE_VALUES:
+            values['is_featured'] = False
+        else:
+            errors.append('is_featured must be true or false')
+
+    if 'name' not in values:
+        errors.append('name is required')
+    return values, errors
+
+
+def _natural_key(name, brand):
+    return name, brand or ''
+
+
+def _flush(batch, report):
+    """Upsert one batch of validated rows: one SELECT, one INSERT and one UPDATE executemany"""
+    # Later rows for the same key win, as if applied in file order
+    by_key = {}
+    for values in batch:
+        key = _natural_key(values['name'], values.get('brand'))
+        if key in by_key:
+            by_key[key].update(values)
+        else:
+            by_key[key] = dict(values)
+
+    names = list({name for name, _ in by_key})
+    existing = {
+        _natural_key(row.name, row.brand): row.id
+        for row in db.session.query(Product.id, Product.name, Product.brand).filter(Product.name.in_(names))
+    }
+
+    inserts = []
+    updates = []
+    for key, values in by_key.items():
+        product_id = existing.get(key)
+        if product_id is None:
+            if 'price' not in values:
+                report['failed'] += 1
+                _add_error(report, values.pop('_row'), ['price is required for new products'])
+                continue
+            values.pop('_row')
+            inserts.append(values)
+        else:
+            values.pop('_row')
+            values['id'] = product_id
+            updates.append(values)
+
+    if inserts:
+        db.session.execute(insert(Product), inserts)
+    if updates:
+        db.session.execute(update(Product), updates)
+    db.session.commit()
+
+    report['inserted'] += len(inserts)
+    report['updated'] += len(updates)
+
+
+def _add_error(report, row_number, errors):
+    if len(report['errors']) < MAX_REPORTED_ERRORS:
+        report['errors'].append({'row': row_number, 'errors': errors})
+    else:
+        report['errors_truncated'] = True
+
+
+def import_products(stream, fmt, batch_size=DEFAULT_BATCH_SIZE):
+    """
+    Import products from a text stream.
+    Returns a report with counts, per-row errors and throughput.
+    """
+    batch_size = max(1, min(batch_size, MAX_BATCH_SIZE))
+    report = {
+        'format': fmt,
+        'rows': 0,
+        'inserted': 0,
+        'updated': 0,
+        'failed': 0,
+        'batches': 0,
+        'errors': [],
+        'errors_truncated': False
+    }
+    started = time.perf_counter()
+
+    batch = []
+    image_urls = set()
+    try:
+        for row_number, record, parse_error in iter_records(stream, fmt):
+            report['rows'] += 1
+            if parse_error:
+                report['failed'] += 1
+                _add_error(report, row_number, [parse_error])
+                continue
+
+            values, errors = validate_record(record)
+            if errors:
+                report['failed'] += 1
+                _add_error(report, row_number, errors)
+                continue
+
+            values['_row'] = row_number
+            if values.get('image_url'):
+                image_urls.add(values['image_url'])
+            batch.append(values)
+            if len(batch) >= batch_size:
+                _flush(batch, report)
+                report['batches'] += 1
+                batch = []
+
+        if batch:
+            _flush(batch, report)
+            report['batches'] += 1
+    except Exception:
+        db.session.rollback()
+        raise
+    finally:
+        # Committed batches are live even if a later one failed
+        if report['inserted'] or report['updated']:
+            product_events.products_bulk_changed(image_urls)
+
+    elapsed = time.perf_counter() - started
+    report['elapsed_seconds'] = round(elapsed, 3)
+    report['rows_per_second'] = round(report['rows'] / elapsed, 1) if elapsed > 0 else None
+    return report
+
+
+def open_text_stream(binary_stream, encoding='utf-8'):
+    """Wrap a binary stream (upload or request body) for line-by-line reading"""
+    if not isinstance(binary_stream, io.BufferedIOBase):
+        binary_stream = io.BufferedReader(binary_stream)
+    return io.TextIOWrapper(binary_stream, encoding=encoding, newline='')
@@ -0,0 +1,179 @@
+"""
+Daily sales rollup.
+
+sales_daily_rollup holds order count, revenue and items sold per
+(day the order was placed, current status). Checkout and status changes
+adjust it with an increment-upsert inside their own transaction, so it is
+always consistent with the orders table. Dashboards read days instead of
+orders. rebuild() recomputes it from the live and archived orders
+(python rebuild_sales_rollup.py).
+"""
+from collections import defaultdict
+from datetime import datetime, timedelta
+from sqlalchemy import case, func, select
+from database import db
+from models import SalesDailyRollup
+from services.upsert import upsert
+
+ROLLUP_KEY = ('day', 'status')
+ROLLUP_VALUES = ('order_count', 'revenue', 'items_sold')
+
+
+def _apply(deltas):
+    """Add {(day, status): [orders, revenue, items]} to the rollup (caller commits)"""
+    rows = [
+        {'day': day, 'status': status, 'order_count': orders, 'revenue': revenue, 'items_sold': items}
+        for (day, status), (orders, revenue, items) in deltas.items()
+        if orders or revenue or items
+    ]
+    upsert(SalesDailyRollup, rows, ROLLUP_KEY, increment=ROLLUP_VALUES)
+
+
+def record_order(created_at, status, revenue, items_sold):
+    """A new order; call before the checkout transaction commits"""
+    _apply({(created_at.date(), status): (1, revenue, items_sold)})
+
+
+def record_status_changes(changes):
+    """
+    Move orders between statuses; call before the status change commits.
+    changes: iterable of (created_at, old_status, new_status, revenue, items_sold)
+    """
+    deltas = defaultdict(lambda: [0, 0.0, 0])
+    for created_at, old_status, new_status, revenue, items_sold in changes:
+        if old_status == new_status:
+            continue
+        day = created_at.date()
+        for status, sign in ((old_status, -1), (new_status, 1)):
+            totals = deltas[(day, status)]
+            totals[0] += sign
+            totals[1] += sign * revenue
+            totals[2] += sign * items_sold
+    _apply(deltas)
+
+
+def rebuild(batch_size=5000):
+    """
+    Recompute the whole rollup from the live and archived orders, in one
+    transaction. Orders are streamed and bucketed in Python so the
+    backfill works the same on every database.
+    Returns the number of rollup rows written.
+    """
+    from services.order_archive import SOURCES
+
+    totals = defaultdict(lambda: [0, 0.0, 0])
+    for order_model, item_model in SOURCES:
+        items = db.session.query(
+            item_model.order_id.label('order_id'),
+            func.sum(item_model.quantity).label('items_sold')
+        ).group_by(item_model.order_id).subquery()
+        rows = db.session.query(
+            order_model.created_at, order_model.status, order_model.total_amount, items.c.items_sold
+        ).outerjoin(items, items.c.order_id == order_model.id).yield_per(batch_size)
+        for created_at, status, revenue, items_sold in rows:
+            bucket = totals[(created_at.date(), status)]
+            bucket[0] += 1
+            bucket[1] += revenue or 0
+            bucket[2] += items_sold or 0
+
+    try:
+        SalesDailyRollup.query.delete(synchronize_session=False)
+        if totals:
+            db.session.bulk_insert_mappings(SalesDailyRollup, [
+                {'day': day, 'status': status, 'order_count': orders, 'revenue': revenue, 'items_sold': items}
+                for (day, status), (orders, revenue, items) in totals.items()
+            ])
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+    return len(totals)
+
+
+# Reads
+
+def days_ago(days):
+    """UTC date `days` days before today"""
+    return (datetime.utcnow() - timedelta(days=days)).date()
+
+
+def daily(start_day=None, end_day=None):
+    """[(day, order_count, revenue, items_sold)] summed over statuses, oldest first"""
+    query = db.session.query(
+        SalesDailyRollup.day,
+        func.sum(SalesDailyRollup.order_count).label('order_count'),
+        func.sum(SalesDailyRollup.revenue).label('revenue'),
+        func.sum(SalesDailyRollup.items_sold).label('items_sold')
+    )
+    if start_day is not None:
+        query = query.filter(SalesDailyRollup.day >= start_day)
+    if end_day is not None:
+        query = query.filter(SalesDailyRollup.day <= end_day)
+    return query.group_by(SalesDailyRollup.day).order_by(SalesDailyRollup.day).all()
+
+
+def by_status(start_day=None, windows=None):
+    """
+    {status: {'order_count', 'revenue', 'items_sold'}}
+    windows: optional {name: start_day}; each status then also gets
+    {name: {'order_count', 'revenue'}} counted from that day on, computed
+    in the same query with conditional sums.
+    """
+    windows = windows or {}
+    columns = [
+        SalesDailyRollup.status,
+        func.sum(SalesDailyRollup.order_count).label('order_count'),
+        func.sum(SalesDailyRollup.revenue).label('revenue'),
+        func.sum(SalesDailyRollup.items_sold).label('items_sold')
+    ]
+    for window_start in windows.values():
+        since = SalesDailyRollup.day >= window_start
+        columns.append(func.sum(case((since, SalesDailyRollup.order_count), else_=0)))
+        columns.append(func.sum(case((since, SalesDailyRollup.revenue), else_=0)))
+
+    query = db.session.query(*columns)
+    if start_day is not None:
+        query = query.filter(SalesDailyRollup.day >= start_day)
+
+    result = {}
+    for row in query.group_by(SalesDailyRollup.status):
+        totals = result[row.status] = {
+            'order_count': int(row.order_count or 0),
+            'revenue': float(row.revenue or 0),
+            'items_sold': int(row.items_sold or 0)
+        }
+        for i, name in enumerate(windows):
+            orders, revenue = row[4 + 2 * i], row[5 + 2 * i]
+            totals[name] = {'order_count': int(orders or 0), 'revenue': float(revenue or 0)}
+    return result
+
+
+def totals(start_day=None):
+    """(order_count, revenue) over every status, optionally from start_day on"""
+    query = db.session.query(
+        func.sum(SalesDailyRollup.order_count),
+        func.sum(SalesDailyRollup.revenue)
+    )
+    if start_day is not None:
+        query = query.filter(SalesDailyRollup.day >= start_day)
+    orders, revenue = query.one()
+    return int(orders or 0), float(revenue or 0)
+
+
+def total_columns():
+    """
+    (order_count, revenue) over the whole rollup as scalar subqueries, for
+    callers that fold these totals into a larger multi-aggregate SELECT
+    """
+    return (
+        select(func.coalesce(func.sum(SalesDailyRollup.order_count), 0)).scalar_subquery(),
+        select(func.coalesce(func.sum(SalesDailyRollup.revenue), 0)).scalar_subquery()
+    )
+
+
+def monthly(start_day):
+    """[(YYYY-MM, revenue)] from start_day on, bucketed from the daily rows"""
+    months = defaultdict(float)
+    for row in daily(start_day):
+        months[row.day.strftime('%Y-%m')] += float(row.revenue or 0)
+    return sorted(months.items())
@@ -0,0 +1,226 @@
+"""
+In-memory inverted index for product full-text search.
+
+Each product's name, brand, category and description are tokenized into
+a postings map (term -> {product_id: weighted term frequency}). Queries
+are answered from the postings with BM25 ranking, so search never has to
+scan the products table. The index is built from the database on first
+use and patched through services.product_events whenever a product is
+written.
+"""
+import heapq
+import math
+import re
+import threading
+from bisect import bisect_left
+from collections import Counter
+
+TOKEN_RE = re.compile(r'[a-z0-9]+')
+
+STOP_WORDS = {'a', 'an', 'and', 'for', 'in', 'of', 'on', 'or', 'the', 'to', 'with'}
+
+# Matches in the name count more than matches deep in the description
+FIELD_WEIGHTS = (
+    ('name', 3),
+    ('brand', 2),
+    ('category', 2),
+    ('description', 1),
+)
+
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+
+def tokenize(text):
+    """Lowercase and split text into searchable terms"""
+    if not text:
+        return []
+    return [t for t in TOKEN_RE.findall(text.lower()) if t not in STOP_WORDS]
+
+
+class SearchIndex:
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._postings = {}    # term -> {doc_id: tf}
+        self._doc_terms = {}   # doc_id -> {term: tf}, kept for removals
+        self._doc_len = {}
+        self._total_len = 0
+        self._vocab = []
+        self._vocab_dirty = False
+        self.built = False
+
+    def _doc_counts(self, fields):
+        counts = Counter()
+        for field, weight in FIELD_WEIGHTS:
+            for term in tokenize(fields.get(field)):
+                counts[term] += weight
+        return counts
+
+    def add(self, doc_id, fields):
+        """Index (or re-index) a single document"""
+        counts = self._doc_counts(fields)
+        with self._lock:
+            self._remove(doc_id)
+            for term, tf in counts.items():
+                postings = self._postings.get(term)
+                if postings is None:
+                    postings = self._postings[term] = {}
+                    self._vocab_dirty = True
+                postings[doc_id] = tf
+            self._doc_terms[doc_id] = counts
+            length = sum(counts.values())
+            self._doc_len[doc_id] = length
+            self._total_len += length
+
+    def remove(self, doc_id):
+        with self._lock:
+            self._remove(doc_id)
+
+    def _remove(self, doc_id):
+        counts = self._doc_terms.pop(doc_id, None)
+        if counts is None:
+            return
+        for term in counts:
+            postings = self._postings.get(term)
+            if postings is None:
+                continue
+            postings.pop(doc_id, None)
+            if not postings:
+                del self._postings[term]
+                self._vocab_dirty = True
+        self._total_len -= self._doc_len.pop(doc_id, 0)
+
+    def clear(self):
+        with self._lock:
+            self._postings.clear()
+            self._doc_terms.clear()
+            self._doc_len.clear()
+            self._total_len = 0
+            self._vocab = []
+            self._vocab_dirty = False
+
+    def _expand_prefix(self, prefix):
+        """All indexed terms starting with prefix (used for the last query word)"""
+        if self._vocab_dirty:
+            self._vocab = sorted(self._postings)
+            self._vocab_dirty = False
+        start = bisect_left(self._vocab, prefix)
+        terms = []
+        for term in self._vocab[start:]:
+            if not term.startswith(prefix):
+                break
+            terms.append(term)
+        return terms
+
+    def search(self, query, limit=None):
+        """
+        Return doc ids matching every query term, best BM25 score first.
+        The final term also matches as a prefix so partial words still hit;
+        documents containing it as a whole word rank ahead of those that only
+        match an expansion ("car" ranks Racing Car above Baby Care).
+        """
+        terms = tokenize(query)
+        if not terms:
+            return []
+
+        with self._lock:
+            n_docs = len(self._doc_len)
+            if not n_docs:
+                return []
+            avg_len = self._total_len / n_docs
+
+            # Each query word becomes a group of index terms; a document has
+            # to match at least one term from every group.
+            groups = [[t] if t in self._postings else [] for t in terms[:-1]]
+            groups.append(self._expand_prefix(terms[-1]))
+            if any(not group for group in groups):
+                return []
+
+            scores = None
+            for group in groups:
+                group_scores = {}
+                for term in group:
+                    postings = self._postings[term]
+                    idf = math.log(1 + (n_docs - len(postings) + 0.5) / (len(postings) + 0.5))
+                    for doc_id, tf in postings.items():
+                        norm = BM25_K1 * (1 - BM25_B + BM25_B * self._doc_len[doc_id] / avg_len)
+                        score = idf * tf * (BM25_K1 + 1) / (tf + norm)
+                        if score > group_scores.get(doc_id, 0):
+                            group_scores[doc_id] = score
+                if scores is None:
+                    scores = group_scores
+                else:
+                    scores = {d: s + group_scores[d] for d, s in scores.items() if d in group_scores}
+                if not scores:
+                    return []
+            exact = self._postings.get(terms[-1], {})
+            prefix_only = {d for d in scores if d not in exact}
+
+        def rank(d):
+            return (d in prefix_only, -scores[d], d)
+
+        if limit:
+            return heapq.nsmallest(limit, scores, key=rank)
+        return sorted(scores, key=rank)
+
+
+product_index = SearchIndex()
+
+
+def _product_fields(product):
+    return {
+        'name': product.name,
+        'brand': product.brand,
+        'category': product.category,
+        'description': product.description,
+    }
+
+
+def ensure_built():
+    """Load every product into the index the first time it is needed"""
+    if product_index.built:
+        return
+    with product_index._lock:
+        if product_index.built:
+            return
+        rebuild()
+
+
+def rebuild():
+    """Drop and rebuild the index from the products table"""
+    from models import Product
+
+    with product_index._lock:
+        product_index.clear()
+        rows = Product.query.with_entities(
+            Product.id, Product.name, Product.brand, Product.category, Product.description
+        ).yield_per(1000)
+        for row in rows:
+            product_index.add(row.id, _product_fields(row))
+        product_index.built = True
+
+
+def invalidate():
+    """Products changed outside this process; rebuild from the database on next use"""
+    with product_index._lock:
+        product_index.built = False
+
+
+def index_product(product):
+    # Taking the lock first means a write that races an in-progress build
+    # waits for it instead of being dropped.
+    with product_index._lock:
+        if product_index.built:
+            product_index.add(product.id, _product_fields(product))
+
+
+def remove_product(product_id):
+    with product_index._lock:
+        if product_index.built:
+            product_index.remove(product_id)
+
+
+def search_product_ids(query, limit=None):
+    """Ranked product ids for a free-text query"""
+    ensure_built()
+    return product_index.search(query, limit=limit)
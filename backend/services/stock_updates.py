@@ -0,0 +1,146 @@
+"""
+Set-based bulk stock adjustments.
+
+Absolute quantities and relative deltas are each applied with one UPDATE
+per chunk of products (CASE on the product id). Deltas are computed by the
+database (stock_quantity = stock_quantity + delta) under a guard that the
+result stays non-negative, so they compose safely with concurrent
+checkouts decrementing the same rows.
+"""
+from sqlalchemy import case, update
+from database import db
+from models import Product
+
+MAX_ENTRIES = 5000
+# Each product costs up to five bound parameters (the delta CASE appears
+# twice); keep a chunk under SQL Server's 2100 parameter limit
+CHUNK_SIZE = 300
+
+
+class StockUpdateError(ValueError):
+    pass
+
+
+def _is_int(value):
+    return isinstance(value, int) and not isinstance(value, bool)
+
+
+def _validate(entries):
+    """Split entries into {id: quantity}, {id: delta} and rejections"""
+    absolute = {}
+    deltas = {}
+    rejected = []
+    seen = set()
+
+    for index, entry in enumerate(entries):
+        if not isinstance(entry, dict):
+            rejected.append({'index': index, 'error': 'Entry must be an object'})
+            continue
+        product_id = entry.get('product_id')
+        if not _is_int(product_id):
+            rejected.append({'index': index, 'error': 'product_id must be an integer'})
+            continue
+        if product_id in seen:
+            rejected.append({'product_id': product_id, 'error': 'Duplicate product_id'})
+            continue
+        seen.add(product_id)
+
+        has_quantity = 'stock_quantity' in entry
+        has_delta = 'delta' in entry
+        if has_quantity == has_delta:
+            rejected.append({'product_id': product_id, 'error': 'Give exactly one of stock_quantity or delta'})
+        elif has_quantity:
+            quantity = entry['stock_quantity']
+            if not _is_int(quantity) or quantity < 0:
+                rejected.append({'product_id': product_id, 'error': 'stock_quantity must be a non-negative integer'})
+            else:
+                absolute[product_id] = quantity
+        else:
+            delta = entry['delta']
+            if not _is_int(delta):
+                rejected.append({'product_id': product_id, 'error': 'delta must be an integer'})
+            else:
+                deltas[product_id] = delta
+    return absolute, deltas, rejected
+
+
+def _chunks(mapping):
+    items = list(mapping.items())
+    for start in range(0, len(items), CHUNK_SIZE):
+        yield dict(items[start:start + CHUNK_SIZE])
+
+
+def _existing_stock(product_ids):
+    stock = {}
+    ids = list(product_ids)
+    for start in range(0, len(ids), CHUNK_SIZE):
+        chunk = ids[start:start + CHUNK_SIZE]
+        stock.update(db.session.query(Product.id, Product.stock_quantity).filter(Product.id.in_(chunk)))
+    return stock
+
+
+def _run(stmt, expected_ids):
+    """Execute an UPDATE and return {id: new stock} for the rows it changed"""
+    if db.engine.dialect.update_returning:
+        rows = db.session.execute(
+            stmt.returning(Product.id, Product.stock_quantity),
+            execution_options={'synchronize_session': False}
+        )
+        return {row.id: row.stock_quantity for row in rows}
+
+    # No RETURNING on this backend: fall back to one guarded UPDATE per row
+    changed = {}
+    for product_id in expected_ids:
+        result = db.session.execute(
+            stmt.where(Product.id == product_id),
+            execution_options={'synchronize_session': False}
+        )
+        if result.rowcount:
+            changed[product_id] = None
+    if changed:
+        changed.update(_existing_stock(changed))
+    return changed
+
+
+def apply_stock_updates(entries):
+    """
+    Apply many {product_id, stock_quantity | delta} entries in one transaction.
+    Returns {'updated': [...], 'missing': [...], 'rejected': [...]}; the caller commits.
+    """
+    if not isinstance(entries, list):
+        raise StockUpdateError('updates must be a list')
+    if len(entries) > MAX_ENTRIES:
+        raise StockUpdateError(f'At most {MAX_ENTRIES} updates per request')
+
+    absolute, deltas, rejected = _validate(entries)
+    existing = _existing_stock(list(absolute) + list(deltas))
+    missing = [pid for pid in list(absolute) + list(deltas) if pid not in existing]
+
+    absolute = {pid: q for pid, q in absolute.items() if pid in existing}
+    deltas = {pid: d for pid, d in deltas.items() if pid in existing}
+
+    updated = {}
+
+    for chunk in _chunks(absolute):
+        stmt = update(Product).where(Product.id.in_(list(chunk))).values(
+            stock_quantity=case(chunk, value=Product.id)
+        )
+        updated.update(_run(stmt, chunk))
+
+    for chunk in _chunks(deltas):
+        new_stock = Product.stock_quantity + case(chunk, value=Product.id)
+        stmt = update(Product).where(
+            Product.id.in_(list(chunk)),
+            new_stock >= 0
+        ).values(stock_quantity=new_stock)
+        changed = _run(stmt, chunk)
+        updated.update(changed)
+        for pid in chunk:
+            if pid not in changed:
+                rejected.append({'product_id': pid, 'error': 'Stock would go negative'})
+
+    return {
+        'updated': [{'product_id': pid, 'stock_quantity': stock} for pid, stock in updated.items()],
+        'missing': missing,
+        'rejected': rejected
+    }
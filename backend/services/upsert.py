@@ -0,0 +1,114 @@
+"""
+Single-statement INSERT-or-UPDATE across the dialects we run on.
+
+SQLite and PostgreSQL use INSERT ... ON CONFLICT DO UPDATE, SQL Server
+uses MERGE WITH (HOLDLOCK). Both need a unique constraint or index on the
+key columns. Other backends fall back to UPDATE-then-INSERT per row.
+"""
+from sqlalchemy import and_, insert, select, text, update
+from database import db
+
+# SQL Server allows at most 2100 parameters per statement
+MAX_PARAMETERS = 2000
+
+
+def _chunks(rows, columns):
+    size = max(1, MAX_PARAMETERS // max(1, len(columns)))
+    for start in range(0, len(rows), size):
+        yield rows[start:start + size]
+
+
+def upsert(model, rows, key_columns, increment=(), replace=(), returning=()):
+    """
+    Insert rows, or update the existing row with the same key columns.
+
+    increment: columns added to the stored value on conflict
+    replace: columns overwritten with the new value on conflict
+    returning: columns to return for every affected row
+    All rows must have the same keys. Returns a list of result rows when
+    returning is given, otherwise None.
+    """
+    if not rows:
+        return [] if returning else None
+
+    table = model.__table__
+    columns = list(rows[0])
+    dialect = db.session.get_bind().dialect.name
+    results = []
+
+    for chunk in _chunks(rows, columns):
+        if dialect in ('sqlite', 'postgresql'):
+            if dialect == 'sqlite':
+                from sqlalchemy.dialects.sqlite import insert as dialect_insert
+            else:
+                from sqlalchemy.dialects.postgresql import insert as dialect_insert
+            stmt = dialect_insert(table).values(chunk)
+            set_ = {c: table.c[c] + stmt.excluded[c] for c in increment}
+            set_.update({c: stmt.excluded[c] for c in replace})
+            if set_:
+                stmt = stmt.on_conflict_do_update(index_elements=list(key_columns), set_=set_)
+            else:
+                stmt = stmt.on_conflict_do_nothing(index_elements=list(key_columns))
+            if returning:
+                stmt = stmt.returning(*[table.c[c] for c in returning])
+                results.extend(db.session.execute(stmt).all())
+            else:
+                db.session.execute(stmt)
+        elif dialect == 'mssql':
+            results.extend(_merge(table, chunk, columns, key_columns, increment, replace, returning))
+        else:
+            results.extend(_fallback(table, chunk, key_columns, increment, replace, returning))
+
+    return results if returning else None
+
+
+def _merge(table, rows, columns, key_columns, increment, replace, returning):
+    quote = db.session.get_bind().dialect.identifier_preparer.quote
+    params = {}
+    values = []
+    for i, row in enumerate(rows):
+        names = []
+        for j, column in enumerate(columns):
+            name = f'p{i}_{j}'
+            params[name] = row[column]
+            names.append(f':{name}')
+        values.append(f"({', '.join(names)})")
+
+    column_list = ', '.join(quote(c) for c in columns)
+    match = ' AND '.join(f'target.{quote(c)} = source.{quote(c)}' for c in key_columns)
+    sets = [f'target.{quote(c)} = target.{quote(c)} + source.{quote(c)}' for c in increment]
+    sets += [f'target.{quote(c)} = source.{quote(c)}' for c in replace]
+
+    sql = (
+        f'MERGE {quote(table.name)} WITH (HOLDLOCK) AS target '
+        f"USING (VALUES {', '.join(values)}) AS source ({column_list}) "
+        f'ON {match} '
+    )
+    if sets:
+        sql += f"WHEN MATCHED THEN UPDATE SET {', '.join(sets)} "
+    sql += f"WHEN NOT MATCHED THEN INSERT ({column_list}) VALUES ({', '.join('source.' + quote(c) for c in columns)})"
+    if returning:
+        sql += f" OUTPUT {', '.join('inserted.' + quote(c) for c in returning)}"
+    sql += ';'
+
+    result = db.session.execute(text(sql), params)
+    return result.all() if returning else []
+
+
+def _fallback(table, rows, key_columns, increment, replace, returning):
+    results = []
+    for row in rows:
+        where = and_(*[table.c[c] == row[c] for c in key_columns])
+        values = {c: table.c[c] + row[c] for c in increment}
+        values.update({c: row[c] for c in replace})
+        if values:
+            found = db.session.execute(update(table).where(where).values(values)).rowcount > 0
+        else:
+            found = db.session.execute(select(table.c[key_columns[0]]).where(where)).first() is not None
+        if not found:
+            db.session.execute(insert(table).values(row))
+        if returning:
+            results.append(db.session.execute(
+                select(*[table.c[c] for c in returning]).where(where)
+            ).one())
+    return results
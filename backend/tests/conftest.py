@@ -0,0 +1,55 @@
+"""
+Shared fixtures: the app on a throwaway SQLite database.
+
+DATABASE_URL has to be set before app is imported, so every test module
+shares one database per session.
+"""
+import os
+import sys
+import tempfile
+import pytest
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+_workdir = tempfile.mkdtemp(prefix='toystore-tests-')
+os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(_workdir, 'test.db')}"
+# Tests count statements; keep the catalog version re-read out of them
+os.environ.setdefault('CATALOG_VERSION_POLL', '3600')
+os.environ.setdefault('JOB_BACKEND', 'thread')
+
+
+@pytest.fixture(scope='session')
+def app():
+    from app import app as flask_app
+    from database import db
+    from services import catalog_version
+
+    flask_app.config['TESTING'] = True
+    with flask_app.app_context():
+        db.create_all()
+        catalog_version.sync()
+    yield flask_app
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+@pytest.fixture
+def statements(app):
+    """SQL statements executed while the test runs"""
+    from sqlalchemy import event
+    from database import db
+
+    executed = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        executed.append(statement)
+
+    with app.app_context():
+        engine = db.engine
+    event.listen(engine, 'before_cursor_execute', record)
+    yield executed
+    event.remove(engine, 'before_cursor_execute', record)
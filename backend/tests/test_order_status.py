@@ -0,0 +1,83 @@
+"""
+Status changes only land on orders still in the status that was read.
+
+A concurrent move between the read and the guarded UPDATE must come back
+as a conflict, and the sales rollup must not record a change from a
+status the order had already left.
+"""
+import itertools
+import pytest
+
+_buyers = itertools.count()
+
+
+@pytest.fixture
+def pending_order(app):
+    from database import db
+    from models import Order, OrderItem, Product, User
+    from services import sales_rollup
+
+    with app.app_context():
+        product = Product(name='Status toy', price=12, category='Status', stock_quantity=5)
+        name = f'status-buyer-{next(_buyers)}'
+        user = User(username=name, email=f'{name}@example.com', password_hash='-')
+        db.session.add_all([product, user])
+        db.session.flush()
+        order = Order(user_id=user.id, status='pending', shipping_address='Status street 1', total_amount=24)
+        db.session.add(order)
+        db.session.flush()
+        db.session.add(OrderItem(order_id=order.id, product_id=product.id, quantity=2, price=12))
+        db.session.commit()
+        sales_rollup.rebuild()
+        db.session.commit()
+        return order.id
+
+
+def _rollup(app):
+    from services import sales_rollup
+
+    with app.app_context():
+        return sales_rollup.by_status()
+
+
+def test_status_moved_after_read_is_a_conflict(app, pending_order, monkeypatch):
+    from sqlalchemy import update
+    from database import db
+    from models import Order
+    from services import order_status
+
+    read = order_status._current_orders
+
+    def read_then_moved(order_ids):
+        orders = read(order_ids)
+        # Another request moves the order before our UPDATE runs
+        db.session.execute(update(Order).where(Order.id == pending_order).values(status='processing'))
+        return orders
+
+    monkeypatch.setattr(order_status, '_current_orders', read_then_moved)
+    before = _rollup(app)
+    with app.app_context():
+        result, changes = order_status.change_status(pending_order, 'shipped')
+        db.session.commit()
+        status = db.session.get(Order, pending_order).status
+
+    assert result['result'] == 'conflict'
+    assert changes == []
+    assert status == 'processing'
+    assert _rollup(app) == before
+
+
+def test_status_change_moves_rollup_totals(app, pending_order):
+    from database import db
+    from services import order_status
+
+    before = _rollup(app)
+    with app.app_context():
+        result, changes = order_status.change_status(pending_order, 'shipped')
+        db.session.commit()
+
+    assert result['result'] == 'updated'
+    assert changes == [(pending_order, 'pending', 'shipped')]
+    after = _rollup(app)
+    assert after['pending']['order_count'] == before['pending']['order_count'] - 1
+    assert after['shipped']['order_count'] == before.get('shipped', {'order_count': 0})['order_count'] + 1
@@ -0,0 +1,80 @@
+"""
+The admin read paths issue a fixed number of statements.
+
+Each endpoint is requested with a small and a large page; the statement
+counts must be equal (nothing runs per row) and within the budget, which
+includes the admin_required user lookup. Caches are cleared before every
+request so the cold path is measured.
+"""
+import random
+import pytest
+
+ORDERS = 120
+USERS = 20
+PRODUCTS = 30
+MAX_ITEMS = 4
+
+# (small url, large url, max statements)
+ENDPOINTS = {
+    'admin orders page': ('/api/admin/orders?per_page=5', '/api/admin/orders?per_page=100', 5),
+    'admin orders filtered': ('/api/admin/orders?status=pending&per_page=5',
+                              '/api/admin/orders?status=pending&per_page=100', 5),
+    'order stats': ('/api/admin/orders/stats', '/api/admin/orders/stats', 2),
+    'dashboard': ('/api/admin/analytics/dashboard', '/api/admin/analytics/dashboard', 7),
+}
+
+
+@pytest.fixture(scope='module')
+def admin_headers(app):
+    from flask_jwt_extended import create_access_token
+    from database import db
+    from models import Order, OrderItem, Product, User
+    from services import sales_rollup
+
+    rng = random.Random(1)
+    with app.app_context():
+        products = [
+            Product(name=f'Count toy {i}', price=10 + i, category=f'Category {i % 5}', stock_quantity=rng.randint(0, 40))
+            for i in range(PRODUCTS)
+        ]
+        db.session.add_all(products)
+        users = [User(username=f'count{i}', email=f'count{i}@example.com', password_hash='-') for i in range(USERS)]
+        admin = User(username='count-admin', email='count-admin@example.com', password_hash='-', is_admin=True)
+        db.session.add_all(users + [admin])
+        db.session.flush()
+
+        for _ in range(ORDERS):
+            lines = rng.sample(products, rng.randint(1, MAX_ITEMS))
+            order = Order(user_id=rng.choice(users).id, status=rng.choice(['pending', 'shipped', 'delivered']),
+                          shipping_address='Count street 1', total_amount=sum(p.price for p in lines))
+            db.session.add(order)
+            db.session.flush()
+            db.session.add_all(OrderItem(order_id=order.id, product_id=p.id, quantity=1, price=p.price) for p in lines)
+        db.session.commit()
+        sales_rollup.rebuild()
+        db.session.commit()
+        return {'Authorization': f'Bearer {create_access_token(identity=admin.id)}'}
+
+
+@pytest.mark.parametrize('label', ENDPOINTS)
+def test_statement_count_is_fixed(label, client, admin_headers, statements):
+    from services import analytics_cache, product_cache
+
+    small_url, large_url, budget = ENDPOINTS[label]
+    counts = []
+    for url in (small_url, large_url):
+        analytics_cache.clear()
+        product_cache.clear()
+        statements.clear()
+        response = client.get(url, headers=admin_headers)
+        assert response.status_code == 200, response.get_data(as_text=True)
+        counts.append(len(statements))
+
+    assert counts[0] == counts[1], f'{label} statements grow with the page size: {counts}'
+    assert counts[1] <= budget, f'{label} ran {counts[1]} statements (budget {budget})'
+
+
+def test_large_page_returns_full_rows(client, admin_headers):
+    data = client.get('/api/admin/orders?per_page=100', headers=admin_headers).get_json()
+    assert len(data['orders']) == 100
+    assert all(order['user'] and order['items'] for order in data['orders'])
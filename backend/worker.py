@@ -0,0 +1,53 @@
+"""
+Background job worker for the database queue (JOB_BACKEND=db).
+
+Usage: python worker.py [--once] [--batch 10] [--poll 1.0]
+       python worker.py --retry JOB_ID
+Run as many workers as needed; each job is claimed by exactly one.
+"""
+import argparse
+import logging
+import time
+from app import app
+from services import idempotency, jobs
+
+# Housekeeping that piggybacks on the worker loop
+MAINTENANCE_INTERVAL = 60
+
+def main():
+    parser = argparse.ArgumentParser(description='Run queued background jobs')
+    parser.add_argument('--once', action='store_true', help='Run the jobs that are due now, then exit')
+    parser.add_argument('--batch', type=int, default=10, help='Jobs to claim per poll')
+    parser.add_argument('--poll', type=float, default=1.0, help='Seconds to sleep when the queue is empty')
+    parser.add_argument('--retry', type=int, metavar='JOB_ID', help='Requeue a failed job and exit')
+    args = parser.parse_args()
+    
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s %(levelname)s %(name)s: %(message)s')
+    
+    with app.app_context():
+        if args.retry is not None:
+            if jobs.retry_failed(args.retry):
+                print(f'✓ Job {args.retry} queued again')
+            else:
+                print(f'❌ Job {args.retry} not found or not failed')
+            return
+        
+        print(f'✓ Worker started (batch {args.batch}, poll {args.poll}s)')
+        last_maintenance = 0
+        try:
+            while True:
+                if time.monotonic() - last_maintenance >= MAINTENANCE_INTERVAL:
+                    jobs.requeue_stale()
+                    idempotency.purge_expired()
+                    last_maintenance = time.monotonic()
+                
+                ran = jobs.run_due_jobs(limit=args.batch)
+                if args.once and not ran:
+                    break
+                if not ran:
+                    time.sleep(args.poll)
+        except KeyboardInterrupt:
+            print('Worker stopped')
+
+if __name__ == '__main__':
+    main()
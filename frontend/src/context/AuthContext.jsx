@@ -28,8 +28,15 @@ export const AuthProvider = ({ children }) => {
 
     const login = async (username, password) => {
         try {
-            const response = await userAPI.login({ username, password });
-            const { access_token, user: userData } = response.data;
+            // Merge a cart built while logged out into the user's cart
+            const guestCart = localStorage.getItem('guestCart');
+            const response = await userAPI.login({ username, password, guest_cart: guestCart || undefined });
+            const { access_token, user: userData, guest_cart_merged } = response.data;
+
+            // Keep the guest cart unless the server actually took it over
+            if (guest_cart_merged) {
+                localStorage.removeItem('guestCart');
+            }
 
             localStorage.setItem('token', access_token);
             localStorage.setItem('user', JSON.stringify(userData));
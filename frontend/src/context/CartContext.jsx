@@ -4,6 +4,9 @@ import { useAuth } from './AuthContext';
 
 const CartContext = createContext();
 
+// Guests keep their cart in a signed token instead of the database
+const GUEST_CART_KEY = 'guestCart';
+
 export const useCart = () => {
     const context = useContext(CartContext);
     if (!context) {
@@ -14,32 +17,62 @@ export const useCart = () => {
 
 export const CartProvider = ({ children }) => {
     const [cartItems, setCartItems] = useState([]);
+    const [cartSummary, setCartSummary] = useState(null);
     const [loading, setLoading] = useState(false);
     const { isAuthenticated } = useAuth();
 
-    // Fetch cart items when user is authenticated
+    // Fetch the user's cart, or the guest cart when logged out
     useEffect(() => {
-        if (isAuthenticated) {
-            fetchCart();
+        fetchCart();
+    }, [isAuthenticated]);
+
+    const setCart = (data) => {
+        setCartItems(data.items);
+        setCartSummary(data.summary);
+    };
+
+    const saveGuestToken = (token) => {
+        if (token) {
+            localStorage.setItem(GUEST_CART_KEY, token);
         } else {
-            setCartItems([]);
+            localStorage.removeItem(GUEST_CART_KEY);
         }
-    }, [isAuthenticated]);
+    };
 
     const fetchCart = async () => {
+        if (!isAuthenticated && !localStorage.getItem(GUEST_CART_KEY)) {
+            setCartItems([]);
+            setCartSummary(null);
+            return;
+        }
         try {
             setLoading(true);
-            const response = await cartAPI.getCart();
-            setCartItems(response.data);
+            const response = isAuthenticated
+                ? await cartAPI.getCart()
+                : await cartAPI.getGuestCart(localStorage.getItem(GUEST_CART_KEY));
+            setCart(response.data);
+            if (!isAuthenticated) saveGuestToken(response.data.token);
         } catch (error) {
+            if (!isAuthenticated) saveGuestToken(null); // expired or invalid token
             console.error('Error fetching cart:', error);
         } finally {
             setLoading(false);
         }
     };
 
+    // Guest changes go through the token endpoint; item ids are product ids there
+    const guestBatch = async (operations) => {
+        const response = await cartAPI.guestBatch(localStorage.getItem(GUEST_CART_KEY), operations);
+        saveGuestToken(response.data.token);
+        setCart(response.data);
+    };
+
     const addToCart = async (productId, quantity = 1) => {
         try {
+            if (!isAuthenticated) {
+                await guestBatch([{ op: 'add', product_id: productId, quantity }]);
+                return { success: true };
+            }
             const response = await cartAPI.addToCart({ product_id: productId, quantity });
             await fetchCart(); // Refresh cart
             return { success: true };
@@ -53,6 +86,10 @@ export const CartProvider = ({ children }) => {
 
     const updateQuantity = async (itemId, quantity) => {
         try {
+            if (!isAuthenticated) {
+                await guestBatch([{ op: 'set', product_id: itemId, quantity }]);
+                return { success: true };
+            }
             await cartAPI.updateCartItem(itemId, { quantity });
             await fetchCart(); // Refresh cart
             return { success: true };
@@ -66,6 +103,10 @@ export const CartProvider = ({ children }) => {
 
     const removeFromCart = async (itemId) => {
         try {
+            if (!isAuthenticated) {
+                await guestBatch([{ op: 'remove', product_id: itemId }]);
+                return { success: true };
+            }
             await cartAPI.removeFromCart(itemId);
             await fetchCart(); // Refresh cart
             return { success: true };
@@ -79,8 +120,13 @@ export const CartProvider = ({ children }) => {
 
     const clearCart = async () => {
         try {
-            await cartAPI.clearCart();
+            if (isAuthenticated) {
+                await cartAPI.clearCart();
+            } else {
+                saveGuestToken(null);
+            }
             setCartItems([]);
+            setCartSummary(null);
             return { success: true };
         } catch (error) {
             return {
@@ -90,18 +136,14 @@ export const CartProvider = ({ children }) => {
         }
     };
 
-    const getCartTotal = () => {
-        return cartItems.reduce((total, item) => {
-            return total + (item.product?.price || 0) * item.quantity;
-        }, 0);
-    };
+    // Totals are computed by the server alongside the item list
+    const getCartTotal = () => cartSummary?.subtotal || 0;
 
-    const getCartCount = () => {
-        return cartItems.reduce((count, item) => count + item.quantity, 0);
-    };
+    const getCartCount = () => cartSummary?.item_count || 0;
 
     const value = {
         cartItems,
+        cartSummary,
         loading,
         addToCart,
         updateQuantity,
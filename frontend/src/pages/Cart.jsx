@@ -118,7 +118,7 @@ const Cart = () => {
                                         </div>
 
                                         <p className="text-lg font-semibold text-gray-800">
-                                            ${((item.product?.price || 0) * item.quantity).toFixed(2)}
+                                            ${item.line_total.toFixed(2)}
                                         </p>
                                     </div>
                                 </div>
@@ -2,7 +2,6 @@ import { useState, useEffect } from 'react';
 import { useParams, Link } from 'react-router-dom';
 import { productAPI } from '../services/api';
 import { useCart } from '../context/CartContext';
-import { useAuth } from '../context/AuthContext';
 import { Star, ShoppingCart, Check, Truck, Shield } from 'lucide-react';
 import { Canvas } from '@react-three/fiber';
 import { OrbitControls, PerspectiveCamera } from '@react-three/drei';
@@ -16,7 +15,6 @@ const ProductDetail = () => {
     const [quantity, setQuantity] = useState(1);
     const [addedToCart, setAddedToCart] = useState(false);
     const { addToCart } = useCart();
-    const { isAuthenticated } = useAuth();
 
     useEffect(() => {
         fetchProduct();
@@ -34,11 +32,7 @@ const ProductDetail = () => {
     };
 
     const handleAddToCart = async () => {
-        if (!isAuthenticated) {
-            window.location.href = '/login';
-            return;
-        }
-
+        // Guests get a token-backed cart that is merged on login
         const result = await addToCart(product.id, quantity);
         if (result.success) {
             setAddedToCart(true);
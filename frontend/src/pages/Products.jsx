@@ -1,6 +1,6 @@
 import { useState, useEffect, useRef } from 'react';
 import { useSearchParams, Link } from 'react-router-dom';
-import { productAPI } from '../services/api';
+import { productAPI, assetUrl } from '../services/api';
 import { Search, Filter, Star } from 'lucide-react';
 import { ParticleCard, GlobalSpotlight } from '../components/common/MagicBento';
 import ButtonHoverTopFlip from '../components/common/ButtonHoverTopFlip';
@@ -8,6 +8,8 @@ import ButtonHoverTopFlip from '../components/common/ButtonHoverTopFlip';
 const Products = () => {
     const [products, setProducts] = useState([]);
     const [loading, setLoading] = useState(true);
+    const [nextCursor, setNextCursor] = useState(null);
+    const [loadingMore, setLoadingMore] = useState(false);
     const [searchParams, setSearchParams] = useSearchParams();
     const [searchTerm, setSearchTerm] = useState(searchParams.get('search') || '');
     const [selectedCategory, setSelectedCategory] = useState(searchParams.get('category') || '');
@@ -21,17 +23,22 @@ const Products = () => {
         fetchProducts();
     }, [searchParams]);
 
+    const buildParams = () => {
+        const params = {};
+
+        if (searchTerm) params.search = searchTerm;
+        if (selectedCategory) params.category = selectedCategory;
+        if (selectedAgeRange) params.age_range = selectedAgeRange;
+
+        return params;
+    };
+
     const fetchProducts = async () => {
         try {
             setLoading(true);
-            const params = {};
-
-            if (searchTerm) params.search = searchTerm;
-            if (selectedCategory) params.category = selectedCategory;
-            if (selectedAgeRange) params.age_range = selectedAgeRange;
-
-            const response = await productAPI.getAll(params);
-            setProducts(response.data);
+            const response = await productAPI.getAll(buildParams());
+            setProducts(response.data.products);
+            setNextCursor(response.data.next_cursor);
         } catch (error) {
             console.error('Error fetching products:', error);
         } finally {
@@ -39,6 +46,21 @@ const Products = () => {
         }
     };
 
+    const loadMore = async () => {
+        if (!nextCursor) return;
+
+        try {
+            setLoadingMore(true);
+            const response = await productAPI.getAll({ ...buildParams(), cursor: nextCursor });
+            setProducts((current) => [...current, ...response.data.products]);
+            setNextCursor(response.data.next_cursor);
+        } catch (error) {
+            console.error('Error loading more products:', error);
+        } finally {
+            setLoadingMore(false);
+        }
+    };
+
     const handleSearch = (e) => {
         e.preventDefault();
         updateFilters({ search: searchTerm });
@@ -198,7 +220,7 @@ const Products = () => {
                                             >
                                                 <div className="aspect-square bg-gray-100 overflow-hidden">
                                                     <img
-                                                        src={product.image_url || 'https://via.placeholder.com/300'}
+                                                        src={assetUrl(product.image_variants?.card || product.image_url) || 'https://via.placeholder.com/300'}
                                                         alt={product.name}
                                                         className="w-full h-full object-cover group-hover:scale-110 transition-transform duration-300"
                                                     />
@@ -233,6 +255,13 @@ const Products = () => {
                                         </ParticleCard>
                                     ))}
                                 </div>
+                                {nextCursor && (
+                                    <div className="mt-8 text-center">
+                                        <ButtonHoverTopFlip onClick={loadMore} disabled={loadingMore}>
+                                            {loadingMore ? 'Loading...' : 'Load More'}
+                                        </ButtonHoverTopFlip>
+                                    </div>
+                                )}
                             </>
                         ) : (
                             <div className="text-center py-12 card">
@@ -5,6 +5,9 @@ import MonthlySalesChart from '../../components/admin/MonthlySalesChart';
 import StatisticsChart from '../../components/admin/StatisticsChart';
 import RecentOrders from '../../components/admin/RecentOrders';
 import axios from 'axios';
+import { openAnalyticsStream } from '../../services/api';
+
+const RECENT_ORDERS = 10;
 
 const Dashboard = () => {
     const [stats, setStats] = useState(null);
@@ -16,6 +19,57 @@ const Dashboard = () => {
         fetchSalesData();
     }, []);
 
+    // Patch the loaded payloads from the live event stream instead of re-fetching them
+    useEffect(() => {
+        // Returns the function that closes the stream
+        return openAnalyticsStream({
+            'order.created': (order) => {
+                setStats((prev) => prev && {
+                    ...prev,
+                    total_orders: prev.total_orders + 1,
+                    recent_orders: [order, ...(prev.recent_orders || [])].slice(0, RECENT_ORDERS),
+                });
+            },
+            revenue: ({ day, order_count, revenue }) => {
+                setStats((prev) => prev && { ...prev, total_revenue: prev.total_revenue + revenue });
+                setSalesData((prev) => {
+                    if (!prev.some((entry) => entry.date === day)) {
+                        return [...prev, { date: day, order_count, revenue }];
+                    }
+                    return prev.map((entry) => entry.date === day
+                        ? { ...entry, order_count: entry.order_count + order_count, revenue: entry.revenue + revenue }
+                        : entry);
+                });
+            },
+            'order.status_changed': ({ changes }) => {
+                const statuses = Object.fromEntries(changes.map((change) => [change.id, change.new_status]));
+                setStats((prev) => prev && {
+                    ...prev,
+                    recent_orders: (prev.recent_orders || []).map((order) => statuses[order.id]
+                        ? { ...order, status: statuses[order.id] }
+                        : order),
+                });
+            },
+            'stock.low': (product) => {
+                setStats((prev) => prev && {
+                    ...prev,
+                    low_stock_products: [...(prev.low_stock_products || []).filter((p) => p.id !== product.id), product],
+                });
+            },
+            'stock.restocked': (product) => {
+                setStats((prev) => prev && {
+                    ...prev,
+                    low_stock_products: (prev.low_stock_products || []).filter((p) => p.id !== product.id),
+                });
+            },
+            // Updates were lost (slow connection or server restart): reload everything
+            resync: () => {
+                fetchDashboardData();
+                fetchSalesData();
+            },
+        });
+    }, []);
+
     const fetchDashboardData = async () => {
         try {
             const token = localStorage.getItem('token');
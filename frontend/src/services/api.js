@@ -10,6 +10,9 @@ const api = axios.create({
     },
 });
 
+// Resolve server-relative asset paths (e.g. image variants) against the API host
+export const assetUrl = (path) => (path && path.startsWith('/') ? `${API_URL}${path}` : path);
+
 // Add token to requests if available
 api.interceptors.request.use(
     (config) => {
@@ -28,6 +31,7 @@ api.interceptors.request.use(
 export const productAPI = {
     getAll: (params) => api.get('/api/products/', { params }),
     getById: (id) => api.get(`/api/products/${id}`),
+    getBatch: (ids) => api.post('/api/products/batch', { ids }),
     getFeatured: () => api.get('/api/products/featured'),
     create: (data) => api.post('/api/products/', data),
     update: (id, data) => api.put(`/api/products/${id}`, data),
@@ -49,14 +53,68 @@ export const cartAPI = {
     updateCartItem: (id, data) => api.put(`/api/cart/${id}`, data),
     removeFromCart: (id) => api.delete(`/api/cart/${id}`),
     clearCart: () => api.delete('/api/cart/clear'),
+    batch: (operations) => api.post('/api/cart/batch', { operations }),
+    getGuestCart: (token) => api.get('/api/cart/guest', { headers: { 'X-Guest-Cart': token } }),
+    guestBatch: (token, operations) => api.post('/api/cart/guest/batch', { token, operations }),
+    mergeGuestCart: (token) => api.post('/api/cart/merge', { token }),
 };
 
 // Order API
 export const orderAPI = {
-    getOrders: () => api.get('/api/orders/'),
+    getOrders: (params) => api.get('/api/orders/', { params }),
     getOrderById: (id) => api.get(`/api/orders/${id}`),
-    createOrder: (data) => api.post('/api/orders/create', data),
+    // Reuse the same key when retrying one checkout so it cannot create two orders
+    createOrder: (data, idempotencyKey) => api.post('/api/orders/create', data, {
+        headers: idempotencyKey ? { 'Idempotency-Key': idempotencyKey } : {},
+    }),
     updateOrderStatus: (id, data) => api.put(`/api/orders/${id}/status`, data),
 };
 
+// Admin analytics live updates (server-sent events). EventSource cannot send
+// headers, so each connection uses a short-lived stream token in the URL
+// instead of the access token. listeners maps event types to handlers of the
+// parsed data; returns a function that closes the stream.
+const STREAM_REOPEN_MS = 5000;
+
+export const openAnalyticsStream = (listeners) => {
+    let source = null;
+    let lastEventId = null;
+    let closed = false;
+    let timer = null;
+
+    const open = async () => {
+        let token;
+        try {
+            ({ data: { token } } = await api.post('/api/admin/analytics/stream/token'));
+        } catch (error) {
+            if (!closed) timer = setTimeout(open, STREAM_REOPEN_MS);
+            return;
+        }
+        if (closed) return;
+        const params = new URLSearchParams({ jwt: token });
+        if (lastEventId) params.set('last_event_id', lastEventId);
+        source = new EventSource(`${API_URL}/api/admin/analytics/stream?${params}`);
+        Object.entries(listeners).forEach(([type, handler]) => {
+            source.addEventListener(type, (event) => {
+                if (event.lastEventId) lastEventId = event.lastEventId;
+                handler(JSON.parse(event.data));
+            });
+        });
+        // The browser retries dropped connections with the same URL; once the
+        // token has expired that fails for good, so reopen with a new one
+        source.onerror = () => {
+            if (source.readyState === EventSource.CLOSED && !closed) {
+                timer = setTimeout(open, STREAM_REOPEN_MS);
+            }
+        };
+    };
+
+    open();
+    return () => {
+        closed = true;
+        clearTimeout(timer);
+        if (source) source.close();
+    };
+};
+
 export default api;